@@ -168,6 +168,7 @@ EOPYTHON
 # Copy scripts and create server
 echo "📄 Setting up API server and scripts..."
 cp /app/SeedVr2Test/runpod/seedvr2_api_server.py /app/
+cp /app/SeedVr2Test/runpod/{artifact_gc,inference_worker,progress,process_runner,cancellation,file_ranges,admission}.py /app/
 cp /app/SeedVr2Test/runpod/seedvr2_web_ui.html /app/
 
 # Create improved API server startup script
@@ -2,19 +2,56 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
+import logging
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 from .routes import upload, process, status
-from .services.storage import init_storage
+from .services.storage import init_storage, create_storage
+from .services.job_store import job_store
+from .services.job_gc import job_gc
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+def create_gcs_storage():
+    """Storage service for the results bucket, if GCS is configured"""
+    bucket_name = os.getenv("GCS_BUCKET_NAME")
+    if not bucket_name:
+        return None
+    try:
+        from google.cloud import storage
+        return create_storage(storage.Client(), bucket_name)
+    except Exception as e:
+        logger.warning(f"GCS unavailable, expired results will not be deleted from the bucket: {e}")
+        return None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background services"""
+    gcs_storage = create_gcs_storage()
+    if gcs_storage is not None:
+        job_gc.attach_storage(gcs_storage)
+    job_gc.attach_blob_store(upload.blob_store)
+    process.status_poller.start()
+    await process.requeue_waiting_jobs()
+    job_gc.start()
+    yield
+    await process.status_poller.stop()
+    await job_gc.stop()
+    if gcs_storage is not None:
+        gcs_storage.shutdown()
+    upload.blob_store.close()
+    job_store.close()
+
 # Create FastAPI app
 app = FastAPI(
     title="SeedVR2 API",
     description="API for SeedVR2 video restoration using RunPod",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
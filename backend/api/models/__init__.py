@@ -0,0 +1 @@
+# Models package initialization
\ No newline at end of file
@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+class VideoProcessingParams(BaseModel):
+    resolution: str = "720p"
+    seed: int = 42
+
+class ProcessingJob(BaseModel):
+    id: str
+    status: str = "queued"
+    progress: Optional[float] = None
+    stage: Optional[str] = None
+    resultUrl: Optional[str] = None
+    error: Optional[str] = None
+    createdAt: str = Field(default_factory=_now)
+    updatedAt: str = Field(default_factory=_now)
+    estimatedTimeRemaining: Optional[int] = None
+    runpod_job_id: Optional[str] = None
+    input_video_url: Optional[str] = None
+    input_file_id: Optional[str] = None
+    parameters: Optional[Dict[str, Any]] = None
+    expiresAt: Optional[str] = None
+
+class JobHistoryPage(BaseModel):
+    jobs: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
@@ -1,57 +1,219 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, Dict, Any, Iterable, Set
+import asyncio
+import hmac
 import uuid
 import os
-from datetime import datetime
+import logging
+from datetime import datetime, timedelta
 
 from ..services.runpod_client import runpod_client
+from ..services.job_events import job_events
+from ..services.job_store import job_store
+from ..services.job_gc import expiry_after
+from ..services.status_poller import StatusPoller
+from ..services.job_queue import PRIORITY_CLASSES, QueuedJob, create_job_queue, gpu_config, parse_tenant_keys
 from ..models.schemas import VideoProcessingParams, ProcessingJob
+from .upload import blob_store
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# In-memory job storage (replace with database in production)
-jobs_db = {}
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+# How long a worker may take to hand a claimed job to RunPod before another may
+SUBMIT_CLAIM_SECONDS = 600
+
+async def save_job(job: ProcessingJob, expected: Optional[Iterable[str]] = None) -> bool:
+    """Persist the job and push its current state to live watchers
+
+    With expected, the write only lands while the stored status is one of
+    those; False means a concurrent update won and nothing was saved.
+    """
+    # Finished jobs are garbage collected once their retention runs out
+    if job.status in TERMINAL_STATUSES and job.expiresAt is None:
+        job.expiresAt = expiry_after()
+    if expected is None:
+        await job_store.save(job)
+    elif not await job_store.save_if(job, expected):
+        return False
+    job_events.publish(job.id, job.dict())
+    return True
+
+async def fetch_runpod_status(runpod_job_id: str) -> Dict[str, Any]:
+    """Fetch a mapped job status from RunPod without blocking the event loop"""
+    return await asyncio.to_thread(runpod_client.get_job_status, runpod_job_id)
+
+async def apply_status_update(job_id: str, status: Dict[str, Any]):
+    """Copy a polled RunPod status onto our job record"""
+    job = await job_store.get(job_id)
+    if job is None or job.status == "cancelled":
+        return
+    
+    before = (job.status, job.progress, job.stage, job.estimatedTimeRemaining, job.resultUrl, job.error)
+    
+    if status.get("stale"):
+        # RunPod could not be reached; the job may still be running there and keeps its GPUs
+        job.stage = "status_unavailable"
+        if job.stage != before[2]:
+            job.updatedAt = datetime.utcnow().isoformat()
+            await save_job(job, expected=(before[0],))
+        return
+    
+    job.status = status["status"]
+    job.progress = status.get("progress")
+    job.stage = status.get("stage")
+    eta = status.get("eta_seconds")
+    job.estimatedTimeRemaining = int(eta) if eta is not None else None
+    
+    if status["status"] == "completed":
+        job.resultUrl = (status.get("output") or {}).get("result_url")
+    elif status["status"] == "failed":
+        job.error = status.get("error", "Unknown error")
+    
+    # Only real transitions touch updatedAt and wake watchers; a cancel saved
+    # since the read wins
+    if (job.status, job.progress, job.stage, job.estimatedTimeRemaining, job.resultUrl, job.error) != before:
+        job.updatedAt = datetime.utcnow().isoformat()
+        if not await save_job(job, expected=(before[0],)):
+            return
+    
+    if job.status in TERMINAL_STATUSES:
+        release_job(job_id)
+
+# Refreshes every in-flight job from one background loop (started in main.py)
+status_poller = StatusPoller(
+    fetch=fetch_runpod_status,
+    on_update=apply_status_update,
+    is_terminal=lambda status: status["status"] in TERMINAL_STATUSES,
+    stale_status=lambda error: {"status": "unknown", "stale": True, "error": error}
+)
+
+# Jobs wait here until the endpoint has GPUs for them (RUNPOD_MAX_GPUS, 0 for no limit);
+# the order follows SCHEDULING_POLICY, TENANT_WEIGHTS and QUEUE_AGING_SECONDS
+job_queue = create_job_queue()
+# Keys proving who a tenant is (TENANT_KEYS); only a verified tenant gets its
+# TENANT_WEIGHTS share or the interactive class
+tenant_keys = parse_tenant_keys(os.getenv("TENANT_KEYS"))
+# Submissions in flight, referenced so they are not garbage collected
+_submissions: Set[asyncio.Task] = set()
+
+def enqueue_job(job: ProcessingJob, tenant: str, priority: str):
+    """Queue a saved job and start whatever fits"""
+    params = VideoProcessingParams(**(job.parameters or {}))
+    job_queue.push(QueuedJob(
+        job.id,
+        tenant=tenant,
+        priority=priority,
+        resolution=params.resolution,
+        payload=(job.input_video_url, params)
+    ))
+    dispatch_jobs()
+
+def dispatch_jobs():
+    """Submit queued jobs to RunPod while GPUs are free"""
+    for queued in job_queue.pop_ready():
+        video_url, params = queued.payload
+        task = asyncio.create_task(submit_to_runpod(queued.job_id, video_url, params))
+        _submissions.add(task)
+        task.add_done_callback(_submissions.discard)
+
+def authenticate_tenant(key: Optional[str]) -> Optional[str]:
+    """Tenant whose key was sent in X-Tenant-Key, or None"""
+    if not key:
+        return None
+    for tenant, secret in tenant_keys.items():
+        if hmac.compare_digest(key.encode(), secret.encode()):
+            return tenant
+    return None
+
+def release_job(job_id: str):
+    """A job finished or will not run; its GPUs go to the next queued job"""
+    if job_queue.finished(job_id) or job_queue.withdraw(job_id):
+        dispatch_jobs()
+
+async def requeue_waiting_jobs(limit: int = 10000):
+    """Queue jobs saved before a restart that never reached RunPod
+
+    Every worker process runs this at startup, so a job may sit in several
+    queues; submit_to_runpod claims it in the store first and only one of
+    them submits it.
+    """
+    jobs = [job for job in await job_store.list_jobs(status="queued", limit=limit) if not job.runpod_job_id]
+    for job in reversed(jobs):
+        if not job.input_video_url:
+            continue
+        parameters = job.parameters or {}
+        enqueue_job(job, parameters.get("tenant", "default"), parameters.get("priority", "standard"))
+    if jobs:
+        logger.info(f"Requeued {len(jobs)} jobs waiting for GPUs")
 
 class ProcessRequest(BaseModel):
     video_url: str
+    file_id: Optional[str] = None  # Accepted for older clients; the job references its input itself
     resolution: str = "720p"
     seed: int = 42
+    priority: str = "standard"
+    tenant: Optional[str] = None
 
 @router.post("/", response_model=ProcessingJob)
 async def start_processing(
     request: ProcessRequest,
-    background_tasks: BackgroundTasks
+    http_request: Request
 ) -> ProcessingJob:
     """Start video processing job"""
     
+    if request.priority not in PRIORITY_CLASSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Priority must be one of {', '.join(PRIORITY_CLASSES)}"
+        )
+    
+    # Fair share is per tenant. Names and priorities in the body are only
+    # believed with the tenant's key; anyone else shares as their address at
+    # the default weight and cannot claim the interactive class
+    tenant = authenticate_tenant(http_request.headers.get("x-tenant-key"))
+    if request.tenant and request.tenant != tenant:
+        raise HTTPException(status_code=403, detail="A valid X-Tenant-Key is required to submit as a tenant")
+    priority = request.priority
+    if tenant is None:
+        tenant = f"client:{http_request.client.host if http_request.client else 'unknown'}"
+        if PRIORITY_CLASSES[priority] < PRIORITY_CLASSES["standard"]:
+            priority = "standard"
+    
     # Create job ID
     job_id = str(uuid.uuid4())
     
+    # The job holds a reference of its own on a stored input, released when the
+    # job is garbage collected; the upload's reference stays with the upload
+    file_id = None
+    digest = blob_store.digest_for_url(request.video_url)
+    if digest is not None and await blob_store.reference(job_id, digest) is not None:
+        file_id = job_id
+    
     # Create processing parameters
     params = VideoProcessingParams(
         resolution=request.resolution,
         seed=request.seed
     )
     
-    # Create job record
+    # Create job record; what it needs to run is stored so a restart can requeue it
     job = ProcessingJob(
         id=job_id,
         status="queued",
+        input_file_id=file_id,
+        input_video_url=request.video_url,
+        parameters={**params.dict(), "priority": priority, "tenant": tenant},
         createdAt=datetime.utcnow().isoformat(),
         updatedAt=datetime.utcnow().isoformat()
     )
     
     # Store job
-    jobs_db[job_id] = job
-    
-    # Submit to RunPod in background
-    background_tasks.add_task(
-        submit_to_runpod,
-        job_id,
-        request.video_url,
-        params
-    )
+    await save_job(job)
+    
+    # Submitted to RunPod once the scheduler gives it GPUs
+    enqueue_job(job, tenant, priority)
     
     return job
 
@@ -61,60 +223,100 @@ async def submit_to_runpod(
     params: VideoProcessingParams
 ):
     """Submit job to RunPod (background task)"""
+    # Another worker already submitted it, or is doing so, or it was cancelled
+    now = datetime.utcnow()
+    until = (now + timedelta(seconds=SUBMIT_CLAIM_SECONDS)).isoformat()
+    if not await job_store.claim(job_id, until, now.isoformat()):
+        release_job(job_id)
+        return
+    
     try:
         # Submit to RunPod
-        runpod_job = runpod_client.submit_job(video_url, params)
+        runpod_job = await asyncio.to_thread(runpod_client.submit_job, video_url, params)
         
-        # Update job status
-        job = jobs_db[job_id]
-        job.status = "processing"
-        job.updatedAt = datetime.utcnow().isoformat()
+        # Update job status, unless it was cancelled while RunPod answered
+        job = await job_store.get(job_id)
+        if job is not None and job.status == "queued":
+            job.status = "processing"
+            job.runpod_job_id = runpod_job.runpod_job_id
+            job.input_video_url = video_url
+            job.parameters = {**(job.parameters or {}), **params.dict()}
+            job.updatedAt = datetime.utcnow().isoformat()
+            
+            if await save_job(job, expected=("queued",)):
+                # Status is refreshed in the background from now on
+                status_poller.track(job_id, runpod_job.runpod_job_id)
+                return
+            job = await job_store.get(job_id)
+        
+        # Cancelled while we were submitting; stop it before a worker spends time on it
+        await asyncio.to_thread(runpod_client.cancel_job, runpod_job.runpod_job_id)
+        if job is not None:
+            job.runpod_job_id = runpod_job.runpod_job_id
+            await save_job(job, expected=(job.status,))
+        release_job(job_id)
         
     except Exception as e:
         # Update job with error
-        job = jobs_db[job_id]
-        job.status = "failed"
-        job.error = str(e)
-        job.updatedAt = datetime.utcnow().isoformat()
+        job = await job_store.get(job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = str(e)
+            job.updatedAt = datetime.utcnow().isoformat()
+            await save_job(job, expected=("queued",))
+        release_job(job_id)
 
 @router.post("/{job_id}/cancel")
 async def cancel_job(job_id: str):
     """Cancel a processing job"""
     
-    if job_id not in jobs_db:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs_db[job_id]
-    
-    if job.status in ["completed", "failed"]:
+    if job.status in TERMINAL_STATUSES:
         raise HTTPException(
             status_code=400,
             detail=f"Cannot cancel job in {job.status} state"
         )
     
-    # Cancel in RunPod
-    success = runpod_client.cancel_job(job_id)
-    
-    if success:
+    # A job still waiting for GPUs just leaves the queue; one still being
+    # submitted has no RunPod id yet and is cancelled by submit_to_runpod
+    # once it finds the job cancelled
+    if not job.runpod_job_id:
+        withdrawn = job_queue.withdraw(job_id)
         job.status = "cancelled"
         job.updatedAt = datetime.utcnow().isoformat()
-        return {"message": "Job cancelled successfully"}
-    else:
+        if await save_job(job, expected=("queued",)):
+            if withdrawn:
+                dispatch_jobs()
+            return {"message": "Job cancelled successfully"}
+        # It reached RunPod (or finished) since we read it
+        job = await job_store.get(job_id)
+        if job is None or job.status in TERMINAL_STATUSES or not job.runpod_job_id:
+            raise HTTPException(status_code=409, detail="Job changed state, try again")
+    
+    # RunPod knows the job by its own id
+    if not await asyncio.to_thread(runpod_client.cancel_job, job.runpod_job_id):
         raise HTTPException(status_code=500, detail="Failed to cancel job")
+    
+    # A status update may have finished the job meanwhile; otherwise it is cancelled
+    status_poller.untrack(job_id)
+    while job is not None and job.status not in TERMINAL_STATUSES:
+        current = job.status
+        job.status = "cancelled"
+        job.updatedAt = datetime.utcnow().isoformat()
+        if await save_job(job, expected=(current,)):
+            break
+        job = await job_store.get(job_id)
+    release_job(job_id)
+    return {"message": "Job cancelled successfully"}
 
 @router.get("/estimate")
 async def estimate_cost(resolution: str = "720p") -> dict:
     """Estimate processing cost"""
     
-    # GPU requirements by resolution (H100-80G)
-    # Based on official SeedVR2 documentation
-    gpu_config = {
-        "720p": {"gpus": 1, "avg_minutes": 7},   # 1x H100-80G
-        "1080p": {"gpus": 4, "avg_minutes": 10}, # 4x H100-80G with sp_size=4
-        "2k": {"gpus": 4, "avg_minutes": 15}     # 4x H100-80G with sp_size=4
-    }
-    
-    config = gpu_config.get(resolution, gpu_config["720p"])
+    config = gpu_config(resolution)
     
     # Calculate cost (H100-80G on RunPod)
     gpu_cost_per_hour = 3.50  # Updated H100-80G pricing
@@ -131,4 +333,12 @@ async def estimate_cost(resolution: str = "720p") -> dict:
         "estimated_minutes": config["avg_minutes"],
         "estimated_cost": round(total_cost, 2),
         "currency": "USD"
-    }
\ No newline at end of file
+    }
+
+@router.get("/queue")
+async def queue_stats(job_id: Optional[str] = None) -> dict:
+    """Scheduler state, recent queue waits and optionally one job's place in line"""
+    stats = job_queue.stats()
+    if job_id is not None:
+        stats["position"] = job_queue.position(job_id)
+    return stats
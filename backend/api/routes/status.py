@@ -1,47 +1,92 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Optional, Tuple
 import asyncio
+import base64
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-from ..models.schemas import ProcessingJob
+from ..models.schemas import ProcessingJob, JobHistoryPage
+from ..services.job_events import job_events, snapshot_delta
 
 router = APIRouter()
 
-# Import jobs_db from process.py (in production, use proper database)
-from .process import jobs_db
+from ..services.job_store import job_store
+from ..services.job_gc import job_gc
+from .process import TERMINAL_STATUSES
+
+# Seconds a watcher may block a send before it is dropped
+WS_SEND_TIMEOUT = 10.0
+SSE_HEARTBEAT_SECONDS = 15.0
+HISTORY_MAX_LIMIT = 100
+
+def _encode_cursor(job: dict) -> str:
+    raw = json.dumps([job["createdAt"], job["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, job_id = json.loads(raw)
+        return str(created_at), str(job_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _utc_iso(value: Optional[datetime]) -> Optional[str]:
+    """Match the naive UTC isoformat used for createdAt"""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+@router.get("/history", response_model=JobHistoryPage)
+async def get_job_history(
+    limit: int = Query(10, ge=1, le=HISTORY_MAX_LIMIT),
+    status: Optional[str] = None,
+    resolution: Optional[str] = None,
+    seed: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|compact)$")
+) -> JobHistoryPage:
+    """Get job history, newest first, one page at a time
+
+    Pass the returned next_cursor back as cursor to fetch the following
+    page. view=compact returns only the fields the history list needs.
+    """
+    
+    # Keyset pagination on (createdAt, id): every page is an index range scan
+    jobs = await job_store.page_jobs(
+        status=status,
+        resolution=resolution,
+        seed=seed,
+        created_after=_utc_iso(created_after),
+        created_before=_utc_iso(created_before),
+        before=_decode_cursor(cursor) if cursor else None,
+        limit=limit + 1,
+        compact=view == "compact"
+    )
+    
+    next_cursor = None
+    if len(jobs) > limit:
+        jobs = jobs[:limit]
+        next_cursor = _encode_cursor(jobs[-1])
+    
+    return JobHistoryPage(jobs=jobs, next_cursor=next_cursor)
 
 @router.get("/{job_id}", response_model=ProcessingJob)
 async def get_job_status(job_id: str) -> ProcessingJob:
     """Get status of a specific job"""
     
-    if job_id not in jobs_db:
+    # Kept up to date by the background status poller; no upstream call here
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs_db[job_id]
-    
-    # Update job status from RunPod if processing
-    if job.status == "processing":
-        try:
-            from ..services.runpod_client import runpod_client
-            status = runpod_client.get_job_status(job_id)
-            
-            job.status = status["status"]
-            job.progress = status.get("progress")
-            
-            if status["status"] == "completed":
-                job.resultUrl = status["output"].get("result_url")
-            elif status["status"] == "failed":
-                job.error = status.get("error", "Unknown error")
-            
-            job.updatedAt = datetime.utcnow().isoformat()
-            
-        except Exception as e:
-            # Log error but don't fail the request
-            print(f"Error updating job status: {e}")
-    
-    # Estimate remaining time
-    if job.status == "processing" and job.progress:
+    # Without a worker-reported ETA, extrapolate from progress so far
+    if job.status == "processing" and job.progress and job.estimatedTimeRemaining is None:
         elapsed = (datetime.utcnow() - datetime.fromisoformat(job.createdAt)).total_seconds()
         if job.progress > 0:
             total_estimated = elapsed / job.progress
@@ -49,76 +94,139 @@ async def get_job_status(job_id: str) -> ProcessingJob:
     
     return job
 
-@router.get("/history", response_model=List[ProcessingJob])
-async def get_job_history(
-    limit: int = 10,
-    status: str = None
-) -> List[ProcessingJob]:
-    """Get job history"""
-    
-    jobs = list(jobs_db.values())
-    
-    # Filter by status if provided
-    if status:
-        jobs = [j for j in jobs if j.status == status]
-    
-    # Sort by creation date (newest first)
-    jobs.sort(key=lambda j: j.createdAt, reverse=True)
-    
-    # Limit results
-    return jobs[:limit]
-
 @router.websocket("/ws/{job_id}")
 async def job_status_websocket(websocket: WebSocket, job_id: str):
-    """WebSocket endpoint for real-time job status updates"""
+    """WebSocket endpoint for real-time job status updates
+
+    Sends the full job once, then only the fields that changed, pushed as
+    soon as the job transitions. A watcher that cannot keep up only ever
+    sees the newest state; one that stops reading is disconnected.
+    """
     
     await websocket.accept()
     
+    # Subscribed before the read, so no transition can fall between the two
+    subscription = job_events.subscribe(job_id)
     try:
-        while True:
-            if job_id not in jobs_db:
-                await websocket.send_json({
-                    "error": "Job not found"
-                })
-                break
-            
-            job = jobs_db[job_id]
-            
-            # Send current status
-            await websocket.send_json(job.dict())
-            
-            # If job is complete, close connection
-            if job.status in ["completed", "failed", "cancelled"]:
-                break
+        job = await job_store.get(job_id)
+    except BaseException:
+        job_events.unsubscribe(subscription)
+        raise
+    if job is None:
+        job_events.unsubscribe(subscription)
+        await websocket.send_json({
+            "error": "Job not found"
+        })
+        await websocket.close()
+        return
+    
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(websocket))
+    
+    try:
+        last = job.dict()
+        await asyncio.wait_for(websocket.send_json(last), WS_SEND_TIMEOUT)
+        
+        while last["status"] not in TERMINAL_STATUSES:
+            next_snapshot = asyncio.ensure_future(subscription.next())
+            done, _ = await asyncio.wait(
+                {next_snapshot, disconnected},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                next_snapshot.cancel()
+                return
             
-            # Wait before next update
-            await asyncio.sleep(2)
+            snapshot = next_snapshot.result()
+            delta = snapshot_delta(last, snapshot) if _is_newer(snapshot, last) else None
+            if delta:
+                delta["id"] = job_id
+                await asyncio.wait_for(websocket.send_json(delta), WS_SEND_TIMEOUT)
+                last = snapshot
+        
+        await websocket.close()
             
-    except WebSocketDisconnect:
+    except (WebSocketDisconnect, asyncio.TimeoutError):
         pass
     except Exception as e:
         await websocket.send_json({
             "error": str(e)
         })
-    finally:
         await websocket.close()
+    finally:
+        disconnected.cancel()
+        job_events.unsubscribe(subscription)
+
+def _is_newer(snapshot: Dict[str, Any], last: Dict[str, Any]) -> bool:
+    """Whether an event is not older than what the watcher already has
+
+    Events published before the initial read may still be in the mailbox.
+    """
+    return (snapshot.get("updatedAt") or "") >= (last.get("updatedAt") or "")
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Drain client messages until the socket closes"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+@router.get("/sse/{job_id}")
+async def job_status_events(job_id: str):
+    """Server-Sent Events variant of the status stream for clients without WebSockets"""
+    
+    if await job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def event_stream():
+        # Created inside the generator so it is released however the stream ends
+        subscription = job_events.subscribe(job_id)
+        try:
+            job = await job_store.get(job_id)
+            if job is None:
+                return
+            last = job.dict()
+            yield f"event: snapshot\ndata: {json.dumps(last)}\n\n"
+            
+            while last["status"] not in TERMINAL_STATUSES:
+                try:
+                    snapshot = await asyncio.wait_for(subscription.next(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                delta = snapshot_delta(last, snapshot) if _is_newer(snapshot, last) else None
+                if delta:
+                    delta["id"] = job_id
+                    yield f"event: update\ndata: {json.dumps(delta)}\n\n"
+                    last = snapshot
+        finally:
+            job_events.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.delete("/cleanup")
 async def cleanup_old_jobs(days: int = 1):
-    """Clean up old completed jobs"""
+    """Clean up old completed jobs and their files ahead of their expiry"""
     
     cutoff_date = datetime.utcnow() - timedelta(days=days)
     deleted_count = 0
     
-    jobs_to_delete = []
-    for job_id, job in jobs_db.items():
-        job_date = datetime.fromisoformat(job.updatedAt)
-        if job_date < cutoff_date and job.status in ["completed", "failed", "cancelled"]:
-            jobs_to_delete.append(job_id)
-    
-    for job_id in jobs_to_delete:
-        del jobs_db[job_id]
-        deleted_count += 1
+    # ISO timestamps sort lexically, so this is a range scan on updatedAt
+    while True:
+        jobs_to_delete = await job_store.find_updated_before(cutoff_date.isoformat(), TERMINAL_STATUSES)
+        collected = 0
+        for job_id in jobs_to_delete:
+            if await job_gc.collect(job_id):
+                collected += 1
+        deleted_count += collected
+        # Jobs whose artifacts could not be deleted stay for the next run
+        if collected == 0:
+            break
     
     return {
         "deleted_jobs": deleted_count,
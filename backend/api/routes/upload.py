@@ -1,9 +1,11 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Dict
+from fastapi import APIRouter, HTTPException, Request
+from typing import Any, Dict, Optional
 import os
-import uuid
 from pathlib import Path
-import aiofiles
+
+from ..services.blob_store import BlobIndex, BlobSink, BlobStore, CONTENT_SHA256_HEADER
+from ..services.ingest import ingest_multipart
+from ..services.storage import AsyncStorage, LocalBackend
 
 router = APIRouter()
 
@@ -12,59 +14,68 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 
 ALLOWED_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm'}
 MAX_FILE_SIZE = int(os.getenv("MAX_VIDEO_SIZE_MB", "2048")) * 1024 * 1024  # Convert MB to bytes
+BLOB_INDEX_PATH = os.getenv("BLOB_INDEX_PATH", "data/blobs.db")
+
+# Uploads are stored once per distinct content and reference counted
+blob_store = BlobStore(
+    AsyncStorage(LocalBackend(str(UPLOAD_DIR), "/uploads")),
+    BlobIndex(BLOB_INDEX_PATH)
+)
 
 @router.post("/")
-async def upload_video(video: UploadFile = File(...)) -> Dict[str, str]:
+async def upload_video(request: Request) -> Dict[str, Any]:
     """Upload a video file for processing"""
-    
-    # Validate file extension
-    file_extension = Path(video.filename).suffix.lower()
-    if file_extension not in ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file format. Allowed formats: {', '.join(ALLOWED_EXTENSIONS)}"
-        )
-    
-    # Generate unique filename
-    file_id = str(uuid.uuid4())
-    filename = f"{file_id}{file_extension}"
-    file_path = UPLOAD_DIR / filename
-    
-    # Save file with size validation
-    total_size = 0
-    async with aiofiles.open(file_path, 'wb') as f:
-        while chunk := await video.read(1024 * 1024):  # Read 1MB at a time
-            total_size += len(chunk)
-            if total_size > MAX_FILE_SIZE:
-                # Delete partial file
-                await aiofiles.os.remove(file_path)
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"File too large. Maximum size: {MAX_FILE_SIZE // (1024 * 1024)}MB"
-                )
-            await f.write(chunk)
-    
-    # Generate URL for the uploaded file
-    # In production, this would be an S3 URL
-    video_url = f"/uploads/{filename}"
-    
+
+    def validate_filename(name: str):
+        # Validate file extension
+        file_extension = Path(name).suffix.lower()
+        if file_extension not in ALLOWED_EXTENSIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file format. Allowed formats: {', '.join(ALLOWED_EXTENSIONS)}"
+            )
+
+    sink: Optional[BlobSink] = None
+
+    async def open_sink(name: str, content_type: str) -> BlobSink:
+        nonlocal sink
+        # A client that declares a digest we already hold is only hashed, never written
+        sink = await blob_store.open_writer(name, content_type, request.headers.get(CONTENT_SHA256_HEADER))
+        return sink
+
+    # Hash while streaming; duplicates of a stored blob only add a reference
+    upload = await ingest_multipart(
+        request,
+        open_sink,
+        file_field="video",
+        max_size=MAX_FILE_SIZE,
+        validate_filename=validate_filename
+    )
+
     return {
-        "video_url": video_url,
-        "file_id": file_id,
-        "filename": video.filename,
-        "size": total_size
+        "video_url": upload["url"],
+        "file_id": sink.upload_id,
+        "filename": upload["filename"],
+        "size": upload["size"],
+        "sha256": sink.hexdigest(),
+        "deduplicated": sink.deduplicated
     }
 
 @router.delete("/{file_id}")
 async def delete_upload(file_id: str):
     """Delete an uploaded file"""
-    
-    # Find file with this ID
+
+    # Drop this upload's reference; the blob goes with its last reference
+    blob = await blob_store.release(file_id)
+    if blob is not None:
+        return {"message": "File deleted successfully", "remaining_references": blob["refcount"]}
+
+    # Files uploaded before content addressing
     for file in UPLOAD_DIR.glob(f"{file_id}.*"):
         try:
             os.remove(file)
             return {"message": "File deleted successfully"}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
-    
-    raise HTTPException(status_code=404, detail="File not found")
\ No newline at end of file
+
+    raise HTTPException(status_code=404, detail="File not found")
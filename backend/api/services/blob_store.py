@@ -0,0 +1,398 @@
+import re
+import hmac
+import time
+import uuid
+import asyncio
+import secrets
+import functools
+import hashlib
+import sqlite3
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Header a client may send with the SHA-256 of the file it is uploading
+CONTENT_SHA256_HEADER = "x-content-sha256"
+# Bytes of a stored blob a client hashes to prove it holds the file
+CHALLENGE_BYTES = 64 * 1024
+# Stored blob names: the digest and a random suffix, so knowing a hash does not reveal the URL
+_BLOB_STEM = re.compile(r"([0-9a-f]{64})(?:-[0-9a-f]+)?")
+
+class BlobIndex:
+    """SQLite index of stored blobs, their reference counts and the uploads holding them"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blobs (
+            digest TEXT PRIMARY KEY,
+            object_name TEXT NOT NULL,
+            url TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS blob_refs (
+            upload_id TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            filename TEXT,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_blob_refs_digest ON blob_refs (digest);
+        CREATE INDEX IF NOT EXISTS idx_blob_refs_created ON blob_refs (created_at);
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return dict(row) if row else None
+
+    def refs_before(self, cutoff: str, limit: int = 1000) -> List[str]:
+        """Upload ids whose reference was taken before cutoff, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_id FROM blob_refs WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                (cutoff, limit)
+            ).fetchall()
+        return [row["upload_id"] for row in rows]
+
+    def digest_of(self, upload_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT digest FROM blob_refs WHERE upload_id = ?", (upload_id,)).fetchone()
+        return row["digest"] if row else None
+
+    def add_ref(self, upload_id: str, digest: str, object_name: str, url: str, size: int,
+                filename: Optional[str] = None) -> Dict[str, Any]:
+        """Record one more upload of digest, creating the blob row on first sight"""
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO blobs (digest, object_name, url, size, refcount, created_at) "
+                    "VALUES (?, ?, ?, ?, 1, ?) "
+                    "ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1",
+                    (digest, object_name, url, size, now)
+                )
+                self._conn.execute(
+                    "INSERT INTO blob_refs (upload_id, digest, filename, created_at) VALUES (?, ?, ?, ?)",
+                    (upload_id, digest, filename, now)
+                )
+                row = self._conn.execute("SELECT * FROM blobs WHERE digest = ?", (digest,)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(row)
+
+    def release(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Drop an upload's reference; the returned blob has refcount 0 once it is unreferenced"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ref = self._conn.execute(
+                    "SELECT digest FROM blob_refs WHERE upload_id = ?", (upload_id,)
+                ).fetchone()
+                if ref is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                self._conn.execute("DELETE FROM blob_refs WHERE upload_id = ?", (upload_id,))
+                self._conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE digest = ?", (ref["digest"],))
+                row = dict(self._conn.execute("SELECT * FROM blobs WHERE digest = ?", (ref["digest"],)).fetchone())
+                if row["refcount"] <= 0:
+                    self._conn.execute("DELETE FROM blobs WHERE digest = ?", (ref["digest"],))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS stored_bytes, "
+                "COALESCE(SUM(size * refcount), 0) AS logical_bytes, COALESCE(SUM(refcount), 0) AS refs FROM blobs"
+            ).fetchone()
+        return dict(row)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class HashingSink:
+    """Upload sink wrapper that SHA-256s the bytes as they stream through
+
+    The digest is the input key of the result cache and the address of a
+    stored blob. Without a sink the stream is only hashed.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.name = sink.name if sink is not None else None
+        self._sha256 = hashlib.sha256()
+
+    async def write(self, data: bytes):
+        if self.sink is None:
+            await asyncio.to_thread(self._sha256.update, data)
+            return
+        # Hash off the event loop while the same window is written to storage
+        await asyncio.gather(asyncio.to_thread(self._sha256.update, data), self.sink.write(data))
+
+    async def commit(self) -> str:
+        return await self.sink.commit()
+
+    async def abort(self):
+        if self.sink is not None:
+            await self.sink.abort()
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+class BlobSink:
+    """Upload sink that hashes the stream and files it under its content digest
+
+    Bytes go to a staging object while they are hashed. On commit a new
+    digest is renamed into place; a digest that is already stored only gains
+    a reference and the staging copy is dropped. When the client declared a
+    digest that is already stored, nothing is written at all: the stream is
+    only hashed to prove the claim.
+    """
+
+    def __init__(self, store: "BlobStore", upload_id: str, filename: str,
+                 staging=None, expected_sha256: Optional[str] = None):
+        self.store = store
+        self.upload_id = upload_id
+        self.filename = filename
+        self.staging = staging
+        self.expected_sha256 = expected_sha256
+        self.name = staging.name if staging is not None else None
+        self.size = 0
+        self.blob: Optional[Dict[str, Any]] = None
+        self.deduplicated = False
+        self._hashing = HashingSink(staging)
+
+    async def write(self, data: bytes):
+        self.size += len(data)
+        await self._hashing.write(data)
+
+    def hexdigest(self) -> str:
+        return self._hashing.hexdigest()
+
+    async def commit(self) -> str:
+        digest = self.hexdigest()
+        if self.expected_sha256 and digest != self.expected_sha256:
+            await self.abort()
+            raise HTTPException(status_code=400, detail="Uploaded bytes do not match the declared SHA-256")
+
+        async with self.store.digest_lock(digest):
+            existing = await self.store.run_index(self.store.index.get, digest)
+            if existing is not None:
+                await self.abort()
+                self.deduplicated = True
+                object_name, url = existing["object_name"], existing["url"]
+            elif self.staging is None:
+                # The declared blob was released while this upload streamed
+                raise HTTPException(status_code=409, detail="Blob no longer stored, upload it again")
+            else:
+                await self.staging.commit()
+                object_name = self.store.object_name(digest, self.filename)
+                url = await self.store.storage.move(self.staging.name, object_name)
+            self.blob = await self.store.run_index(
+                self.store.index.add_ref, self.upload_id, digest, object_name, url, self.size, self.filename
+            )
+
+        if self.deduplicated:
+            self.store.deduplicated += 1
+            self.store.bytes_saved += self.size
+            logger.info(f"Upload {self.upload_id} deduplicated against blob {digest[:12]}")
+        else:
+            self.store.stored += 1
+        return url
+
+    async def abort(self):
+        await self._hashing.abort()
+
+class BlobStore:
+    """Content-addressed uploads with reference counting on top of AsyncStorage"""
+
+    def __init__(self, storage, index: BlobIndex, prefix: str = "blobs",
+                 challenge_secret: Optional[str] = None, challenge_ttl: int = 300):
+        self.storage = storage
+        self.index = index
+        self.prefix = prefix
+        # Signs possession challenges, so any process sharing the secret can check them
+        self.challenge_secret = challenge_secret.encode() if challenge_secret else secrets.token_bytes(32)
+        self.challenge_ttl = challenge_ttl
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        # Index calls can wait on SQLite's busy timeout, so they run on their own thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blob-index")
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_saved = 0
+
+    async def run_index(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking BlobIndex call off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def digest_lock(self, digest: str) -> asyncio.Lock:
+        """Serialises commit and release of one digest"""
+        lock = self._locks.get(digest)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[digest] = lock
+        return lock
+
+    def object_name(self, digest: str, filename: str) -> str:
+        return f"{self.prefix}/{digest}-{secrets.token_hex(16)}{Path(filename).suffix.lower()}"
+
+    def digest_for_url(self, url: Optional[str]) -> Optional[str]:
+        """Digest of the stored blob a URL points at, or None if it is not one of ours"""
+        name = self.storage.object_name(url) if url else None
+        if name is None or not name.startswith(f"{self.prefix}/") or "/" in name[len(self.prefix) + 1:]:
+            return None
+        match = _BLOB_STEM.fullmatch(Path(name).stem)
+        return match.group(1) if match else None
+
+    def _challenge_signature(self, digest: str, offset: int, length: int, expires: int) -> str:
+        message = f"{digest}\n{offset}\n{length}\n{expires}".encode()
+        return hmac.new(self.challenge_secret, message, hashlib.sha256).hexdigest()
+
+    async def challenge(self, digest: str) -> Optional[Dict[str, Any]]:
+        """A random range of a stored blob the client must hash to claim it, or None if not stored
+
+        Knowing a digest is not enough to reuse someone else's upload; the
+        answer needs the bytes. The challenge is signed rather than kept.
+        """
+        blob = await self.run_index(self.index.get, digest.lower())
+        if blob is None:
+            return None
+        length = min(CHALLENGE_BYTES, blob["size"])
+        offset = secrets.randbelow(blob["size"] - length + 1)
+        expires = int(time.time()) + self.challenge_ttl
+        signature = self._challenge_signature(digest.lower(), offset, length, expires)
+        return {"offset": offset, "length": length, "token": f"{offset}.{length}.{expires}.{signature}"}
+
+    async def verify_possession(self, digest: str, token: str, proof: str) -> bool:
+        """Whether proof is the SHA-256 (hex) of the range a valid challenge for digest named"""
+        digest = digest.lower()
+        try:
+            offset, length, expires, signature = token.split(".")
+            offset, length, expires = int(offset), int(length), int(expires)
+        except (AttributeError, ValueError):
+            return False
+        expected = self._challenge_signature(digest, offset, length, expires)
+        if expires < time.time() or not hmac.compare_digest(signature.encode(), expected.encode()):
+            return False
+        blob = await self.run_index(self.index.get, digest)
+        if blob is None:
+            return False
+        data = await self.storage.read_range(blob["object_name"], offset, length)
+        return hmac.compare_digest(hashlib.sha256(data).hexdigest().encode(), str(proof).lower().encode())
+
+    async def reference(self, upload_id: str, digest: str) -> Optional[str]:
+        """Take a reference to a blob that is already stored, without any upload
+
+        Returns its URL, or None if the digest is not stored.
+        """
+        digest = digest.lower()
+        async with self.digest_lock(digest):
+            existing = await self.run_index(self.index.get, digest)
+            if existing is None:
+                return None
+            await self.run_index(self.index.add_ref, upload_id, digest, existing["object_name"], existing["url"],
+                                 existing["size"])
+        self.deduplicated += 1
+        self.bytes_saved += existing["size"]
+        return existing["url"]
+
+    async def open_writer(self, filename: str, content_type: Optional[str] = None,
+                          expected_sha256: Optional[str] = None) -> BlobSink:
+        """Sink for one upload; pass the client's declared digest to skip storing known blobs"""
+        upload_id = str(uuid.uuid4())
+        expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        if expected_sha256 and await self.run_index(self.index.get, expected_sha256) is not None:
+            return BlobSink(self, upload_id, filename, expected_sha256=expected_sha256)
+        staging = await self.storage.open_writer(
+            f"{self.prefix}/staging/{upload_id}{Path(filename).suffix.lower()}", content_type
+        )
+        return BlobSink(self, upload_id, filename, staging, expected_sha256)
+
+    async def adopt(self, upload_id: str, name: str, filename: str, digest: str, size: int) -> str:
+        """File an object the client uploaded directly, already hashed to digest
+
+        A new digest is renamed into place; a known one only gains a reference
+        and the uploaded copy is deleted.
+        """
+        async with self.digest_lock(digest):
+            existing = await self.run_index(self.index.get, digest)
+            if existing is not None:
+                await self.storage.delete(name)
+                object_name, url = existing["object_name"], existing["url"]
+            else:
+                object_name = self.object_name(digest, filename)
+                url = await self.storage.move(name, object_name)
+            await self.run_index(self.index.add_ref, upload_id, digest, object_name, url, size, filename)
+
+        if existing is not None:
+            self.deduplicated += 1
+            self.bytes_saved += size
+            logger.info(f"Direct upload {upload_id} deduplicated against blob {digest[:12]}")
+        else:
+            self.stored += 1
+        return url
+
+    async def release(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Drop one upload's reference, deleting the blob with its last reference"""
+        digest = await self.run_index(self.index.digest_of, upload_id)
+        if digest is None:
+            return None
+        async with self.digest_lock(digest):
+            blob = await self.run_index(self.index.release, upload_id)
+            if blob is not None and blob["refcount"] <= 0:
+                try:
+                    await self.storage.delete(blob["object_name"])
+                except Exception as e:
+                    logger.warning(f"Failed to delete unreferenced blob {blob['object_name']}: {e}")
+        return blob
+
+    async def release_before(self, cutoff: str, batch_size: int = 1000) -> int:
+        """Release every reference taken before cutoff; returns how many were released"""
+        released = 0
+        while True:
+            upload_ids = await self.run_index(self.index.refs_before, cutoff, batch_size)
+            for upload_id in upload_ids:
+                if await self.release(upload_id) is not None:
+                    released += 1
+            if len(upload_ids) < batch_size:
+                return released
+
+    async def stats(self) -> Dict[str, Any]:
+        return dict(
+            await self.run_index(self.index.stats),
+            stored=self.stored,
+            deduplicated=self.deduplicated,
+            bytes_saved=self.bytes_saved
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.index.close()
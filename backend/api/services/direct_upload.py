@@ -0,0 +1,355 @@
+import re
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, Request, Response
+
+from .ingest import INGEST_WINDOW_SIZE
+from .storage import AsyncStorage, AsyncUploadSink
+
+logger = logging.getLogger(__name__)
+
+# Content-Range of a resumable chunk ("bytes 0-1023/4096") or status query ("bytes */4096")
+_CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)")
+
+class PendingUploadIndex:
+    """SQLite record of issued direct uploads, shared by every worker process
+
+    A completion claims its upload for claim_ttl seconds, so two workers
+    never verify the same upload and a worker that dies mid-way only holds
+    it until the claim lapses.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS pending_uploads (
+            upload_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            content_type TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            claimed_until REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_pending_uploads_expires ON pending_uploads (expires_at);
+    """
+
+    def __init__(self, path: str, claim_ttl: float = 900.0):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.claim_ttl = claim_ttl
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+
+    def add(self, upload_id: str, pending: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pending_uploads (upload_id, name, filename, content_type, size, params, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (upload_id, pending["name"], pending["filename"], pending["content_type"],
+                 pending["size"], json.dumps(pending["params"]), pending["expires_at"])
+            )
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM pending_uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        if row is None:
+            return None
+        pending = dict(row)
+        pending["params"] = json.loads(pending["params"])
+        return pending
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending_uploads").fetchone()[0]
+
+    def claim(self, upload_id: str, now: float) -> bool:
+        """Take an unexpired upload nobody else is completing"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE pending_uploads SET claimed_until = ? WHERE upload_id = ? AND expires_at > ? "
+                "AND (claimed_until IS NULL OR claimed_until <= ?)",
+                (now + self.claim_ttl, upload_id, now, now)
+            )
+        return cursor.rowcount == 1
+
+    def unclaim(self, upload_id: str):
+        with self._lock:
+            self._conn.execute("UPDATE pending_uploads SET claimed_until = NULL WHERE upload_id = ?", (upload_id,))
+
+    def remove(self, upload_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM pending_uploads WHERE upload_id = ?", (upload_id,))
+
+    def expired(self, now: float, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Uploads past their deadline that no completion holds, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT upload_id, name FROM pending_uploads WHERE expires_at <= ? "
+                "AND (claimed_until IS NULL OR claimed_until <= ?) ORDER BY expires_at LIMIT ?",
+                (now, now, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove_expired(self, upload_id: str, now: float) -> bool:
+        """Delete an expired, unclaimed upload; False if another worker got there first"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM pending_uploads WHERE upload_id = ? AND expires_at <= ? "
+                "AND (claimed_until IS NULL OR claimed_until <= ?)",
+                (upload_id, now, now)
+            )
+        return cursor.rowcount == 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class DirectUploads:
+    """Uploads that go from the client straight to the store
+
+    issue() reserves a staging object and returns a URL the client uploads
+    it to: a GCS resumable session, or the app's own signed receiver for
+    local storage. complete() checks what arrived against what was declared
+    (size, content type, optional MD5 and SHA-256) and files it. Pending
+    uploads live in a PendingUploadIndex until completed or expired, so any
+    worker can complete them and they survive a restart; prune() deletes
+    what expired uploads left behind.
+    """
+
+    def __init__(self, storage: AsyncStorage, blobs, index: PendingUploadIndex,
+                 prefix: str = "inputs/direct", ttl: int = 3600, max_pending: int = 10000):
+        self.storage = storage
+        self.blobs = blobs
+        self.index = index
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-index")
+        self.issued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    async def run_index(self, fn: Callable, *args) -> Any:
+        """Run a blocking PendingUploadIndex call off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args))
+
+    async def _discard(self, name: str):
+        try:
+            await self.storage.delete(name)
+        except Exception as e:
+            # Unfinished GCS sessions never became objects
+            logger.debug(f"Nothing to discard for {name}: {e}")
+
+    async def prune(self) -> int:
+        """Forget expired uploads and delete whatever they left behind"""
+        now = time.time()
+        pruned = 0
+        for pending in await self.run_index(self.index.expired, now):
+            if await self.run_index(self.index.remove_expired, pending["upload_id"], now):
+                self.expired += 1
+                pruned += 1
+                await self._discard(pending["name"])
+        return pruned
+
+    async def issue(self, filename: str, content_type: str, size: int, params: Dict[str, Any],
+                    origin: Optional[str] = None) -> Dict[str, Any]:
+        """Reserve an upload of exactly size bytes and return where to send them"""
+        await self.prune()
+        if await self.run_index(self.index.count) >= self.max_pending:
+            raise HTTPException(status_code=503, detail="Too many pending uploads, try again later")
+
+        upload_id = str(uuid.uuid4())
+        name = f"{self.prefix}/staging/{upload_id}{Path(filename).suffix.lower()}"
+        url = await self.storage.upload_session(name, content_type, size, self.ttl, origin)
+        await self.run_index(self.index.add, upload_id, {
+            "name": name,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "params": params,
+            "expires_at": time.time() + self.ttl
+        })
+        self.issued += 1
+        return {
+            "upload_id": upload_id,
+            "upload_url": url,
+            "method": "PUT",
+            "headers": {"Content-Type": content_type},
+            "resumable": True,
+            "expires_in": self.ttl
+        }
+
+    async def complete(self, upload_id: str, sha256: Optional[str] = None,
+                       md5: Optional[str] = None) -> Dict[str, Any]:
+        """Verify a finished upload and file it; md5 is base64 as in Content-MD5
+
+        With sha256 the object is hashed on the storage pool and stored
+        content-addressed, so duplicates share one blob and the result cache
+        applies; without it the object only moves out of staging.
+        """
+        now = time.time()
+        pending = await self.run_index(self.index.get, upload_id)
+        if pending is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired upload")
+        name = pending["name"]
+        if pending["expires_at"] <= now:
+            if await self.run_index(self.index.remove_expired, upload_id, now):
+                self.expired += 1
+                await self._discard(name)
+            raise HTTPException(status_code=404, detail="Unknown or expired upload")
+        # A concurrent completion of the same upload, in any worker, gets a 404
+        if not await self.run_index(self.index.claim, upload_id, now):
+            raise HTTPException(status_code=404, detail="Unknown or expired upload")
+
+        filed = False
+        try:
+            info = await self.storage.stat(name)
+            if info is None:
+                raise HTTPException(status_code=409, detail="Upload has not finished yet")
+
+            problem = None
+            digest = None
+            if info["size"] != pending["size"]:
+                problem = f"Uploaded {info['size']} bytes but {pending['size']} were declared"
+            elif info["content_type"] not in (None, pending["content_type"]):
+                problem = f"Uploaded as {info['content_type']} but {pending['content_type']} was declared"
+            elif md5 and info["md5"] and md5 != info["md5"]:
+                problem = "Uploaded bytes do not match the declared MD5"
+            elif sha256:
+                digest = await self.storage.sha256(name)
+                if digest != sha256.lower():
+                    problem = "Uploaded bytes do not match the declared SHA-256"
+            if problem is not None:
+                await self.run_index(self.index.remove, upload_id)
+                filed = True
+                self.rejected += 1
+                await self._discard(name)
+                raise HTTPException(status_code=400, detail=problem)
+
+            if digest is not None:
+                url = await self.blobs.adopt(upload_id, name, pending["filename"], digest, info["size"])
+            else:
+                url = await self.storage.move(name, f"{self.prefix}/{upload_id}{Path(name).suffix}")
+            await self.run_index(self.index.remove, upload_id)
+            filed = True
+        finally:
+            # Anything still pending (not finished, or a storage error) can be completed again
+            if not filed:
+                await self.run_index(self.index.unclaim, upload_id)
+        self.completed += 1
+        return {
+            "url": url,
+            "size": info["size"],
+            "sha256": digest,
+            "filename": pending["filename"],
+            "params": pending["params"]
+        }
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": await self.run_index(self.index.count),
+            "issued": self.issued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.index.close()
+
+def _incomplete(received: int) -> Response:
+    """GCS-style 308 telling the client how much of the upload is stored"""
+    headers = {"Range": f"bytes=0-{received - 1}"} if received else {}
+    return Response(status_code=308, headers=headers)
+
+async def receive_local_upload(storage: AsyncStorage, name: str, request: Request,
+                               window_size: int = INGEST_WINDOW_SIZE) -> Response:
+    """Accept a direct upload for local storage the way a GCS resumable session does
+
+    The URL must carry a valid signature from LocalBackend.upload_session.
+    A plain PUT sends the whole object; chunks with Content-Range resume
+    where the stored bytes end, and an incomplete upload answers 308 with
+    the stored Range.
+    """
+    backend = storage.backend
+    if backend.name != "local":
+        raise HTTPException(status_code=404, detail="Direct uploads go to the bucket")
+
+    query = request.query_params
+    try:
+        content_type = query["content_type"]
+        size = int(query["size"])
+        expires = int(query["expires"])
+        signature = query["signature"]
+    except (KeyError, ValueError):
+        raise HTTPException(status_code=403, detail="Invalid upload URL")
+    if not backend.verify_upload(name, content_type, size, expires, signature):
+        raise HTTPException(status_code=403, detail="Upload URL is invalid or expired")
+    if request.headers.get("content-type", content_type) != content_type:
+        raise HTTPException(status_code=400, detail=f"Content-Type must be {content_type}")
+
+    if await storage.exists(name):
+        return Response(status_code=200)
+    received = backend.received_bytes(name)
+
+    start = 0
+    content_range = request.headers.get("content-range")
+    if content_range:
+        match = _CONTENT_RANGE.fullmatch(content_range.strip())
+        if match is None:
+            raise HTTPException(status_code=400, detail="Malformed Content-Range")
+        if match.group(3) != "*" and int(match.group(3)) != size:
+            raise HTTPException(status_code=400, detail=f"Upload size must be {size} bytes")
+        if match.group(1) is None or int(match.group(1)) > received:
+            # Status query, or a chunk past what we hold: report where to resume
+            return _incomplete(received)
+        start = int(match.group(1))
+
+    try:
+        writer = await storage.run("open_writer", backend.open_writer, name, content_type, start)
+    except BlockingIOError:
+        # Another request holds the part file; appending alongside it would interleave the bytes
+        raise HTTPException(status_code=409, detail="This upload is already being received")
+    sink = AsyncUploadSink(storage, writer)
+    written = start
+    window = bytearray()
+    try:
+        async for chunk in request.stream():
+            written += len(chunk)
+            if written > size:
+                raise HTTPException(status_code=400, detail=f"Upload exceeds the declared {size} bytes")
+            window += chunk
+            if len(window) >= window_size:
+                data, window = window, bytearray()
+                await sink.write(data)
+        if window:
+            await sink.write(window)
+    except BaseException:
+        # What reached the file is a valid prefix; the client resumes after it
+        await storage.run("abort", sink.sink.suspend)
+        raise
+
+    if written < size:
+        await storage.run("commit", sink.sink.suspend)
+        return _incomplete(written)
+    await sink.commit()
+    return Response(status_code=201)
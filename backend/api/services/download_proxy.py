@@ -0,0 +1,69 @@
+import logging
+from typing import AsyncIterator, Mapping, Optional
+import re
+from urllib.parse import quote, unquote, urlparse
+
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# Bytes held per download between upstream and client; the next read waits for the send
+PROXY_CHUNK_SIZE = 256 * 1024
+
+# Client headers that let the store answer partial and conditional requests itself
+FORWARDED_REQUEST_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+PASSTHROUGH_RESPONSE_HEADERS = (
+    "content-type", "content-length", "content-range", "content-encoding",
+    "accept-ranges", "etag", "last-modified", "cache-control"
+)
+
+def download_filename(url: str) -> str:
+    """Last path segment of a URL, without its query string"""
+    return unquote(urlparse(url).path.rsplit("/", 1)[-1]) or "download.mp4"
+
+def content_disposition(filename: str) -> str:
+    """Attachment header safe for any name: an ASCII fallback plus the RFC 5987 UTF-8 form"""
+    filename = re.sub(r"[\x00-\x1f\x7f]", "", filename) or "download.mp4"
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=utf-8''{quote(filename, safe='')}"
+
+async def _relay(upstream: httpx.Response, chunk_size: int) -> AsyncIterator[bytes]:
+    try:
+        # Raw bytes: the Content-Length and ETag passed through describe them
+        async for chunk in upstream.aiter_raw(chunk_size):
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+async def proxy_download(
+    client: httpx.AsyncClient,
+    url: str,
+    request_headers: Mapping[str, str],
+    filename: Optional[str] = None,
+    chunk_size: int = PROXY_CHUNK_SIZE
+) -> StreamingResponse:
+    """Stream url to the client as the bytes arrive, never holding more than a chunk
+
+    Range and conditional headers are forwarded, so seeking, resuming and
+    revalidation are answered by the store (206, 304 or 416 pass through).
+    """
+    headers = {name: request_headers[name] for name in FORWARDED_REQUEST_HEADERS if name in request_headers}
+    try:
+        upstream = await client.send(client.build_request("GET", url, headers=headers), stream=True)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Download failed: {e!r}")
+
+    if upstream.status_code >= 400:
+        await upstream.aclose()
+        logger.warning(f"Upstream download of {url} returned {upstream.status_code}")
+        status = upstream.status_code if upstream.status_code in (403, 404, 416) else 502
+        raise HTTPException(status_code=status, detail=f"Download failed: upstream returned {upstream.status_code}")
+
+    response_headers = {
+        name: upstream.headers[name] for name in PASSTHROUGH_RESPONSE_HEADERS if name in upstream.headers
+    }
+    response_headers.setdefault("content-type", "video/mp4")
+    response_headers["content-disposition"] = content_disposition(filename or download_filename(url))
+    return StreamingResponse(_relay(upstream, chunk_size), status_code=upstream.status_code, headers=response_headers)
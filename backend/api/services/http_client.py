@@ -0,0 +1,99 @@
+import random
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying; 429/503 mean the request was not processed
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+NOT_PROCESSED_STATUS_CODES = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def create_http_client(
+    base_url: str = "",
+    headers: Optional[Dict[str, str]] = None,
+    max_connections: int = 20,
+    max_keepalive_connections: int = 10,
+    keepalive_expiry: float = 30.0,
+    timeout: float = 10.0,
+    http2: bool = True
+) -> httpx.AsyncClient:
+    """Create a long-lived pooled client; share it instead of opening one per call"""
+    if http2 and not _http2_available():
+        logger.warning("h2 is not installed, falling back to HTTP/1.1 keep-alive")
+        http2 = False
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=headers,
+        http2=http2,
+        timeout=httpx.Timeout(timeout, connect=5.0),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+    )
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int,
+                 backoff: float, max_backoff: float) -> float:
+    """Honour Retry-After when given, otherwise exponential backoff with jitter"""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), max_backoff)
+            except ValueError:
+                pass
+    delay = min(backoff * (2 ** attempt), max_backoff)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+async def request_with_retry(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    retries: int = 3,
+    backoff: float = 0.5,
+    max_backoff: float = 8.0,
+    **kwargs
+) -> httpx.Response:
+    """Send a request, retrying 429/5xx responses and transient transport errors
+
+    Non-idempotent requests (POST) are only retried when the server cannot
+    have acted on them: connection failures, 429 and 503.
+    """
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    attempt = 0
+
+    while True:
+        response = None
+        try:
+            response = await client.request(method, url, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            if attempt >= retries:
+                raise
+            logger.warning(f"{method} {url} failed to connect ({e!r}), retrying")
+        except httpx.TransportError as e:
+            if not idempotent or attempt >= retries:
+                raise
+            logger.warning(f"{method} {url} failed ({e!r}), retrying")
+        else:
+            retryable = response.status_code in (
+                RETRY_STATUS_CODES if idempotent else NOT_PROCESSED_STATUS_CODES
+            )
+            if not retryable or attempt >= retries:
+                return response
+            logger.warning(f"{method} {url} returned {response.status_code}, retrying")
+
+        await asyncio.sleep(_retry_delay(response, attempt, backoff, max_backoff))
+        attempt += 1
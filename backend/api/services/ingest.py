@@ -0,0 +1,179 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Bytes held in memory per request before they are handed to the sink
+INGEST_WINDOW_SIZE = 8 * 1024 * 1024
+# Form fields are held in memory, so each one and all of them together are capped
+MAX_FIELD_SIZE = 64 * 1024
+MAX_FIELDS_SIZE = 256 * 1024
+
+class _PartCollector:
+    """Turn python-multipart callbacks into a list of events we can await on"""
+
+    def __init__(self, file_field: str, max_field_size: int = MAX_FIELD_SIZE,
+                 max_fields_size: int = MAX_FIELDS_SIZE):
+        self.file_field = file_field
+        self.max_field_size = max_field_size
+        self.max_fields_size = max_fields_size
+        self.events: List[Tuple[str, Any]] = []
+        # Bytes of every non-file part so far, headers excluded
+        self.field_bytes = 0
+        self._files = 0
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._name: Optional[str] = None
+        self._is_file = False
+        self._field_value = bytearray()
+
+    def callbacks(self) -> Dict[str, Callable]:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self):
+        self._headers = {}
+        self._name = None
+        self._is_file = False
+        self._field_value = bytearray()
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._name = options.get(b"name", b"").decode("latin-1")
+        filename = options.get(b"filename")
+        if filename is not None:
+            # Any other file part would have to be held in memory like a field
+            self._files += 1
+            if self._name != self.file_field or self._files > 1:
+                raise HTTPException(status_code=400, detail=f"Only one '{self.file_field}' file is allowed")
+            self._is_file = True
+            content_type = self._headers.get(b"content-type", b"application/octet-stream")
+            self.events.append(("file_start", (filename.decode("utf-8", "replace"), content_type.decode("latin-1"))))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._is_file:
+            self.events.append(("file_data", data[start:end]))
+        else:
+            self.field_bytes += end - start
+            if len(self._field_value) + end - start > self.max_field_size or self.field_bytes > self.max_fields_size:
+                raise HTTPException(status_code=413, detail="Form fields are too large")
+            self._field_value += data[start:end]
+
+    def _on_part_end(self):
+        if self._is_file:
+            self.events.append(("file_end", None))
+        elif self._name:
+            self.events.append(("field", (self._name, self._field_value.decode("utf-8", "replace"))))
+
+async def ingest_multipart(
+    request: Request,
+    open_sink: Callable[[str, str], Awaitable[Any]],
+    file_field: str = "video",
+    max_size: int = 500 * 1024 * 1024,
+    window_size: int = INGEST_WINDOW_SIZE,
+    validate_filename: Optional[Callable[[str], None]] = None
+) -> Dict[str, Any]:
+    """Stream a multipart upload straight into a sink without spooling the whole file
+
+    open_sink(filename, content_type) is a coroutine returning a sink with async
+    write/commit/abort (see AsyncStorage.open_writer). Request chunks are parsed
+    as they arrive; file bytes are buffered up to window_size and then flushed
+    to the sink, so memory per request stays bounded regardless of upload size.
+    Form fields count towards max_size and are capped at MAX_FIELD_SIZE each.
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data upload")
+
+    collector = _PartCollector(file_field)
+    parser = MultipartParser(boundary, collector.callbacks())
+
+    sink = None
+    filename = None
+    result_url = None
+    total_size = 0
+    fields: Dict[str, str] = {}
+    window = bytearray()
+
+    async def flush():
+        nonlocal window
+        if window:
+            data, window = window, bytearray()
+            await sink.write(data)
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if total_size + collector.field_bytes > max_size:
+                raise HTTPException(status_code=413, detail=f"Upload too large. Maximum size is {max_size/1024/1024}MB")
+            events, collector.events = collector.events, []
+
+            for kind, payload in events:
+                if kind == "file_start":
+                    if sink is not None:
+                        raise HTTPException(status_code=400, detail=f"Only one '{file_field}' file is allowed")
+                    filename, part_type = payload
+                    if validate_filename:
+                        validate_filename(filename)
+                    sink = await open_sink(filename, part_type)
+                elif kind == "file_data":
+                    total_size += len(payload)
+                    if total_size + collector.field_bytes > max_size:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File too large. Maximum size is {max_size/1024/1024}MB"
+                        )
+                    window += payload
+                    if len(window) >= window_size:
+                        await flush()
+                elif kind == "file_end":
+                    await flush()
+                    result_url = await sink.commit()
+                elif kind == "field":
+                    name, value = payload
+                    fields[name] = value
+
+        parser.finalize()
+
+        if sink is None:
+            raise HTTPException(status_code=400, detail=f"Missing '{file_field}' file")
+        if result_url is None:
+            raise HTTPException(status_code=400, detail="Upload ended before the file was complete")
+
+    except BaseException:
+        if sink is not None and result_url is None:
+            try:
+                await sink.abort()
+            except Exception as e:
+                logger.warning(f"Failed to abort upload sink: {e}")
+        raise
+
+    return {
+        "filename": filename,
+        "url": result_url,
+        "size": total_size,
+        "fields": fields
+    }
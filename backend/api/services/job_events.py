@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """Latest-value mailbox for one watcher of one job
+
+    Holds at most one pending snapshot: if the consumer falls behind, newer
+    snapshots replace older ones (coalescing) instead of queueing up.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.coalesced = 0
+        self._latest: Optional[Dict[str, Any]] = None
+        self._event = asyncio.Event()
+
+    def push(self, snapshot: Dict[str, Any]):
+        if self._latest is not None:
+            self.coalesced += 1
+        self._latest = snapshot
+        self._event.set()
+
+    async def next(self) -> Dict[str, Any]:
+        """Wait for the next snapshot; costs nothing while idle"""
+        await self._event.wait()
+        self._event.clear()
+        snapshot, self._latest = self._latest, None
+        return snapshot
+
+class JobEventBus:
+    """In-process pub/sub of job state snapshots keyed by job id"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, job_id: str) -> Subscription:
+        subscription = Subscription(job_id)
+        self._subscribers.setdefault(job_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.job_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.job_id]
+
+    def publish(self, job_id: str, snapshot: Dict[str, Any]):
+        """Push a snapshot to every watcher of job_id without blocking"""
+        self.published += 1
+        for subscription in self._subscribers.get(job_id, ()):
+            subscription.push(snapshot)
+            self.delivered += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "watched_jobs": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "delivered": self.delivered
+        }
+
+def snapshot_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields of current that differ from previous (empty if nothing changed)"""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+# Singleton instance
+job_events = JobEventBus()
@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from ..models.schemas import ProcessingJob
+from .job_store import AsyncJobStore, job_store
+
+logger = logging.getLogger(__name__)
+
+# How long finished jobs and their artifacts are kept
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "24"))
+
+# URL prefixes of artifacts stored on local disk, mapped to their directory
+LOCAL_ARTIFACT_DIRS = {
+    "/uploads/": "uploads",
+    "/static/": "static",
+}
+
+def expiry_after(hours: float = JOB_RETENTION_HOURS) -> str:
+    return (datetime.utcnow() + timedelta(hours=hours)).isoformat()
+
+class JobGarbageCollector:
+    """Delete expired jobs together with their local files and bucket objects
+
+    Due jobs come from the repository's expiresAt index, so a sweep only
+    touches jobs that have actually expired. Work is done in slices of at
+    most slice_seconds before yielding to the event loop, file deletes run
+    in a worker thread and bucket deletes go through the storage service.
+    """
+
+    def __init__(
+        self,
+        repository: AsyncJobStore,
+        storage=None,
+        local_dirs: Optional[Dict[str, str]] = None,
+        batch_size: int = 100,
+        slice_seconds: float = 0.01,
+        max_sleep: float = 300.0,
+        retry_minutes: float = 10.0
+    ):
+        self.repository = repository
+        self.storage = None
+        self.storage_prefix: Optional[str] = None
+        self.blob_store = None
+        self.local_dirs = local_dirs if local_dirs is not None else LOCAL_ARTIFACT_DIRS
+        self.batch_size = batch_size
+        self.slice_seconds = slice_seconds
+        self.max_sleep = max_sleep
+        self.retry_minutes = retry_minutes
+        self._task: Optional[asyncio.Task] = None
+        self.jobs_deleted = 0
+        self.artifacts_deleted = 0
+        self.errors = 0
+        self.next_expiry: Optional[str] = None
+        if storage is not None:
+            self.attach_storage(storage)
+
+    def attach_storage(self, storage):
+        """Also delete objects that live in this storage service's bucket"""
+        backend = storage.backend
+        if backend.name == "gcs":
+            self.storage_prefix = f"https://storage.googleapis.com/{backend.bucket_name}/"
+        else:
+            self.storage_prefix = f"{backend.base_url}/"
+        self.storage = storage
+
+    def attach_blob_store(self, blob_store):
+        """Release content-addressed inputs by reference instead of deleting them"""
+        self.blob_store = blob_store
+
+    def _releases_input(self, job: ProcessingJob) -> bool:
+        # Blobs may be shared with other uploads, so they are only ever released by reference
+        if self.blob_store is None:
+            return False
+        return job.input_file_id is not None or self.blob_store.digest_for_url(job.input_video_url) is not None
+
+    async def release_input(self, job: ProcessingJob) -> bool:
+        """Drop the job's own reference to its shared input blob, held under the job id"""
+        if not self._releases_input(job) or job.input_file_id != job.id:
+            return False
+        return await self.blob_store.release(job.id) is not None
+
+    async def delete_artifact(self, url: str) -> bool:
+        """Delete one artifact by URL; False if it is not ours to delete"""
+        if self.storage is not None and url.startswith(self.storage_prefix):
+            try:
+                await self.storage.delete(url[len(self.storage_prefix):])
+            except Exception as e:
+                # Already gone is as good as deleted
+                if type(e).__name__ != "NotFound":
+                    raise
+            return True
+
+        for prefix, directory in self.local_dirs.items():
+            if url.startswith(prefix):
+                # Keep subdirectories, but never leave the artifact directory
+                root = Path(directory).resolve()
+                path = (root / url[len(prefix):]).resolve()
+                if root not in path.parents:
+                    return False
+                await asyncio.to_thread(path.unlink, missing_ok=True)
+                return True
+
+        return False
+
+    def artifact_urls(self, job: ProcessingJob) -> List[str]:
+        # Inputs held by reference may be shared with other uploads
+        input_url = None if self._releases_input(job) else job.input_video_url
+        return [url for url in (input_url, job.resultUrl) if url]
+
+    async def collect(self, job_id: str) -> bool:
+        """Delete one job and its artifacts; on failure retry it later"""
+        job = await self.repository.get(job_id)
+        if job is None:
+            return False
+
+        try:
+            results = await asyncio.gather(
+                self.release_input(job),
+                *(self.delete_artifact(url) for url in self.artifact_urls(job))
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Failed to delete artifacts of job {job_id}, retrying later: {e}")
+            job.expiresAt = expiry_after(self.retry_minutes / 60)
+            await self.repository.save(job)
+            return False
+
+        self.artifacts_deleted += sum(results)
+        if await self.repository.delete(job_id):
+            self.jobs_deleted += 1
+        return True
+
+    async def sweep(self) -> int:
+        """Collect every job that is due, yielding to the event loop between slices"""
+        collected = 0
+        slice_start = time.monotonic()
+        while True:
+            due = await self.repository.find_expired(datetime.utcnow().isoformat(), self.batch_size)
+            for job_id in due:
+                if await self.collect(job_id):
+                    collected += 1
+                if time.monotonic() - slice_start >= self.slice_seconds:
+                    await asyncio.sleep(0)
+                    slice_start = time.monotonic()
+            if len(due) < self.batch_size:
+                return collected
+
+    async def _seconds_until_next(self) -> float:
+        self.next_expiry = await self.repository.next_expiry()
+        if self.next_expiry is None:
+            return self.max_sleep
+        delay = (datetime.fromisoformat(self.next_expiry) - datetime.utcnow()).total_seconds()
+        return min(max(delay, 0.0), self.max_sleep)
+
+    async def run(self):
+        while True:
+            try:
+                collected = await self.sweep()
+                if collected:
+                    logger.info(f"Garbage collected {collected} expired jobs")
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Job garbage collection failed: {e}")
+
+            # Sleep until the next job expires (re-checked at least every max_sleep)
+            await asyncio.sleep(await self._seconds_until_next())
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs_deleted": self.jobs_deleted,
+            "artifacts_deleted": self.artifacts_deleted,
+            "errors": self.errors,
+            "next_expiry": self.next_expiry
+        }
+
+# Singleton instance
+job_gc = JobGarbageCollector(job_store)
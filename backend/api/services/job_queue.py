@@ -0,0 +1,221 @@
+import os
+import math
+import time
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# GPU requirements by resolution (H100-80G)
+# Based on official SeedVR2 documentation
+GPU_CONFIG = {
+    "720p": {"gpus": 1, "avg_minutes": 7},   # 1x H100-80G
+    "1080p": {"gpus": 4, "avg_minutes": 10}, # 4x H100-80G with sp_size=4
+    "2k": {"gpus": 4, "avg_minutes": 15}     # 4x H100-80G with sp_size=4
+}
+
+# Lower runs first
+PRIORITY_CLASSES = {"interactive": 0, "standard": 1, "batch": 2}
+
+# fifo: arrival order; priority: class, then arrival; sjf: shortest expected
+# job first, aged like highest-response-ratio-next; wfq: weighted fair
+# queueing across tenants; priority-wfq: weighted fair order with the class
+# as a head start
+POLICIES = ("fifo", "priority", "sjf", "wfq", "priority-wfq")
+
+def gpu_config(resolution: str) -> Dict[str, Any]:
+    return GPU_CONFIG.get(resolution, GPU_CONFIG["720p"])
+
+def expected_seconds(resolution: str) -> float:
+    """Typical run time of a job at this resolution"""
+    return gpu_config(resolution)["avg_minutes"] * 60.0
+
+def parse_weights(spec: Optional[str]) -> Dict[str, float]:
+    """Tenant weights from "tenant=weight,..." (e.g. TENANT_WEIGHTS="acme=3,free=1")"""
+    weights = {}
+    for item in (spec or "").split(","):
+        tenant, _, weight = item.partition("=")
+        if tenant.strip() and weight.strip():
+            try:
+                weights[tenant.strip()] = float(weight)
+            except ValueError:
+                raise ValueError(f"TENANT_WEIGHTS: weight of {tenant.strip()!r} must be a number, got {weight.strip()!r}")
+    check_weights(weights)
+    return weights
+
+def check_weights(weights: Dict[str, float]):
+    """Weights divide expected run time, so each must be a positive finite number"""
+    for tenant, weight in weights.items():
+        if not (math.isfinite(weight) and weight > 0):
+            raise ValueError(f"TENANT_WEIGHTS: weight of {tenant!r} must be a positive number, got {weight}")
+
+def parse_tenant_keys(spec: Optional[str]) -> Dict[str, str]:
+    """Tenant API keys from "tenant=key,..." (e.g. TENANT_KEYS="acme=s3cret")"""
+    keys = {}
+    for item in (spec or "").split(","):
+        tenant, _, key = item.partition("=")
+        if tenant.strip() and key.strip():
+            keys[tenant.strip()] = key.strip()
+    return keys
+
+class QueuedJob:
+    """A job waiting for, or holding, GPUs"""
+
+    def __init__(self, job_id: str, tenant: str = "default", priority: str = "standard",
+                 resolution: str = "720p", payload: Any = None,
+                 expected: Optional[float] = None, gpus: Optional[int] = None):
+        self.job_id = job_id
+        self.tenant = tenant
+        self.priority = priority if priority in PRIORITY_CLASSES else "standard"
+        self.resolution = resolution
+        self.payload = payload
+        self.expected = expected if expected is not None else expected_seconds(resolution)
+        self.gpus = gpus if gpus is not None else gpu_config(resolution)["gpus"]
+        self.enqueued_at = 0.0
+        self.started_at: Optional[float] = None
+        # Virtual finish time under weighted fair queueing
+        self.finish_tag = 0.0
+
+class JobQueue:
+    """Jobs waiting for a fixed number of GPUs, started in policy order
+
+    Tenants get GPU time in proportion to their weight: each job is tagged
+    with a virtual finish time of max(virtual clock, tenant's last tag) +
+    expected seconds / weight, and smaller tags go first, so short jobs
+    and light tenants are not stuck behind a heavy tenant's long jobs.
+    Priority classes age rather than starve: each class below interactive
+    counts as arriving aging_seconds later, so a batch job only yields to
+    interactive jobs submitted within 2 x aging_seconds after it (0 makes
+    classes strict). Under SJF waiting shrinks a job's expected length the
+    same way. The job at the head waits for enough GPUs rather than being
+    overtaken. clock is injectable so a simulator can replay traces in
+    virtual time.
+    """
+
+    def __init__(self, policy: str = "priority-wfq", capacity_gpus: int = 8,
+                 weights: Optional[Dict[str, float]] = None, aging_seconds: float = 600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy {policy!r}, expected one of {POLICIES}")
+        self.policy = policy
+        self.capacity_gpus = capacity_gpus
+        self.weights = weights or {}
+        check_weights(self.weights)
+        self.aging_seconds = aging_seconds
+        self.clock = clock
+        self._waiting: Dict[str, QueuedJob] = {}
+        self._running: Dict[str, QueuedJob] = {}
+        self._last_tag: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        # Recent (priority, wait) pairs for the percentiles in stats()
+        self._waits: Deque[Tuple[str, float]] = deque(maxlen=1000)
+        self.started = 0
+        self.withdrawn = 0
+
+    def _handicap(self, job: QueuedJob) -> float:
+        """Seconds a job's class puts it behind an interactive job of the same moment"""
+        return PRIORITY_CLASSES[job.priority] * self.aging_seconds
+
+    def _key(self, job: QueuedJob, now: float) -> tuple:
+        rank = PRIORITY_CLASSES[job.priority]
+        if self.policy == "fifo":
+            return (job.enqueued_at,)
+        if self.policy == "priority":
+            if not self.aging_seconds:
+                return (rank, job.enqueued_at)
+            return (job.enqueued_at + self._handicap(job), rank)
+        if self.policy == "sjf":
+            waited = now - job.enqueued_at
+            aged = job.expected / (1 + waited / self.aging_seconds) if self.aging_seconds else job.expected
+            return (aged, job.enqueued_at)
+        if self.policy == "wfq":
+            return (job.finish_tag, job.enqueued_at)
+        if not self.aging_seconds:
+            return (rank, job.finish_tag, job.enqueued_at)
+        return (job.finish_tag + self._handicap(job), rank, job.enqueued_at)
+
+    def _order(self, now: float) -> List[QueuedJob]:
+        return sorted(self._waiting.values(), key=lambda job: self._key(job, now))
+
+    def gpus_in_use(self) -> int:
+        return sum(job.gpus for job in self._running.values())
+
+    def push(self, job: QueuedJob):
+        job.enqueued_at = self.clock()
+        # More GPUs than exist would never fit; such a job takes them all
+        job.gpus = min(job.gpus, self.capacity_gpus) if self.capacity_gpus else job.gpus
+        start = max(self._virtual_time, self._last_tag.get(job.tenant, 0.0))
+        job.finish_tag = start + job.expected / self.weights.get(job.tenant, 1.0)
+        self._last_tag[job.tenant] = job.finish_tag
+        self._waiting[job.job_id] = job
+
+    def pop_ready(self) -> List[QueuedJob]:
+        """Jobs that may start now, in order; they count as running until finished()"""
+        now = self.clock()
+        ready = []
+        for job in self._order(now):
+            if self.capacity_gpus and self.gpus_in_use() + job.gpus > self.capacity_gpus:
+                break
+            del self._waiting[job.job_id]
+            job.started_at = now
+            self._running[job.job_id] = job
+            self._virtual_time = max(self._virtual_time, job.finish_tag - job.expected / self.weights.get(job.tenant, 1.0))
+            self._waits.append((job.priority, now - job.enqueued_at))
+            self.started += 1
+            ready.append(job)
+        return ready
+
+    def finished(self, job_id: str) -> bool:
+        """Release a running job's GPUs; False if it was not running"""
+        return self._running.pop(job_id, None) is not None
+
+    def withdraw(self, job_id: str) -> bool:
+        """Drop a job that has not started; False if it is not waiting"""
+        if self._waiting.pop(job_id, None) is None:
+            return False
+        self.withdrawn += 1
+        return True
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place among waiting jobs as of now, or None if not waiting"""
+        for index, job in enumerate(self._order(self.clock())):
+            if job.job_id == job_id:
+                return index + 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        def percentiles(values: List[float]) -> Dict[str, float]:
+            values = sorted(values)
+            if not values:
+                return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+            return {"p50": round(values[len(values) // 2], 1),
+                    "p95": round(values[int(len(values) * 0.95)], 1),
+                    "max": round(values[-1], 1)}
+
+        recent = list(self._waits)
+        return {
+            "policy": self.policy,
+            "waiting": len(self._waiting),
+            "running": len(self._running),
+            "gpus_in_use": self.gpus_in_use(),
+            "capacity_gpus": self.capacity_gpus,
+            "started": self.started,
+            "withdrawn": self.withdrawn,
+            "wait_seconds": percentiles([wait for _, wait in recent]),
+            "wait_seconds_by_priority": {
+                name: percentiles([wait for priority, wait in recent if priority == name])
+                for name in PRIORITY_CLASSES
+            }
+        }
+
+def create_job_queue(**kwargs) -> JobQueue:
+    """Job queue configured from SCHEDULING_POLICY, RUNPOD_MAX_GPUS, TENANT_WEIGHTS and QUEUE_AGING_SECONDS"""
+    options = dict(
+        policy=os.getenv("SCHEDULING_POLICY", "priority-wfq"),
+        capacity_gpus=int(os.getenv("RUNPOD_MAX_GPUS", "8")),
+        weights=parse_weights(os.getenv("TENANT_WEIGHTS")),
+        aging_seconds=float(os.getenv("QUEUE_AGING_SECONDS", "600"))
+    )
+    options.update(kwargs)
+    return JobQueue(**options)
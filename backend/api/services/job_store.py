@@ -0,0 +1,545 @@
+import os
+import json
+import bisect
+import asyncio
+import sqlite3
+import logging
+import functools
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..models.schemas import ProcessingJob
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE_URL = os.getenv("JOB_STORE_URL", "sqlite:///data/jobs.db")
+
+# Fields returned by the compact history view
+COMPACT_FIELDS = ("id", "status", "progress", "resultUrl", "createdAt", "updatedAt", "resolution", "seed")
+
+def job_parameter(job: ProcessingJob, name: str) -> Any:
+    return (job.parameters or {}).get(name)
+
+def compact_job(job: ProcessingJob) -> Dict[str, Any]:
+    """Project a job onto COMPACT_FIELDS"""
+    return {
+        "id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "resultUrl": job.resultUrl,
+        "createdAt": job.createdAt,
+        "updatedAt": job.updatedAt,
+        "resolution": job_parameter(job, "resolution"),
+        "seed": job_parameter(job, "seed")
+    }
+
+class JobRepository(ABC):
+    """Storage interface for processing jobs
+
+    Implementations must keep status, createdAt and updatedAt indexed so
+    that lookups, history listings and cleanup do not scan every job.
+    Repositories whose calls block on I/O set blocking so AsyncJobStore
+    runs them off the event loop.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[ProcessingJob]:
+        ...
+
+    @abstractmethod
+    def save(self, job: ProcessingJob):
+        """Insert or replace a job"""
+
+    @abstractmethod
+    def save_if(self, job: ProcessingJob, statuses: Iterable[str]) -> bool:
+        """Replace a job only while its stored status is one of statuses
+
+        A compare-and-set: False means another writer moved the job on
+        (e.g. cancelled it) since it was read, and nothing was written.
+        """
+
+    @abstractmethod
+    def claim(self, job_id: str, until: str, now: str) -> bool:
+        """Reserve a queued job that has no RunPod job for submission until until
+
+        Only one caller wins while the claim holds, so a job queued by
+        several workers is submitted once.
+        """
+
+    @abstractmethod
+    def delete(self, job_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def list_jobs(self, status: Optional[str] = None, limit: int = 10) -> List[ProcessingJob]:
+        """Newest jobs first, optionally filtered by status"""
+
+    @abstractmethod
+    def page_jobs(
+        self,
+        status: Optional[str] = None,
+        resolution: Optional[str] = None,
+        seed: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        before: Optional[Tuple[str, str]] = None,
+        limit: int = 10,
+        compact: bool = False
+    ) -> List[Dict[str, Any]]:
+        """One page of jobs, newest first, as dicts
+
+        Keyset pagination: before is the (createdAt, id) of the last job on
+        the previous page, so each page is an index range scan regardless of
+        how deep it is. created_after is inclusive, created_before exclusive.
+        """
+
+    @abstractmethod
+    def find_updated_before(self, cutoff: str, statuses: Iterable[str], limit: int = 1000) -> List[str]:
+        """Ids of jobs in one of statuses whose updatedAt is older than cutoff"""
+
+    @abstractmethod
+    def find_expired(self, now: str, limit: int = 100) -> List[str]:
+        """Ids of jobs whose expiresAt is at or before now, soonest first"""
+
+    @abstractmethod
+    def next_expiry(self) -> Optional[str]:
+        """Earliest expiresAt of any job, or None if nothing is scheduled"""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+    def close(self):
+        pass
+
+class InMemoryJobRepository(JobRepository):
+    """Process-local repository with sorted secondary indexes"""
+
+    def __init__(self):
+        self._jobs: Dict[str, ProcessingJob] = {}
+        self._by_status: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_resolution: Dict[str, List[Tuple[str, str]]] = {}
+        self._by_created: List[Tuple[str, str]] = []
+        self._by_updated: List[Tuple[str, str]] = []
+        self._by_expiry: List[Tuple[str, str]] = []
+        self._claims: Dict[str, str] = {}
+        self._lock = threading.RLock()
+
+    def _indexes(self, job: ProcessingJob) -> List[Tuple[List[Tuple[str, str]], Tuple[str, str]]]:
+        indexes = [
+            (self._by_created, (job.createdAt, job.id)),
+            (self._by_status.setdefault(job.status, []), (job.createdAt, job.id)),
+            (self._by_resolution.setdefault(job_parameter(job, "resolution"), []), (job.createdAt, job.id)),
+            (self._by_updated, (job.updatedAt, job.id)),
+        ]
+        if job.expiresAt:
+            indexes.append((self._by_expiry, (job.expiresAt, job.id)))
+        return indexes
+
+    def _unindex(self, job: ProcessingJob):
+        for index, key in self._indexes(job):
+            i = bisect.bisect_left(index, key)
+            if i < len(index) and index[i] == key:
+                del index[i]
+
+    def _index(self, job: ProcessingJob):
+        for index, key in self._indexes(job):
+            bisect.insort(index, key)
+
+    def get(self, job_id: str) -> Optional[ProcessingJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job else None
+
+    def save(self, job: ProcessingJob):
+        with self._lock:
+            previous = self._jobs.get(job.id)
+            if previous is not None:
+                self._unindex(previous)
+            stored = job.model_copy()
+            self._jobs[job.id] = stored
+            self._index(stored)
+
+    def save_if(self, job: ProcessingJob, statuses: Iterable[str]) -> bool:
+        with self._lock:
+            previous = self._jobs.get(job.id)
+            if previous is None or previous.status not in set(statuses):
+                return False
+            self.save(job)
+            return True
+
+    def claim(self, job_id: str, until: str, now: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued" or job.runpod_job_id:
+                return False
+            if self._claims.get(job_id, "") > now:
+                return False
+            self._claims[job_id] = until
+            return True
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            self._claims.pop(job_id, None)
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            self._unindex(job)
+            return True
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 10) -> List[ProcessingJob]:
+        if limit <= 0:
+            return []
+        with self._lock:
+            index = self._by_created if status is None else self._by_status.get(status, [])
+            return [self._jobs[job_id].model_copy() for _, job_id in reversed(index[-limit:])]
+
+    def page_jobs(
+        self,
+        status: Optional[str] = None,
+        resolution: Optional[str] = None,
+        seed: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        before: Optional[Tuple[str, str]] = None,
+        limit: int = 10,
+        compact: bool = False
+    ) -> List[Dict[str, Any]]:
+        if limit <= 0:
+            return []
+        with self._lock:
+            # Walk the narrowest (createdAt, id) index backwards from the cursor
+            if status is not None:
+                index = self._by_status.get(status, [])
+            elif resolution is not None:
+                index = self._by_resolution.get(resolution, [])
+            else:
+                index = self._by_created
+
+            lo = bisect.bisect_left(index, (created_after, "")) if created_after else 0
+            hi = len(index)
+            if created_before:
+                hi = bisect.bisect_left(index, (created_before, ""))
+            if before:
+                hi = min(hi, bisect.bisect_left(index, tuple(before)))
+
+            page = []
+            for i in range(hi - 1, lo - 1, -1):
+                job = self._jobs[index[i][1]]
+                if resolution is not None and job_parameter(job, "resolution") != resolution:
+                    continue
+                if seed is not None and job_parameter(job, "seed") != seed:
+                    continue
+                page.append(compact_job(job) if compact else job.dict())
+                if len(page) >= limit:
+                    break
+            return page
+
+    def find_updated_before(self, cutoff: str, statuses: Iterable[str], limit: int = 1000) -> List[str]:
+        statuses = set(statuses)
+        with self._lock:
+            end = bisect.bisect_left(self._by_updated, (cutoff, ""))
+            result = []
+            for _, job_id in self._by_updated[:end]:
+                if self._jobs[job_id].status in statuses:
+                    result.append(job_id)
+                    if len(result) >= limit:
+                        break
+            return result
+
+    def find_expired(self, now: str, limit: int = 100) -> List[str]:
+        with self._lock:
+            end = bisect.bisect_right(self._by_expiry, (now, "\uffff"))
+            return [job_id for _, job_id in self._by_expiry[:min(end, limit)]]
+
+    def next_expiry(self) -> Optional[str]:
+        with self._lock:
+            return self._by_expiry[0][0] if self._by_expiry else None
+
+    def count(self) -> int:
+        return len(self._jobs)
+
+class SQLiteJobRepository(JobRepository):
+    """Embedded SQLite repository (WAL mode) shared by every worker on the host"""
+
+    blocking = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            runpod_job_id TEXT,
+            resolution TEXT,
+            seed INTEGER,
+            expires_at TEXT,
+            claimed_until TEXT,
+            data TEXT NOT NULL
+        );
+    """
+
+    # Columns added after the first release, with the JSON path to backfill them from
+    MIGRATIONS = [
+        ("resolution", "TEXT", "$.parameters.resolution"),
+        ("seed", "INTEGER", "$.parameters.seed"),
+        ("expires_at", "TEXT", "$.expiresAt"),
+        ("claimed_until", "TEXT", None),
+    ]
+
+    INDEXES = """
+        CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_resolution_created ON jobs (resolution, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_seed_created ON jobs (seed, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_runpod ON jobs (runpod_job_id);
+        CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at) WHERE expires_at IS NOT NULL;
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+        self._migrate()
+        self._conn.executescript(self.INDEXES)
+
+    def _migrate(self):
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, column_type, json_path in self.MIGRATIONS:
+            if column in columns:
+                continue
+            logger.info(f"Migrating job store: adding column {column}")
+            self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            if json_path:
+                self._conn.execute(f"UPDATE jobs SET {column} = json_extract(data, ?)", (json_path,))
+
+    def _row_to_job(self, row: sqlite3.Row) -> ProcessingJob:
+        return ProcessingJob(**json.loads(row["data"]))
+
+    def get(self, job_id: str) -> Optional[ProcessingJob]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def save(self, job: ProcessingJob):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(id, status, created_at, updated_at, runpod_job_id, resolution, seed, expires_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, job.createdAt, job.updatedAt, job.runpod_job_id,
+                 job_parameter(job, "resolution"), job_parameter(job, "seed"), job.expiresAt,
+                 job.model_dump_json())
+            )
+
+    def save_if(self, job: ProcessingJob, statuses: Iterable[str]) -> bool:
+        statuses = list(statuses)
+        placeholders = ",".join("?" for _ in statuses)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, created_at = ?, updated_at = ?, runpod_job_id = ?, "
+                "resolution = ?, seed = ?, expires_at = ?, data = ? "
+                f"WHERE id = ? AND status IN ({placeholders})",
+                (job.status, job.createdAt, job.updatedAt, job.runpod_job_id,
+                 job_parameter(job, "resolution"), job_parameter(job, "seed"), job.expiresAt,
+                 job.model_dump_json(), job.id, *statuses)
+            )
+        return cursor.rowcount == 1
+
+    def claim(self, job_id: str, until: str, now: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET claimed_until = ? WHERE id = ? AND status = 'queued' "
+                "AND runpod_job_id IS NULL AND (claimed_until IS NULL OR claimed_until <= ?)",
+                (until, job_id, now)
+            )
+        return cursor.rowcount == 1
+
+    def delete(self, job_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return cursor.rowcount > 0
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 10) -> List[ProcessingJob]:
+        if status:
+            query = "SELECT data FROM jobs WHERE status = ? ORDER BY created_at DESC, id DESC LIMIT ?"
+            params = (status, limit)
+        else:
+            query = "SELECT data FROM jobs ORDER BY created_at DESC, id DESC LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def page_jobs(
+        self,
+        status: Optional[str] = None,
+        resolution: Optional[str] = None,
+        seed: Optional[int] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        before: Optional[Tuple[str, str]] = None,
+        limit: int = 10,
+        compact: bool = False
+    ) -> List[Dict[str, Any]]:
+        if limit <= 0:
+            return []
+
+        conditions = []
+        params: List[Any] = []
+        for column, value in (("status", status), ("resolution", resolution), ("seed", seed)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if created_after:
+            conditions.append("created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            conditions.append("created_at < ?")
+            params.append(created_before)
+        if before:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(before)
+
+        if compact:
+            # Served from columns and json_extract; no full row decode
+            columns = ("id, status, json_extract(data, '$.progress') AS progress, "
+                       "json_extract(data, '$.resultUrl') AS resultUrl, created_at AS createdAt, "
+                       "updated_at AS updatedAt, resolution, seed")
+        else:
+            columns = "data"
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        query = f"SELECT {columns} FROM jobs {where}ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        if compact:
+            return [dict(row) for row in rows]
+        return [json.loads(row["data"]) for row in rows]
+
+    def find_updated_before(self, cutoff: str, statuses: Iterable[str], limit: int = 1000) -> List[str]:
+        statuses = list(statuses)
+        placeholders = ",".join("?" for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE updated_at < ? AND status IN ({placeholders}) "
+                f"ORDER BY updated_at LIMIT ?",
+                (cutoff, *statuses, limit)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def find_expired(self, now: str, limit: int = 100) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ? "
+                "ORDER BY expires_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def next_expiry(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(expires_at) FROM jobs WHERE expires_at IS NOT NULL"
+            ).fetchone()
+        return row[0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_job_repository(url: str = JOB_STORE_URL) -> JobRepository:
+    """Build a repository from a URL: sqlite:///path/to.db or memory://
+
+    docker-compose already provisions Postgres and Redis; repositories for
+    those can be added here behind the same interface.
+    """
+    if url.startswith("memory://"):
+        return InMemoryJobRepository()
+    if url.startswith("sqlite:///"):
+        return SQLiteJobRepository(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported JOB_STORE_URL: {url}")
+
+class AsyncJobStore:
+    """Awaitable front for a JobRepository, used by routes and background loops
+
+    Calls into a blocking repository run on one dedicated thread (SQLite
+    serialises them on its connection anyway), so a slow query or a busy
+    database never stalls the event loop. In-memory repositories are
+    called inline.
+    """
+
+    def __init__(self, repository: JobRepository):
+        self.repository = repository
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if repository.blocking:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store")
+
+    async def _run(self, fn: Callable, *args, **kwargs) -> Any:
+        if self._executor is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def get(self, job_id: str) -> Optional[ProcessingJob]:
+        return await self._run(self.repository.get, job_id)
+
+    async def save(self, job: ProcessingJob):
+        await self._run(self.repository.save, job)
+
+    async def save_if(self, job: ProcessingJob, statuses: Iterable[str]) -> bool:
+        return await self._run(self.repository.save_if, job, list(statuses))
+
+    async def claim(self, job_id: str, until: str, now: str) -> bool:
+        return await self._run(self.repository.claim, job_id, until, now)
+
+    async def delete(self, job_id: str) -> bool:
+        return await self._run(self.repository.delete, job_id)
+
+    async def list_jobs(self, status: Optional[str] = None, limit: int = 10) -> List[ProcessingJob]:
+        return await self._run(self.repository.list_jobs, status, limit)
+
+    async def page_jobs(self, **filters) -> List[Dict[str, Any]]:
+        """See JobRepository.page_jobs"""
+        return await self._run(self.repository.page_jobs, **filters)
+
+    async def find_updated_before(self, cutoff: str, statuses: Iterable[str], limit: int = 1000) -> List[str]:
+        return await self._run(self.repository.find_updated_before, cutoff, list(statuses), limit)
+
+    async def find_expired(self, now: str, limit: int = 100) -> List[str]:
+        return await self._run(self.repository.find_expired, now, limit)
+
+    async def next_expiry(self) -> Optional[str]:
+        return await self._run(self.repository.next_expiry)
+
+    async def count(self) -> int:
+        return await self._run(self.repository.count)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.repository.close()
+
+# Singleton instance
+job_store = AsyncJobStore(create_job_repository())
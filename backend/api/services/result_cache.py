@@ -0,0 +1,122 @@
+import time
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Key derivation mirrors runpod/result_cache.py; bump both together
+CACHE_PREFIX = "cache"
+KEY_VERSION = 1
+
+def resolve_dimensions(height: int, width: int) -> Tuple[int, int]:
+    """Round dimensions down to multiples of 32, as the worker does"""
+    return (height // 32) * 32, (width // 32) * 32
+
+def select_model(height: int, width: int, gpu_count: int) -> Tuple[str, int]:
+    """Model size and GPU count the worker picks for a resolution"""
+    pixels = height * width
+    if pixels <= 1280 * 720:
+        return "3b", 1
+    if pixels <= 1920 * 1080:
+        if gpu_count >= 4:
+            return "3b", 4
+        return "7b", min(gpu_count, 2)
+    return "7b", 4
+
+def cache_key(input_sha256: str, res_h: int, res_w: int, seed: int, model_size: str, checkpoint: str) -> str:
+    """Key for one (input, parameters, weights) combination"""
+    canonical = json.dumps({
+        "v": KEY_VERSION,
+        "input": input_sha256.lower(),
+        "res_h": int(res_h),
+        "res_w": int(res_w),
+        "seed": int(seed),
+        "model": model_size,
+        "checkpoint": checkpoint
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def entry_name(key: str) -> str:
+    return f"{CACHE_PREFIX}/results/{key}.json"
+
+def profile_name(endpoint_id: str) -> str:
+    return f"{CACHE_PREFIX}/profiles/{endpoint_id}.json"
+
+class ResultCache:
+    """Look up finished results the worker recorded for an identical request
+
+    The worker publishes the GPU count and checkpoint fingerprints it serves
+    under the endpoint's profile; with those the backend derives the same key
+    the worker would and checks it before submitting. Entries are remembered
+    in a small LRU, but every hit re-checks that the result object exists.
+    """
+
+    def __init__(self, storage, endpoint_id: str, max_entries: int = 10000, profile_ttl: float = 300.0):
+        self.storage = storage
+        self.endpoint_id = endpoint_id
+        self.max_entries = max_entries
+        self.profile_ttl = profile_ttl
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._profile: Optional[Dict[str, Any]] = None
+        self._profile_expires = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def profile(self) -> Optional[Dict[str, Any]]:
+        if time.monotonic() >= self._profile_expires:
+            self._profile = await self.storage.read_json(profile_name(self.endpoint_id))
+            self._profile_expires = time.monotonic() + self.profile_ttl
+        return self._profile
+
+    async def key_for(self, input_sha256: str, params: Dict[str, Any]) -> Optional[str]:
+        """Key the worker would use, or None until the endpoint has published its models"""
+        profile = await self.profile()
+        if not profile:
+            return None
+        res_h, res_w = resolve_dimensions(params["res_h"], params["res_w"])
+        model_size, _ = select_model(res_h, res_w, profile.get("gpu_count", 0))
+        checkpoint = profile.get("checkpoints", {}).get(model_size)
+        if checkpoint is None:
+            return None
+        return cache_key(input_sha256, res_h, res_w, params["seed"], model_size, checkpoint)
+
+    async def lookup(self, input_sha256: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cached job output for this input and parameters, if any"""
+        try:
+            key = await self.key_for(input_sha256, params)
+            if key is None:
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = await self.storage.read_json(entry_name(key))
+            if entry is None or not await self.storage.exists(entry["object_name"]):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+        except Exception as e:
+            # A cache outage must never block a submission
+            logger.warning(f"Result cache lookup failed: {e}")
+            self.errors += 1
+            return None
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.hits += 1
+        return entry["output"]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
@@ -71,6 +71,11 @@ class RunPodClient:
                 "progress": self._calculate_progress(status)
             }
             
+            progress = self._progress_output(status)
+            if progress:
+                result["stage"] = progress.get("stage")
+                result["eta_seconds"] = progress.get("eta_seconds")
+            
             if status.status == "COMPLETED":
                 result["output"] = status.output
             elif status.status == "FAILED":
@@ -82,12 +87,12 @@ class RunPodClient:
             logger.error(f"Failed to get job status from RunPod: {str(e)}")
             raise
     
-    def cancel_job(self, job_id: str) -> bool:
-        """Cancel a RunPod job"""
+    def cancel_job(self, runpod_job_id: str) -> bool:
+        """Cancel a RunPod job; the worker running it stops and frees its GPUs"""
         
         try:
-            self.endpoint.cancel(job_id)
-            logger.info(f"Cancelled job {job_id}")
+            self.endpoint.cancel(runpod_job_id)
+            logger.info(f"Cancelled job {runpod_job_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to cancel job: {str(e)}")
@@ -110,17 +115,24 @@ class RunPodClient:
     def _calculate_progress(self, status: Any) -> Optional[float]:
         """Calculate job progress based on RunPod status"""
         
-        # RunPod doesn't provide granular progress, so we estimate
         if status.status == "IN_QUEUE":
             return 0.0
         elif status.status == "IN_PROGRESS":
-            # Estimate based on time elapsed
-            # This is a simplified estimation
-            return 0.5
+            # The worker publishes progress parsed from the model's output
+            output = self._progress_output(status)
+            return output.get("progress")
         elif status.status == "COMPLETED":
             return 1.0
         else:
             return None
+    
+    def _progress_output(self, status: Any) -> Dict[str, Any]:
+        """Latest progress_update payload of a running job, if any"""
+        
+        output = getattr(status, "output", None)
+        if status.status == "IN_PROGRESS" and isinstance(output, dict):
+            return output
+        return {}
 
 # Singleton instance
 runpod_client = RunPodClient()
\ No newline at end of file
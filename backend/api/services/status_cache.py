@@ -0,0 +1,105 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# RunPod states that never change once reached
+TERMINAL_STATES = {"COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT"}
+
+# Seconds a non-terminal status may be served from cache
+DEFAULT_TTLS = {
+    "IN_QUEUE": 3.0,
+    "IN_PROGRESS": 2.0,
+}
+
+class StatusCache:
+    """Per-job RunPod status cache with single-flight upstream fetches
+
+    Terminal states are cached until evicted by capacity; non-terminal states
+    expire after a short TTL. Concurrent lookups for the same job while a
+    fetch is in flight wait on that fetch instead of issuing their own.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: float = 2.0,
+                 max_entries: int = 10000):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def _expiry(self, status: Dict[str, Any]) -> Optional[float]:
+        state = status.get("status")
+        if state in TERMINAL_STATES:
+            return None
+        return time.monotonic() + self.ttls.get(state, self.default_ttl)
+
+    def peek(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached status if it is still fresh"""
+        entry = self._entries.get(job_id)
+        if entry is None:
+            return None
+        status, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            return None
+        self._entries.move_to_end(job_id)
+        return status
+
+    def put(self, job_id: str, status: Dict[str, Any]):
+        self._entries[job_id] = (status, self._expiry(status))
+        self._entries.move_to_end(job_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, job_id: str):
+        self._entries.pop(job_id, None)
+
+    async def get(self, job_id: str, fetch: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the status for job_id, fetching upstream at most once at a time"""
+        status = self.peek(job_id)
+        if status is not None:
+            self.hits += 1
+            return status
+
+        task = self._inflight.get(job_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(job_id, fetch))
+            # Mark the exception retrieved even if every waiter went away
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[job_id] = task
+
+        # Shield so a disconnecting client does not cancel everyone's fetch
+        return await asyncio.shield(task)
+
+    async def _fetch(self, job_id: str, fetch: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        try:
+            status = await fetch(job_id)
+            self.put(job_id, status)
+            return status
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight.pop(job_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0
+        }
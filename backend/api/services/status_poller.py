@@ -0,0 +1,206 @@
+import time
+import heapq
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .status_cache import TERMINAL_STATES
+
+logger = logging.getLogger(__name__)
+
+# (job age in seconds, poll interval): poll fast right after submission and
+# back off for long-running jobs
+DEFAULT_INTERVALS: List[Tuple[float, float]] = [
+    (30, 2.0),
+    (300, 5.0),
+    (1800, 15.0),
+    (float("inf"), 30.0),
+]
+
+def is_runpod_terminal(status: Dict[str, Any]) -> bool:
+    return status.get("status") in TERMINAL_STATES
+
+def runpod_stale(error: str) -> Dict[str, Any]:
+    return {"status": "UNKNOWN", "stale": True, "error": error}
+
+class StatusPoller:
+    """Refresh the status of every in-flight job from one background loop
+
+    Jobs are kept in a min-heap ordered by their next poll time. Each pass
+    takes the jobs that are due (up to batch_size), refreshes them with at
+    most max_concurrency upstream calls in flight, and reschedules them with
+    an interval that grows with the job's age. Jobs are dropped once they
+    reach a terminal state, so upstream traffic scales with active jobs
+    rather than with the number of clients polling.
+
+    A job whose status cannot be fetched max_failures times in a row is
+    marked stale: stale_status(error), which is not terminal, is published
+    and the job keeps being retried every stale_interval seconds. Only the
+    upstream itself can report that a job failed.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Dict[str, Any]]],
+        on_update: Optional[Callable[[str, Dict[str, Any]], Any]] = None,
+        is_terminal: Callable[[Dict[str, Any]], bool] = is_runpod_terminal,
+        stale_status: Callable[[str], Dict[str, Any]] = runpod_stale,
+        intervals: Optional[List[Tuple[float, float]]] = None,
+        stale_interval: float = 300.0,
+        max_concurrency: int = 8,
+        batch_size: int = 64,
+        max_failures: int = 10
+    ):
+        self.fetch = fetch
+        self.on_update = on_update
+        self.is_terminal = is_terminal
+        self.stale_status = stale_status
+        self.intervals = intervals or DEFAULT_INTERVALS
+        self.stale_interval = stale_interval
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.max_failures = max_failures
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self.upstream_calls = 0
+        self.errors = 0
+        self.completed = 0
+
+    def track(self, job_id: str, upstream_id: Optional[str] = None):
+        """Start polling a job; upstream_id is the id the fetch function expects"""
+        if job_id in self._jobs:
+            return
+        now = time.monotonic()
+        self._jobs[job_id] = {
+            "upstream_id": upstream_id or job_id,
+            "tracked_at": now,
+            "next_poll": now,
+            "failures": 0,
+            "status": None
+        }
+        heapq.heappush(self._heap, (now, job_id))
+        self._wakeup.set()
+
+    def untrack(self, job_id: str):
+        # Stale heap entries are skipped when popped
+        self._jobs.pop(job_id, None)
+
+    def is_tracked(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Latest known status of a tracked job (pure in-memory lookup)"""
+        entry = self._jobs.get(job_id)
+        return entry["status"] if entry else None
+
+    def interval_for(self, entry: Dict[str, Any], now: float) -> float:
+        age = now - entry["tracked_at"]
+        for limit, interval in self.intervals:
+            if age < limit:
+                return interval
+        return self.intervals[-1][1]
+
+    def _schedule(self, job_id: str, entry: Dict[str, Any], delay: float):
+        entry["next_poll"] = time.monotonic() + delay
+        heapq.heappush(self._heap, (entry["next_poll"], job_id))
+
+    def _pop_due(self, now: float) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            when, job_id = heapq.heappop(self._heap)
+            entry = self._jobs.get(job_id)
+            if entry is None or entry["next_poll"] != when:
+                continue
+            due.append(job_id)
+        return due
+
+    async def _refresh(self, job_id: str):
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            return
+
+        async with self._semaphore:
+            self.upstream_calls += 1
+            try:
+                status = await self.fetch(entry["upstream_id"])
+            except Exception as e:
+                self.errors += 1
+                entry["failures"] += 1
+                if entry["failures"] >= self.max_failures:
+                    # The job may still be running upstream, so it is only reported as stale
+                    if entry["failures"] == self.max_failures:
+                        logger.warning(f"Status for job {job_id} unavailable after {entry['failures']} failures: {e}")
+                        await self._publish(job_id, entry, self.stale_status(
+                            f"Job status unavailable after {entry['failures']} failed lookups: {e}"
+                        ))
+                    if job_id in self._jobs:
+                        self._schedule(job_id, entry, self.stale_interval)
+                else:
+                    # Back off harder on repeated failures
+                    delay = self.interval_for(entry, time.monotonic()) * (2 ** min(entry["failures"], 4))
+                    self._schedule(job_id, entry, delay)
+                return
+
+        entry["failures"] = 0
+        await self._publish(job_id, entry, status)
+
+        if self.is_terminal(status):
+            self.completed += 1
+            self.untrack(job_id)
+        elif job_id in self._jobs:
+            self._schedule(job_id, entry, self.interval_for(entry, time.monotonic()))
+
+    async def _publish(self, job_id: str, entry: Dict[str, Any], status: Dict[str, Any]):
+        entry["status"] = status
+        if self.on_update:
+            result = self.on_update(job_id, status)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def poll_once(self) -> int:
+        """Refresh every job that is due; returns how many were refreshed"""
+        due = self._pop_due(time.monotonic())
+        if due:
+            await asyncio.gather(*(self._refresh(job_id) for job_id in due))
+        return len(due)
+
+    async def run(self):
+        while True:
+            refreshed = await self.poll_once()
+            if refreshed >= self.batch_size:
+                continue
+
+            # Sleep until the next job is due or a new job is tracked
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, self._heap[0][0] - time.monotonic())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_jobs": len(self._jobs),
+            "upstream_calls": self.upstream_calls,
+            "errors": self.errors,
+            "completed": self.completed,
+            "stale_jobs": sum(1 for entry in self._jobs.values() if entry["failures"] >= self.max_failures)
+        }
@@ -1,16 +1,501 @@
 import os
+import hmac
+import json
+import time
+import fcntl
+import base64
+import asyncio
+import hashlib
+import logging
+import secrets
 from pathlib import Path
+from datetime import timedelta
+from urllib.parse import quote, unquote, urlencode, urlparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Resumable chunks must be a multiple of 256 KB
+GCS_CHUNK_SIZE = int(os.getenv("GCS_CHUNK_SIZE_MB", "8")) * 1024 * 1024
+
+# Per-operation timeouts in seconds
+DEFAULT_TIMEOUTS = {
+    "open_writer": 30.0,
+    "write": 120.0,
+    "commit": 120.0,
+    "abort": 30.0,
+    "upload_file": 600.0,
+    "delete": 30.0,
+    "read_json": 30.0,
+    "exists": 30.0,
+    "move": 120.0,
+    "signed_url": 30.0,
+    "upload_session": 30.0,
+    "stat": 30.0,
+    "sha256": 600.0,
+    "read_range": 60.0,
+}
 
 def init_storage():
     """Initialize storage directories"""
-    
+
     directories = [
         "uploads",
         "static",
-        "logs"
+        "logs",
+        "data"
     ]
-    
+
     for dir_name in directories:
         Path(dir_name).mkdir(exist_ok=True)
-    
-    print("Storage directories initialized")
\ No newline at end of file
+
+    print("Storage directories initialized")
+
+class GCSUploadSink:
+    """Write an object to GCS through a resumable upload session"""
+
+    def __init__(self, bucket, name: str, content_type: Optional[str] = None,
+                 chunk_size: int = GCS_CHUNK_SIZE):
+        self.name = name
+        self.blob = bucket.blob(name, chunk_size=chunk_size)
+        # BlobWriter only keeps one chunk buffered before sending it
+        self._writer = self.blob.open("wb", content_type=content_type)
+        self.bytes_written = 0
+
+    def write(self, data: bytes):
+        self._writer.write(data)
+        self.bytes_written += len(data)
+
+    def commit(self) -> str:
+        """Finalize the upload and return the public URL"""
+        self._writer.close()
+        self.blob.make_public()
+        return self.blob.public_url
+
+    def abort(self):
+        """Drop the session; uncommitted resumable uploads never become objects"""
+        self._writer = None
+
+class LocalUploadSink:
+    """Write an object to the local filesystem (fallback when GCS is unavailable)"""
+
+    def __init__(self, root: str, name: str, base_url: str, offset: int = 0):
+        self.name = name
+        self.path = Path(root) / name
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(self.path.name + ".part")
+        # One writer per part file: a second one raises BlockingIOError instead
+        # of truncating or appending under the first. The lock goes with the
+        # file, so a crashed writer never leaves it held.
+        self._file = open(self._tmp_path, "ab+")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            raise
+        # Resume a partial upload, dropping anything past the offset
+        self._file.truncate(offset)
+        self.url = f"{base_url.rstrip('/')}/{name}"
+        self.bytes_written = offset
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def commit(self) -> str:
+        # Rename under the lock so a waiting writer opens a fresh part file
+        self._file.flush()
+        os.replace(self._tmp_path, self.path)
+        self._file.close()
+        return self.url
+
+    def abort(self):
+        if self._tmp_path.exists():
+            self._tmp_path.unlink()
+        self._file.close()
+
+    def suspend(self):
+        """Close the file but keep the partial upload for a later resume"""
+        self._file.close()
+
+class GCSBackend:
+    """Blocking Google Cloud Storage operations"""
+
+    name = "gcs"
+
+    def __init__(self, client, bucket_name: str):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.bucket = client.bucket(bucket_name)
+
+    def open_writer(self, name: str, content_type: Optional[str] = None) -> GCSUploadSink:
+        return GCSUploadSink(self.bucket, name, content_type)
+
+    def upload_file(self, file_path: str, name: str, content_type: Optional[str] = None,
+                    timeout: float = 300) -> str:
+        blob = self.bucket.blob(name, chunk_size=GCS_CHUNK_SIZE)
+        blob.upload_from_filename(file_path, content_type=content_type, timeout=timeout)
+        blob.make_public()
+        return blob.public_url
+
+    def delete(self, name: str):
+        self.bucket.blob(name).delete()
+
+    def read_json(self, name: str) -> Optional[Any]:
+        from google.api_core.exceptions import NotFound
+        try:
+            return json.loads(self.bucket.blob(name).download_as_bytes())
+        except NotFound:
+            return None
+
+    def exists(self, name: str) -> bool:
+        return self.bucket.blob(name).exists()
+
+    def move(self, name: str, new_name: str) -> str:
+        """Server-side rename; no object bytes pass through this process"""
+        blob = self.bucket.rename_blob(self.bucket.blob(name), new_name)
+        blob.make_public()
+        return blob.public_url
+
+    def object_name(self, url: str) -> Optional[str]:
+        """Object in this bucket that a public, signed or gs:// URL points at, if any"""
+        parsed = urlparse(url)
+        path = unquote(parsed.path).lstrip("/")
+        if parsed.scheme == "gs" and parsed.netloc == self.bucket_name:
+            return path or None
+        if parsed.netloc == f"{self.bucket_name}.storage.googleapis.com":
+            return path or None
+        if parsed.netloc == "storage.googleapis.com" and path.startswith(f"{self.bucket_name}/"):
+            return path[len(self.bucket_name) + 1:] or None
+        return None
+
+    def signed_url(self, name: str, expires_seconds: int) -> str:
+        """Short-lived V4 signed GET URL; needs service account credentials"""
+        return self.bucket.blob(name).generate_signed_url(
+            version="v4", expiration=timedelta(seconds=expires_seconds), method="GET"
+        )
+
+    def upload_session(self, name: str, content_type: str, size: int, expires_seconds: int,
+                       origin: Optional[str] = None) -> str:
+        """Resumable session URL the client PUTs the object to; GCS enforces the size
+
+        Sessions live for a week on the GCS side, so expires_seconds only
+        bounds how long the caller keeps the upload pending.
+        """
+        blob = self.bucket.blob(name)
+        return blob.create_resumable_upload_session(content_type=content_type, size=size, origin=origin)
+
+    def stat(self, name: str) -> Optional[Dict[str, Any]]:
+        """Size, content type and base64 MD5 of an object, or None if it does not exist"""
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            return None
+        return {"size": blob.size, "content_type": blob.content_type, "md5": blob.md5_hash}
+
+    def sha256(self, name: str) -> str:
+        """SHA-256 of an object, read in resumable-chunk windows"""
+        digest = hashlib.sha256()
+        with self.bucket.blob(name, chunk_size=GCS_CHUNK_SIZE).open("rb") as reader:
+            while chunk := reader.read(GCS_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def read_range(self, name: str, start: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        return self.bucket.blob(name).download_as_bytes(start=start, end=start + length - 1)
+
+class LocalBackend:
+    """Blocking local filesystem operations laid out like a bucket"""
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: str, upload_url: Optional[str] = None,
+                 upload_secret: Optional[str] = None):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+        # Where the app receives direct uploads; URLs for it are signed with HMAC
+        self.upload_url = (upload_url or f"{self.base_url}/upload").rstrip("/")
+        self.upload_secret = upload_secret.encode() if upload_secret else secrets.token_bytes(32)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def open_writer(self, name: str, content_type: Optional[str] = None, offset: int = 0) -> LocalUploadSink:
+        return LocalUploadSink(str(self.root), name, self.base_url, offset)
+
+    def upload_file(self, file_path: str, name: str, content_type: Optional[str] = None,
+                    timeout: float = 300) -> str:
+        sink = LocalUploadSink(str(self.root), name, self.base_url)
+        with open(file_path, "rb") as src:
+            while chunk := src.read(GCS_CHUNK_SIZE):
+                sink.write(chunk)
+        return sink.commit()
+
+    def delete(self, name: str):
+        path = self.root / name
+        # Along with any partial direct upload of it
+        for stale in (path, path.with_name(path.name + ".part")):
+            if stale.exists():
+                stale.unlink()
+
+    def read_json(self, name: str) -> Optional[Any]:
+        path = self.root / name
+        if not path.exists():
+            return None
+        return json.loads(path.read_bytes())
+
+    def exists(self, name: str) -> bool:
+        return (self.root / name).exists()
+
+    def move(self, name: str, new_name: str) -> str:
+        target = self.root / new_name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.root / name, target)
+        return f"{self.base_url}/{new_name}"
+
+    def object_name(self, url: str) -> Optional[str]:
+        if not url.startswith(f"{self.base_url}/"):
+            return None
+        return unquote(urlparse(url).path[len(urlparse(self.base_url).path) + 1:]) or None
+
+    def signed_url(self, name: str, expires_seconds: int) -> str:
+        # Local files are served publicly under base_url; there is nothing to sign
+        return f"{self.base_url}/{name}"
+
+    def _upload_signature(self, name: str, content_type: str, size: int, expires: int) -> str:
+        message = f"{name}\n{content_type}\n{size}\n{expires}".encode()
+        return hmac.new(self.upload_secret, message, hashlib.sha256).hexdigest()
+
+    def upload_session(self, name: str, content_type: str, size: int, expires_seconds: int,
+                       origin: Optional[str] = None) -> str:
+        """Signed URL on upload_url that accepts the object, whole or in Content-Range chunks"""
+        expires = int(time.time()) + expires_seconds
+        query = urlencode({
+            "content_type": content_type,
+            "size": size,
+            "expires": expires,
+            "signature": self._upload_signature(name, content_type, size, expires)
+        })
+        return f"{self.upload_url}/{quote(name)}?{query}"
+
+    def verify_upload(self, name: str, content_type: str, size: int, expires: int, signature: str) -> bool:
+        """Whether a direct upload request carries a valid, unexpired signature"""
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._upload_signature(name, content_type, size, expires), signature)
+
+    def received_bytes(self, name: str) -> int:
+        """Bytes of a partial direct upload received so far"""
+        part = (self.root / name).with_name(Path(name).name + ".part")
+        return part.stat().st_size if part.exists() else 0
+
+    def stat(self, name: str) -> Optional[Dict[str, Any]]:
+        path = self.root / name
+        if not path.exists():
+            return None
+        md5 = hashlib.md5()
+        with open(path, "rb") as src:
+            while chunk := src.read(GCS_CHUNK_SIZE):
+                md5.update(chunk)
+        return {
+            "size": path.stat().st_size,
+            # Files carry no content type here; the signed upload URL pinned it
+            "content_type": None,
+            "md5": base64.b64encode(md5.digest()).decode()
+        }
+
+    def sha256(self, name: str) -> str:
+        digest = hashlib.sha256()
+        with open(self.root / name, "rb") as src:
+            while chunk := src.read(GCS_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def read_range(self, name: str, start: int, length: int) -> bytes:
+        with open(self.root / name, "rb") as src:
+            src.seek(start)
+            return src.read(length)
+
+class StorageMetrics:
+    """Per-operation call counters and latencies"""
+
+    def __init__(self):
+        self.ops: Dict[str, Dict[str, Any]] = {}
+        self.bytes_written = 0
+
+    def _op(self, op: str) -> Dict[str, Any]:
+        if op not in self.ops:
+            self.ops[op] = {
+                "calls": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "in_flight": 0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0
+            }
+        return self.ops[op]
+
+    def started(self, op: str):
+        stats = self._op(op)
+        stats["calls"] += 1
+        stats["in_flight"] += 1
+
+    def finished(self, op: str, elapsed: float, error: Optional[BaseException] = None):
+        stats = self._op(op)
+        stats["in_flight"] -= 1
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        if isinstance(error, asyncio.TimeoutError):
+            stats["timeouts"] += 1
+        elif error is not None:
+            stats["errors"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        ops = {}
+        for op, stats in self.ops.items():
+            completed = stats["calls"] - stats["in_flight"]
+            ops[op] = dict(stats, avg_seconds=stats["total_seconds"] / completed if completed else 0.0)
+        return {"bytes_written": self.bytes_written, "operations": ops}
+
+class AsyncUploadSink:
+    """Async facade over a blocking upload sink"""
+
+    def __init__(self, storage: "AsyncStorage", sink):
+        self.storage = storage
+        self.sink = sink
+        self.name = sink.name
+
+    async def write(self, data: bytes):
+        await self.storage.run("write", self.sink.write, data)
+        self.storage.metrics.bytes_written += len(data)
+
+    async def commit(self) -> str:
+        return await self.storage.run("commit", self.sink.commit)
+
+    async def abort(self):
+        await self.storage.run("abort", self.sink.abort)
+
+class AsyncStorage:
+    """Run blocking storage calls on a bounded thread pool
+
+    Every call is limited by a semaphore (max_concurrency), executed on a
+    dedicated pool (max_workers) so it cannot starve the default executor,
+    and bounded by a per-operation timeout. A call that times out keeps its
+    semaphore slot until its thread finishes.
+    """
+
+    def __init__(self, backend, max_workers: int = 8, max_concurrency: int = 16,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.metrics = StorageMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(self, op: str, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Run a blocking call off the event loop with concurrency and time limits"""
+        timeout = timeout if timeout is not None else self.timeouts.get(op)
+        loop = asyncio.get_running_loop()
+        await self._semaphore.acquire()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        # A timed-out call keeps its thread busy, so its slot is only freed when it really ends
+        future.add_done_callback(lambda _: self._release(loop))
+        self.metrics.started(op)
+        start = time.monotonic()
+        error = None
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except BaseException as e:
+            error = e
+            if isinstance(e, asyncio.TimeoutError):
+                logger.error(f"Storage operation '{op}' timed out after {timeout}s")
+            raise
+        finally:
+            self.metrics.finished(op, time.monotonic() - start, error)
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._semaphore.release)
+        except RuntimeError:
+            # The loop closed while the call was still running
+            pass
+
+    async def open_writer(self, name: str, content_type: Optional[str] = None) -> AsyncUploadSink:
+        sink = await self.run("open_writer", self.backend.open_writer, name, content_type)
+        return AsyncUploadSink(self, sink)
+
+    async def upload_file(self, file_path: str, name: str, content_type: Optional[str] = None) -> str:
+        timeout = self.timeouts["upload_file"]
+        return await self.run(
+            "upload_file",
+            lambda: self.backend.upload_file(file_path, name, content_type, timeout=timeout)
+        )
+
+    async def delete(self, name: str):
+        await self.run("delete", self.backend.delete, name)
+
+    async def read_json(self, name: str) -> Optional[Any]:
+        """Small JSON object from the store, or None if it does not exist"""
+        return await self.run("read_json", self.backend.read_json, name)
+
+    async def exists(self, name: str) -> bool:
+        return await self.run("exists", self.backend.exists, name)
+
+    async def move(self, name: str, new_name: str) -> str:
+        """Rename an object and return its new public URL"""
+        return await self.run("move", self.backend.move, name, new_name)
+
+    def object_name(self, url: str) -> Optional[str]:
+        """Name of the stored object a URL refers to, or None for foreign URLs"""
+        return self.backend.object_name(url)
+
+    async def signed_url(self, name: str, expires_seconds: int) -> str:
+        """URL granting expires_seconds of direct read access to an object"""
+        return await self.run("signed_url", self.backend.signed_url, name, expires_seconds)
+
+    async def upload_session(self, name: str, content_type: str, size: int, expires_seconds: int,
+                             origin: Optional[str] = None) -> str:
+        """URL a client uploads exactly size bytes of name to, without passing through this process"""
+        return await self.run(
+            "upload_session", self.backend.upload_session, name, content_type, size, expires_seconds, origin
+        )
+
+    async def stat(self, name: str) -> Optional[Dict[str, Any]]:
+        return await self.run("stat", self.backend.stat, name)
+
+    async def sha256(self, name: str) -> str:
+        """Hash a stored object; reads it from the store on the storage pool"""
+        return await self.run("sha256", self.backend.sha256, name)
+
+    async def read_range(self, name: str, start: int, length: int) -> bytes:
+        """length bytes of an object from offset start"""
+        return await self.run("read_range", self.backend.read_range, name, start, length)
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            self.metrics.snapshot(),
+            backend=self.backend.name,
+            max_workers=self.max_workers,
+            max_concurrency=self.max_concurrency
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+def create_storage(gcs_client=None, bucket_name: Optional[str] = None,
+                   local_root: str = "storage", base_url: str = "http://localhost:8000/files",
+                   local_upload_url: Optional[str] = None, upload_secret: Optional[str] = None,
+                   **kwargs) -> AsyncStorage:
+    """Build the async storage service, falling back to local disk without GCS"""
+    if gcs_client is not None and bucket_name:
+        backend = GCSBackend(gcs_client, bucket_name)
+    else:
+        logger.warning(f"GCS not configured, using local storage at {local_root}")
+        backend = LocalBackend(local_root, base_url, local_upload_url, upload_secret)
+    return AsyncStorage(backend, **kwargs)
@@ -1,21 +1,32 @@
 import os
 import json
 import asyncio
-import tempfile
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Dict, Any
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import RedirectResponse
+from fastapi.staticfiles import StaticFiles
 import uvicorn
 from google.cloud import storage
 from google.oauth2 import service_account
 import httpx
 import uuid
+import mimetypes
 from contextlib import asynccontextmanager
 
+from api.services.ingest import ingest_multipart
+from api.services.blob_store import BlobIndex, BlobSink, BlobStore, CONTENT_SHA256_HEADER
+from api.services.result_cache import ResultCache
+from api.services.http_client import create_http_client, request_with_retry
+from api.services.direct_upload import DirectUploads, PendingUploadIndex, receive_local_upload
+from api.services.download_proxy import download_filename, proxy_download
+from api.services.status_cache import TERMINAL_STATES, StatusCache
+from api.services.status_poller import StatusPoller
+from api.services.storage import AsyncStorage, create_storage
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,18 +34,47 @@ logger = logging.getLogger(__name__)
 # Configuration
 RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY")
 RUNPOD_ENDPOINT_ID = os.getenv("RUNPOD_ENDPOINT_ID")
+RUNPOD_API_BASE = os.getenv("RUNPOD_API_BASE", "https://api.runpod.ai/v2")
+RUNPOD_MAX_CONNECTIONS = int(os.getenv("RUNPOD_MAX_CONNECTIONS", "20"))
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "seedvr2-videos")
 GCS_KEY_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "/app/gcs-key.json")
 MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
+ALLOWED_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+# Fallback object store used when GCS is not configured
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")
+STORAGE_MAX_WORKERS = int(os.getenv("STORAGE_MAX_WORKERS", "8"))
+STORAGE_MAX_CONCURRENCY = int(os.getenv("STORAGE_MAX_CONCURRENCY", "16"))
+RESULT_CACHE = os.getenv("RESULT_CACHE", "true").lower() == "true"
+INPUT_INDEX_PATH = os.getenv("INPUT_INDEX_PATH", "data/inputs.db")
+INPUT_RETENTION_HOURS = float(os.getenv("INPUT_RETENTION_HOURS", "24"))  # How long an upload keeps its input stored
+DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "32"))
+DOWNLOAD_REDIRECT = os.getenv("DOWNLOAD_REDIRECT", "false").lower() == "true"  # Default for /download-from-gcs
+SIGNED_URL_TTL = int(os.getenv("SIGNED_URL_TTL", "900"))  # Seconds a download redirect stays valid
+DIRECT_UPLOAD_TTL = int(os.getenv("DIRECT_UPLOAD_TTL", "3600"))  # Seconds to finish a direct upload
+UPLOAD_URL_SECRET = os.getenv("UPLOAD_URL_SECRET")  # Signs local direct-upload URLs; random per process if unset
+HASH_CHALLENGE_SECRET = os.getenv("HASH_CHALLENGE_SECRET")  # Signs /upload-by-hash challenges; random per process if unset
 
 # Global variables
 gcs_client = None
+storage_service: Optional[AsyncStorage] = None
+runpod_http: Optional[httpx.AsyncClient] = None
+download_http: Optional[httpx.AsyncClient] = None
+result_cache: Optional[ResultCache] = None
+input_blobs: Optional[BlobStore] = None
+direct_uploads: Optional[DirectUploads] = None
+status_cache = StatusCache(
+    ttls={
+        "IN_QUEUE": float(os.getenv("STATUS_CACHE_QUEUED_TTL", "3")),
+        "IN_PROGRESS": float(os.getenv("STATUS_CACHE_RUNNING_TTL", "2"))
+    }
+)
 runpod_health_status = {"status": "initializing", "last_check": None}
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize services on startup"""
-    global gcs_client
+    global gcs_client, storage_service, runpod_http, download_http, result_cache, input_blobs, direct_uploads
     
     # Initialize GCS client
     try:
@@ -48,13 +88,64 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to initialize GCS client: {e}")
     
+    # All bucket I/O runs on the storage service's bounded thread pool
+    storage_service = create_storage(
+        gcs_client,
+        GCS_BUCKET_NAME,
+        local_root=LOCAL_STORAGE_DIR,
+        base_url=f"{PUBLIC_BASE_URL}/files",
+        local_upload_url=f"{PUBLIC_BASE_URL}/upload-direct",
+        upload_secret=UPLOAD_URL_SECRET,
+        max_workers=STORAGE_MAX_WORKERS,
+        max_concurrency=STORAGE_MAX_CONCURRENCY
+    )
+    
+    # Inputs are stored once per distinct content
+    input_blobs = BlobStore(storage_service, BlobIndex(INPUT_INDEX_PATH), prefix="inputs",
+                            challenge_secret=HASH_CHALLENGE_SECRET)
+    
+    # Uploads the client sends straight to the bucket, verified on completion
+    direct_uploads = DirectUploads(storage_service, input_blobs, PendingUploadIndex(INPUT_INDEX_PATH),
+                                   prefix="inputs/direct", ttl=DIRECT_UPLOAD_TTL)
+    
+    # Results the worker already produced for identical requests
+    if RESULT_CACHE:
+        result_cache = ResultCache(storage_service, RUNPOD_ENDPOINT_ID or "local")
+    
+    # One pooled keep-alive client for every RunPod API call
+    runpod_http = create_http_client(
+        base_url=f"{RUNPOD_API_BASE}/{RUNPOD_ENDPOINT_ID}",
+        headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
+        max_connections=RUNPOD_MAX_CONNECTIONS,
+        max_keepalive_connections=RUNPOD_MAX_CONNECTIONS // 2
+    )
+    
+    # Pooled client for proxied result downloads; the read timeout applies per chunk
+    download_http = create_http_client(
+        max_connections=DOWNLOAD_MAX_CONNECTIONS,
+        max_keepalive_connections=DOWNLOAD_MAX_CONNECTIONS // 2,
+        timeout=60.0
+    )
+    
     # Start background task for health checks
-    asyncio.create_task(periodic_health_check())
+    health_task = asyncio.create_task(periodic_health_check())
+    input_cleanup_task = asyncio.create_task(periodic_input_cleanup())
+    
+    # Keep every submitted job's status fresh from one loop
+    status_poller.start()
     
     yield
     
     # Cleanup
     logger.info("Shutting down...")
+    health_task.cancel()
+    input_cleanup_task.cancel()
+    await status_poller.stop()
+    await runpod_http.aclose()
+    await download_http.aclose()
+    storage_service.shutdown()
+    input_blobs.close()
+    direct_uploads.close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -67,6 +158,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Serve the local fallback object store
+Path(LOCAL_STORAGE_DIR).mkdir(parents=True, exist_ok=True)
+app.mount("/files", StaticFiles(directory=LOCAL_STORAGE_DIR), name="files")
+
 async def check_runpod_health():
     """Check if RunPod endpoint is healthy"""
     global runpod_health_status
@@ -80,27 +175,22 @@ async def check_runpod_health():
         return
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.runpod.ai/v2/{RUNPOD_ENDPOINT_ID}/health",
-                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                runpod_health_status = {
-                    "status": "healthy",
-                    "workers": data.get("workers", {}).get("running", 0),
-                    "jobs_in_queue": data.get("jobs", {}).get("in_queue", 0),
-                    "last_check": datetime.utcnow().isoformat()
-                }
-            else:
-                runpod_health_status = {
-                    "status": "unhealthy",
-                    "message": f"Health check failed with status {response.status_code}",
-                    "last_check": datetime.utcnow().isoformat()
-                }
+        response = await request_with_retry(runpod_http, "GET", "/health", timeout=10.0)
+        
+        if response.status_code == 200:
+            data = response.json()
+            runpod_health_status = {
+                "status": "healthy",
+                "workers": data.get("workers", {}).get("running", 0),
+                "jobs_in_queue": data.get("jobs", {}).get("in_queue", 0),
+                "last_check": datetime.utcnow().isoformat()
+            }
+        else:
+            runpod_health_status = {
+                "status": "unhealthy",
+                "message": f"Health check failed with status {response.status_code}",
+                "last_check": datetime.utcnow().isoformat()
+            }
     except Exception as e:
         runpod_health_status = {
             "status": "error",
@@ -114,80 +204,81 @@ async def periodic_health_check():
         await check_runpod_health()
         await asyncio.sleep(30)  # Check every 30 seconds
 
+async def periodic_input_cleanup():
+    """Release input references older than INPUT_RETENTION_HOURS
+
+    Every upload holds one reference on its stored input; a blob is deleted
+    with its last reference, so content uploaded again within the window
+    is neither stored nor, with a declared digest, transferred twice.
+    Direct uploads never completed are deleted once their URL expires.
+    """
+    while True:
+        cutoff = (datetime.utcnow() - timedelta(hours=INPUT_RETENTION_HOURS)).isoformat()
+        try:
+            released = await input_blobs.release_before(cutoff)
+            if released:
+                logger.info(f"Released {released} expired input references")
+        except Exception as e:
+            logger.error(f"Input cleanup failed: {e}")
+        try:
+            pruned = await direct_uploads.prune()
+            if pruned:
+                logger.info(f"Deleted {pruned} abandoned direct uploads")
+        except Exception as e:
+            logger.error(f"Direct upload cleanup failed: {e}")
+        await asyncio.sleep(min(3600, DIRECT_UPLOAD_TTL))
+
 async def wake_up_runpod():
     """Wake up RunPod workers"""
     if not RUNPOD_API_KEY or not RUNPOD_ENDPOINT_ID:
         raise HTTPException(status_code=500, detail="RunPod not configured")
     
     try:
-        async with httpx.AsyncClient() as client:
-            # Submit a dummy job to wake up workers
-            response = await client.post(
-                f"https://api.runpod.ai/v2/{RUNPOD_ENDPOINT_ID}/run",
-                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
-                json={"input": {"wake_up": True}},
-                timeout=10.0
+        # Submit a dummy job to wake up workers
+        response = await request_with_retry(
+            runpod_http, "POST", "/run",
+            json={"input": {"wake_up": True}},
+            timeout=10.0
+        )
+        
+        if response.status_code in [200, 201]:
+            return {"status": "success", "message": "Wake-up signal sent"}
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Failed to wake up RunPod: {response.text}"
             )
-            
-            if response.status_code in [200, 201]:
-                return {"status": "success", "message": "Wake-up signal sent"}
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to wake up RunPod: {response.text}"
-                )
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
 
-def upload_to_gcs(file_path: str, destination_name: str) -> str:
-    """Upload file to Google Cloud Storage"""
-    if not gcs_client:
-        raise HTTPException(status_code=500, detail="GCS client not initialized")
-    
-    try:
-        bucket = gcs_client.bucket(GCS_BUCKET_NAME)
-        blob = bucket.blob(destination_name)
-        
-        # Upload with resumable upload for large files
-        blob.upload_from_filename(file_path, timeout=300)
-        
-        # Make the blob publicly readable
-        blob.make_public()
-        
-        return blob.public_url
-    except Exception as e:
-        logger.error(f"GCS upload failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to upload to GCS: {str(e)}")
-
-async def submit_to_runpod(video_url: str, params: Dict[str, Any]) -> str:
+async def submit_to_runpod(video_url: str, params: Dict[str, Any], input_sha256: Optional[str] = None) -> str:
     """Submit job to RunPod"""
     if not RUNPOD_API_KEY or not RUNPOD_ENDPOINT_ID:
         raise HTTPException(status_code=500, detail="RunPod not configured")
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://api.runpod.ai/v2/{RUNPOD_ENDPOINT_ID}/run",
-                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
-                json={
-                    "input": {
-                        "video_url": video_url,
-                        "res_h": params.get("res_h", 720),
-                        "res_w": params.get("res_w", 1280),
-                        "seed": params.get("seed", 42)
-                    }
-                },
-                timeout=30.0
+        response = await request_with_retry(
+            runpod_http, "POST", "/run",
+            json={
+                "input": {
+                    "video_url": video_url,
+                    "res_h": params.get("res_h", 720),
+                    "res_w": params.get("res_w", 1280),
+                    "seed": params.get("seed", 42),
+                    "input_sha256": input_sha256
+                }
+            },
+            timeout=30.0
+        )
+        
+        if response.status_code in [200, 201]:
+            data = response.json()
+            return data.get("id")
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"RunPod submission failed: {response.text}"
             )
-            
-            if response.status_code in [200, 201]:
-                data = response.json()
-                return data.get("id")
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"RunPod submission failed: {response.text}"
-                )
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
 
@@ -197,23 +288,25 @@ async def check_job_status(job_id: str) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail="RunPod not configured")
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.runpod.ai/v2/{RUNPOD_ENDPOINT_ID}/status/{job_id}",
-                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
-                timeout=10.0
+        response = await request_with_retry(runpod_http, "GET", f"/status/{job_id}", timeout=10.0)
+        
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Failed to check job status: {response.text}"
             )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to check job status: {response.text}"
-                )
     except httpx.RequestError as e:
         raise HTTPException(status_code=500, detail=f"Request failed: {str(e)}")
 
+# Terminal results land in the status cache, where they stay
+status_poller = StatusPoller(
+    fetch=check_job_status,
+    on_update=status_cache.put,
+    max_concurrency=int(os.getenv("STATUS_POLLER_CONCURRENCY", "8"))
+)
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -230,8 +323,14 @@ async def health():
     return {
         "status": "healthy",
         "gcs_configured": gcs_client is not None,
+        "storage": storage_service.stats() if storage_service else None,
+        "inputs": await input_blobs.stats() if input_blobs else None,
+        "direct_uploads": await direct_uploads.stats() if direct_uploads else None,
         "runpod_configured": bool(RUNPOD_API_KEY and RUNPOD_ENDPOINT_ID),
-        "runpod_status": runpod_health_status
+        "runpod_status": runpod_health_status,
+        "status_cache": status_cache.stats(),
+        "result_cache": result_cache.stats() if result_cache else None,
+        "status_poller": status_poller.stats()
     }
 
 @app.post("/wake-up")
@@ -241,69 +340,221 @@ async def wake_up():
     await check_runpod_health()  # Update health status
     return result
 
+def validate_video_filename(name: str):
+    if not name.lower().endswith(ALLOWED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Invalid file format")
+
+def form_int(name: str, value: Any) -> int:
+    """Parse an integer sent by the client, rejecting malformed values with a 400"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"{name} must be an integer")
+
+async def cached_result(params: Dict[str, Any], input_sha256: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Completed job for an identical input and parameters restored before, if any"""
+    if result_cache is None or not input_sha256:
+        return None
+    output = await result_cache.lookup(input_sha256, params)
+    if output is None:
+        return None
+    job_id = f"cached-{uuid.uuid4()}"
+    status_cache.put(job_id, {"id": job_id, "status": "COMPLETED", "output": output})
+    return {
+        "status": "completed",
+        "job_id": job_id,
+        "result_url": output.get("result_url"),
+        "cached": True,
+        "message": "Identical video already processed, returning the cached result"
+    }
+
+async def start_processing(input_url: str, params: Dict[str, Any], input_sha256: Optional[str],
+                           message: str) -> Dict[str, Any]:
+    """Answer from the result cache or submit the stored input to RunPod"""
+    # Identical input and parameters already restored: answer without a GPU
+    cached = await cached_result(params, input_sha256)
+    if cached is not None:
+        return dict(cached, input_url=input_url)
+    
+    # Submit to RunPod
+    job_id = await submit_to_runpod(input_url, params, input_sha256)
+    status_poller.track(job_id)
+    
+    return {
+        "status": "processing",
+        "job_id": job_id,
+        "input_url": input_url,
+        "message": message
+    }
+
 @app.post("/upload")
 async def upload_video(
-    video: UploadFile = File(...),
-    res_h: Optional[int] = 720,
-    res_w: Optional[int] = 1280,
-    seed: Optional[int] = 42
+    request: Request,
+    res_h: Optional[int] = None,
+    res_w: Optional[int] = None,
+    seed: Optional[int] = None
 ):
     """Upload video and process with SeedVR2"""
     
-    # Validate file
-    if not video.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv', '.webm')):
-        raise HTTPException(status_code=400, detail="Invalid file format")
-    
-    # Check file size
-    video.file.seek(0, 2)
-    file_size = video.file.tell()
-    video.file.seek(0)
+    # Reject oversized uploads up front when the client tells us the size
+    content_length = request.headers.get("content-length")
+    if content_length and form_int("content-length", content_length) > MAX_FILE_SIZE + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE/1024/1024}MB")
     
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail=f"File too large. Maximum size is {MAX_FILE_SIZE/1024/1024}MB")
+    sink: Optional[BlobSink] = None
     
-    # Create unique filename
-    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]
-    filename = f"input_{timestamp}_{unique_id}_{video.filename}"
+    async def open_sink(name: str, content_type: str):
+        nonlocal sink
+        # Hashed as the bytes stream in; a repeat upload is not stored again, and
+        # one whose declared digest is already stored is not transferred at all
+        sink = await input_blobs.open_writer(name, content_type, request.headers.get(CONTENT_SHA256_HEADER))
+        return sink
     
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(video.filename).suffix) as tmp_file:
-            content = await video.read()
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
-        
-        # Upload to GCS
-        gcs_url = upload_to_gcs(tmp_path, f"inputs/{filename}")
-        logger.info(f"Uploaded to GCS: {gcs_url}")
-        
-        # Submit to RunPod
-        job_id = await submit_to_runpod(gcs_url, {
-            "res_h": res_h,
-            "res_w": res_w,
-            "seed": seed
-        })
-        
-        return {
-            "status": "processing",
-            "job_id": job_id,
-            "input_url": gcs_url,
-            "message": "Video uploaded and processing started"
-        }
-        
+        # Stream request chunks straight into the storage sink
+        upload = await ingest_multipart(
+            request,
+            open_sink,
+            file_field="video",
+            max_size=MAX_FILE_SIZE,
+            validate_filename=validate_video_filename
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload failed: {e}")
-        raise
-    finally:
-        # Clean up temporary file
-        if 'tmp_path' in locals() and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        raise HTTPException(status_code=500, detail=f"Failed to upload video: {str(e)}")
+    
+    gcs_url = upload["url"]
+    logger.info(f"Uploaded {upload['size']} bytes to {gcs_url}" + (" (duplicate)" if sink.deduplicated else ""))
+    
+    # Form fields sent alongside the file are honoured when no query param is given
+    fields = upload["fields"]
+    params = {
+        "res_h": res_h if res_h is not None else form_int("res_h", fields.get("res_h", 720)),
+        "res_w": res_w if res_w is not None else form_int("res_w", fields.get("res_w", 1280)),
+        "seed": seed if seed is not None else form_int("seed", fields.get("seed", 42))
+    }
+    
+    return await start_processing(gcs_url, params, sink.hexdigest(), "Video uploaded and processing started")
+
+@app.post("/upload-by-hash")
+async def upload_by_hash(request: Request):
+    """Start processing a video this server already holds, without uploading it again
+
+    Body: sha256 (hex) of the file, filename, optional res_h, res_w and
+    seed. A 404 means the content is not stored: upload it to /upload,
+    sending the same digest in X-Content-SHA256. Otherwise the answer is a
+    challenge: send the same body again with its token and, as proof, the
+    sha256 (hex) of the file's bytes from offset to offset + length.
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    sha256 = str(data.get("sha256") or "").lower()
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise HTTPException(status_code=400, detail="sha256 must be 64 hex digits")
+    validate_video_filename(data.get("filename") or "")
+    params = {
+        "res_h": form_int("res_h", data.get("res_h", 720)),
+        "res_w": form_int("res_w", data.get("res_w", 1280)),
+        "seed": form_int("seed", data.get("seed", 42))
+    }
+    
+    # A digest alone proves nothing; the caller must show it holds the bytes
+    if not data.get("token"):
+        challenge = await input_blobs.challenge(sha256)
+        if challenge is None:
+            raise HTTPException(status_code=404, detail="Content not stored, upload the file")
+        return dict(challenge, status="challenge", message="Hash the requested range and send it as proof")
+    if not await input_blobs.verify_possession(sha256, str(data["token"]), data.get("proof") or ""):
+        raise HTTPException(status_code=403, detail="Proof does not match the stored content")
+    
+    # Restored before: no input needed at all
+    cached = await cached_result(params, sha256)
+    if cached is not None:
+        return cached
+    
+    # Counts as an upload of the stored content, with its own reference
+    input_url = await input_blobs.reference(str(uuid.uuid4()), sha256)
+    if input_url is None:
+        raise HTTPException(status_code=404, detail="Content not stored, upload the file")
+    logger.info(f"Reusing stored input {sha256[:12]} at {input_url}")
+    response = await start_processing(input_url, params, sha256, "Stored video found and processing started")
+    # The caller gets short-lived access to the shared object, not its permanent URL
+    try:
+        response["input_url"] = await storage_service.signed_url(storage_service.object_name(input_url), SIGNED_URL_TTL)
+    except Exception as e:
+        logger.warning(f"Could not sign stored input {sha256[:12]}: {e}")
+        response.pop("input_url", None)
+    return response
+
+@app.post("/upload-url")
+async def create_upload_url(request: Request):
+    """Issue a URL the client uploads the video to directly, bypassing this server
+    
+    Body: filename, size, optional content_type, res_h, res_w and seed. PUT
+    the file to upload_url (resumable with Content-Range), then call
+    /upload-complete/{upload_id}.
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    filename = data.get("filename") or ""
+    validate_video_filename(filename)
+    
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="size (bytes) is required")
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    if size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_FILE_SIZE/1024/1024}MB")
+    
+    content_type = data.get("content_type") or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    params = {
+        "res_h": form_int("res_h", data.get("res_h", 720)),
+        "res_w": form_int("res_w", data.get("res_w", 1280)),
+        "seed": form_int("seed", data.get("seed", 42))
+    }
+    return await direct_uploads.issue(filename, content_type, size, params, request.headers.get("origin"))
+
+@app.put("/upload-direct/{name:path}")
+async def upload_direct(name: str, request: Request):
+    """Receiver for direct uploads when storage is the local filesystem"""
+    return await receive_local_upload(storage_service, name, request)
+
+@app.post("/upload-complete/{upload_id}")
+async def complete_upload(upload_id: str, request: Request):
+    """Verify a direct upload and start processing it
+    
+    Optional body: sha256 (hex) to content-address the input and use the
+    result cache, md5 (base64) checked against the store's own hash.
+    """
+    body = await request.body()
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    upload = await direct_uploads.complete(upload_id, data.get("sha256"), data.get("md5"))
+    logger.info(f"Direct upload {upload_id} of {upload['size']} bytes verified at {upload['url']}")
+    return await start_processing(upload["url"], upload["params"], upload["sha256"],
+                                  "Video uploaded and processing started")
 
 @app.get("/status/{job_id}")
 async def get_status(job_id: str):
     """Get job status"""
-    status = await check_job_status(job_id)
+    # Active jobs are refreshed by the background poller, so this is normally
+    # an in-memory lookup; unknown jobs (e.g. after a restart) fall back to a
+    # coalesced upstream fetch and are then tracked
+    status = status_poller.get(job_id)
+    if status is None:
+        status = await status_cache.get(job_id, check_job_status)
+        if status.get("status") not in TERMINAL_STATES:
+            status_poller.track(job_id)
     
     # Map RunPod status to our format
     runpod_status = status.get("status", "UNKNOWN")
@@ -322,41 +573,57 @@ async def get_status(job_id: str):
             "message": "Processing failed"
         }
     elif runpod_status in ["IN_QUEUE", "IN_PROGRESS"]:
-        return {
+        response = {
             "status": "processing",
             "message": f"Job is {runpod_status.lower().replace('_', ' ')}"
         }
+        # Long videos report progress aggregated over their segments
+        if isinstance(status.get("output"), dict):
+            response.update(status["output"])
+        return response
+    elif status.get("stale"):
+        # The poller keeps retrying; the job may well still be running
+        return {
+            "status": "unknown",
+            "error": status.get("error"),
+            "message": "Job status is temporarily unavailable"
+        }
     else:
         return {
             "status": "unknown",
             "message": f"Unknown status: {runpod_status}"
         }
 
+async def serve_download(url: Optional[str], request: Request, redirect: Optional[bool]):
+    """Redirect to a signed URL for our own objects, or stream the file through"""
+    if not url:
+        raise HTTPException(status_code=400, detail="URL is required")
+    
+    # Only our own objects are served; anything else would make this an open proxy
+    name = storage_service.object_name(url)
+    if name is None:
+        raise HTTPException(status_code=400, detail="URL is not a stored object")
+    
+    if DOWNLOAD_REDIRECT if redirect is None else redirect:
+        try:
+            # The bytes go straight from the bucket to the browser
+            signed = await storage_service.signed_url(name, SIGNED_URL_TTL)
+            return RedirectResponse(signed, status_code=303)
+        except Exception as e:
+            logger.warning(f"Signing {name} failed, streaming it instead: {e}")
+    
+    return await proxy_download(download_http, url, request.headers, download_filename(url))
+
 @app.post("/download-from-gcs")
 async def download_from_gcs(request: Request):
     """Download video from GCS URL"""
     data = await request.json()
-    gcs_url = data.get("url")
-    
-    if not gcs_url:
-        raise HTTPException(status_code=400, detail="URL is required")
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(gcs_url, timeout=60.0)
-            response.raise_for_status()
-            
-            filename = gcs_url.split("/")[-1]
-            
-            return StreamingResponse(
-                io.BytesIO(response.content),
-                media_type="video/mp4",
-                headers={
-                    "Content-Disposition": f"attachment; filename={filename}"
-                }
-            )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
+    return await serve_download(data.get("url"), request, data.get("redirect"))
+
+@app.get("/download-from-gcs")
+async def download_from_gcs_get(request: Request, url: Optional[str] = None, redirect: Optional[bool] = None):
+    """Same as the POST form; usable as a <video> or link source, with Range for seeking"""
+    return await serve_download(url, request, redirect)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -200,6 +200,7 @@ except Exception as e:
 # Copy API server and web UI
 echo "📄 Setting up API server..."
 cp /app/SeedVr2Test/runpod/seedvr2_api_server.py /app/
+cp /app/SeedVr2Test/runpod/{artifact_gc,inference_worker,progress,process_runner,cancellation,file_ranges,admission}.py /app/
 cp /app/SeedVr2Test/runpod/seedvr2_web_ui.html /app/
 
 # Create test script
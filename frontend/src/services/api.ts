@@ -24,11 +24,12 @@ export const submitVideoForProcessing = async (
     },
   });
   
-  const { video_url } = uploadResponse.data;
+  const { video_url, file_id } = uploadResponse.data;
   
   // Then, submit for processing
   const processResponse = await api.post('/api/process', {
     video_url,
+    file_id,
     ...params,
   });
   
@@ -44,17 +45,36 @@ export const cancelJob = async (jobId: string): Promise<void> => {
   await api.post(`/api/process/${jobId}/cancel`);
 };
 
-export const getJobHistory = async (): Promise<ProcessingJob[]> => {
-  const response = await api.get('/api/status/history');
+export interface JobHistoryQuery {
+  limit?: number;
+  status?: string;
+  resolution?: string;
+  seed?: number;
+  created_after?: string;
+  created_before?: string;
+  cursor?: string;
+  view?: 'full' | 'compact';
+}
+
+export interface JobHistoryPage {
+  jobs: ProcessingJob[];
+  next_cursor?: string | null;
+}
+
+// Pass next_cursor back as cursor to load the following page
+export const getJobHistory = async (query: JobHistoryQuery = {}): Promise<JobHistoryPage> => {
+  const response = await api.get('/api/status/history', { params: query });
   return response.data;
 };
 
 // WebSocket connection for real-time updates
+// The server sends the full job first, then only the fields that changed
 export const connectToJobUpdates = (jobId: string, onUpdate: (job: ProcessingJob) => void) => {
-  const ws = new WebSocket(`${API_BASE_URL.replace('http', 'ws')}/ws/job/${jobId}`);
+  const ws = new WebSocket(`${API_BASE_URL.replace('http', 'ws')}/api/status/ws/${jobId}`);
+  let job = {} as ProcessingJob;
   
   ws.onmessage = (event) => {
-    const job = JSON.parse(event.data);
+    job = { ...job, ...JSON.parse(event.data) };
     onUpdate(job);
   };
   
@@ -2,11 +2,19 @@
 """
 Install SeedVR2 for SINGLE GPU Setup
 Optimized for single H100 GPU operation
+
+Still runs standalone when pasted onto the pod: the tiling helpers from
+runpod/ are copied from a checkout next to this script if there is one,
+otherwise downloaded from HELPERS_URL.
 """
 
 import subprocess
+import shutil
 import sys
 import os
+import urllib.request
+
+HELPERS_URL = os.getenv("SEEDVR2_HELPERS_URL", "https://raw.githubusercontent.com/Dreamrealai/SeedVr2Test/main/runpod")
 
 print("="*60)
 print("🚀 INSTALLING SEEDVR2 FOR SINGLE GPU")
@@ -71,6 +79,15 @@ subprocess.run([sys.executable, "/workspace/download_model.py"])
 
 # Step 4: Create SINGLE GPU processing script
 print("\n🎬 Creating single GPU processing script...")
+
+# Tiling and process helpers, shared with the RunPod worker
+repo_runpod = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runpod")
+for module in ("video_chunker.py", "gpu_scheduler.py", "spatial_tiler.py", "process_runner.py", "cancellation.py"):
+    target = os.path.join("/workspace", module)
+    if os.path.exists(os.path.join(repo_runpod, module)):
+        shutil.copy(os.path.join(repo_runpod, module), target)
+    else:
+        urllib.request.urlretrieve(f"{HELPERS_URL}/{module}", target)
 process_script = '''#!/usr/bin/env python3
 """
 SeedVR2 Single GPU Processing
@@ -78,10 +95,46 @@ Optimized for 1x H100-80G
 """
 import os
 import sys
-import subprocess
+import glob
+import tempfile
 import torch
 
 sys.path.append("/workspace/SeedVR")
+sys.path.insert(0, "/workspace")
+
+from spatial_tiler import TiledRestore, tile_pixel_budget
+from process_runner import run_process_sync
+
+# Full inference output; only its tail is kept in memory for errors
+LOG_DIR = os.getenv("SEEDVR2_LOG_DIR", "/workspace/logs")
+
+def run_3b(input_path, output_dir, res_h, res_w, seed, device=0):
+    """One 3B inference on a single GPU; returns the output file or raises"""
+    cmd = [
+        "python3",  # Use python3 directly for single GPU
+        "/workspace/SeedVR/projects/inference_seedvr2_3b.py",
+        "--video_path", input_path,
+        "--output_dir", output_dir,
+        "--seed", str(seed),
+        "--res_h", str(res_h),
+        "--res_w", str(res_w),
+        "--sp_size", "1"  # SINGLE GPU!
+    ]
+    
+    print(f"\\n🚀 Running on GPU {device}:")
+    print(' '.join(cmd))
+    
+    env = os.environ.copy()
+    env['CUDA_VISIBLE_DEVICES'] = str(device)
+    
+    log_name = f"{os.path.splitext(os.path.basename(input_path))[0]}_gpu{device}.log"
+    result = run_process_sync(cmd, env=env, log_path=os.path.join(LOG_DIR, log_name))
+    print(f"📈 Peak RSS {result.peak_rss_mb or 0:.0f} MB, CPU {result.cpu_seconds or 0:.0f}s, log: {result.log_path}")
+    
+    output_files = glob.glob(os.path.join(output_dir, "*.mp4"))
+    if not output_files:
+        raise RuntimeError("No output video found")
+    return output_files[0]
 
 def process_video_single_gpu(input_path, output_path, resolution="720x1280", seed=42):
     """Process video using SINGLE GPU"""
@@ -100,47 +153,38 @@ def process_video_single_gpu(input_path, output_path, resolution="720x1280", see
     gpu_memory = torch.cuda.get_device_properties(0).total_memory / 1e9
     print(f"🎮 GPU: {torch.cuda.get_device_name(0)} ({gpu_memory:.1f} GB)")
     
-    # Single GPU can handle up to 720p
-    if res_h * res_w > 1280 * 720:
-        print(f"⚠️  Resolution {res_w}x{res_h} may be too large for single GPU")
-        print("📏 Recommended max: 1280x720 for single H100")
+    # Frames past the memory budget are restored in overlapping tiles and blended
+    memory_gb = float(os.getenv("TILE_MEMORY_GB", "0")) or gpu_memory
+    max_pixels = tile_pixel_budget("3b", memory_gb)
     
     # Create output directory
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Run with SINGLE GPU (sp_size=1)
-    cmd = [
-        "python3",  # Use python3 directly for single GPU
-        "/workspace/SeedVR/projects/inference_seedvr2_3b.py",
-        "--video_path", input_path,
-        "--output_dir", os.path.dirname(output_path),
-        "--seed", str(seed),
-        "--res_h", str(res_h),
-        "--res_w", str(res_w),
-        "--sp_size", "1"  # SINGLE GPU!
-    ]
-    
-    print(f"\\n🚀 Running on SINGLE GPU:")
-    print(' '.join(cmd))
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
     
-    # Set single GPU
-    env = os.environ.copy()
-    env['CUDA_VISIBLE_DEVICES'] = '0'
-    
-    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
-    
-    if result.returncode == 0:
-        print("✅ Processing completed!")
+    try:
+        if res_h * res_w > max_pixels:
+            print(f"🧩 {res_w}x{res_h} exceeds the {memory_gb:.0f} GB budget, processing in tiles")
+            tiled = TiledRestore(
+                lambda tile, path, tile_dir, device: run_3b(path, tile_dir, tile.height, tile.width, seed, device),
+                devices=range(torch.cuda.device_count()),
+                max_pixels=max_pixels
+            )
+            with tempfile.TemporaryDirectory(dir=os.path.dirname(output_path) or ".") as workdir:
+                tiled.run(input_path, workdir, output_path, res_h, res_w)
+            print(f"✅ Processing completed in {len(tiled.tiles)} tiles!")
+        else:
+            output_file = run_3b(input_path, os.path.dirname(output_path) or ".", res_h, res_w, seed)
+            os.rename(output_file, output_path)
+            print("✅ Processing completed!")
         return True
-    else:
-        print(f"❌ Error: {result.stderr}")
+    except RuntimeError as e:
+        print(f"❌ Error: {e}")
         return False
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print("Usage: python3 process_single_gpu.py <input> <output> [resolution] [seed]")
         print("Example: python3 process_single_gpu.py input.mp4 output.mp4 720x1280")
-        print("\\n⚠️  Single H100 supports up to 720p (1280x720)")
+        print("\\n🧩 Above 720p frames are processed in tiles on a single H100")
         sys.exit(1)
     
     input_video = sys.argv[1]
@@ -168,14 +212,11 @@ api_update = '''#!/usr/bin/env python3
 """Add this to your API server for single GPU processing"""
 
 # In your process endpoint, use:
+# from process_runner import run_process_sync  (copied to /workspace)
 def process_with_seedvr2(video_path, res_h=720, res_w=1280, seed=42):
     """Process video with single GPU"""
     
-    # Single GPU limit: 720p
-    if res_h * res_w > 1280 * 720:
-        res_h, res_w = 720, 1280
-        print(f"📏 Resized to {res_w}x{res_h} for single GPU")
-    
+    # Larger resolutions are tiled by process_single_gpu.py, not downscaled
     output_path = f"/workspace/outputs/{uuid.uuid4()}.mp4"
     
     cmd = [
@@ -187,7 +228,8 @@ def process_with_seedvr2(video_path, res_h=720, res_w=1280, seed=42):
         str(seed)
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # Streams output to a log instead of holding it all in memory
+    result = run_process_sync(cmd, log_path=output_path + ".log", check=False)
     
     if result.returncode == 0 and os.path.exists(output_path):
         return output_path
@@ -234,8 +276,8 @@ fi
 echo "\\n📊 Supported Resolutions (Single H100):"
 echo "✅ 640x480   (SD)"
 echo "✅ 1280x720  (HD/720p) - RECOMMENDED"
-echo "⚠️  1920x1080 (FHD) - May exceed memory"
-echo "❌ 2560x1440 (2K) - Requires multi-GPU"
+echo "🧩 1920x1080 (FHD) - Spatial tiles"
+echo "🧩 2560x1440 (2K) - Spatial tiles"
 
 echo "\\n🚀 Ready to process!"
 echo "Run: python3 /workspace/process_single_gpu.py input.mp4 output.mp4"
@@ -249,7 +291,7 @@ print("\n" + "="*60)
 print("✅ SINGLE GPU SETUP COMPLETE!")
 print("="*60)
 print("\n📋 Key Points:")
-print("• Single H100-80G supports up to 720p (1280x720)")
+print("• Single H100-80G runs 720p directly; larger frames are restored in tiles")
 print("• Using SeedVR2-3B model (optimized for single GPU)")
 print("• No need for torchrun or multi-GPU setup")
 print("\n🚀 To process a video:")
@@ -6,10 +6,47 @@ Process videos with SeedVR2-7B on SINGLE GPU
 
 import os
 import sys
-import subprocess
+import glob
+import tempfile
 import torch
 
 sys.path.append("/workspace/SeedVR")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "runpod"))
+
+from spatial_tiler import TiledRestore, tile_pixel_budget
+from process_runner import run_process_sync
+
+# Full inference output; only its tail is kept in memory for errors
+LOG_DIR = os.getenv("SEEDVR2_LOG_DIR", "/workspace/logs")
+
+def run_7b(input_path, output_dir, res_h, res_w, seed, device=0):
+    """One 7B inference on a single GPU; returns the output file or raises"""
+    cmd = [
+        "python3",  # Single GPU, no torchrun needed
+        "/workspace/SeedVR/projects/inference_seedvr2_7b.py",  # 7B script
+        "--video_path", input_path,
+        "--output_dir", output_dir,
+        "--seed", str(seed),
+        "--res_h", str(res_h),
+        "--res_w", str(res_w),
+        "--sp_size", "1",  # Single GPU
+        "--ckpt_path", "/workspace/ckpts/SeedVR2-7B"  # 7B model path
+    ]
+    
+    print(f"\n🚀 Running 7B model on GPU {device}:")
+    print(' '.join(cmd))
+    
+    env = os.environ.copy()
+    env['CUDA_VISIBLE_DEVICES'] = str(device)
+    
+    log_name = f"{os.path.splitext(os.path.basename(input_path))[0]}_gpu{device}.log"
+    result = run_process_sync(cmd, env=env, log_path=os.path.join(LOG_DIR, log_name))
+    print(f"📈 Peak RSS {result.peak_rss_mb or 0:.0f} MB, CPU {result.cpu_seconds or 0:.0f}s, log: {result.log_path}")
+    
+    output_files = glob.glob(os.path.join(output_dir, "*.mp4"))
+    if not output_files:
+        raise RuntimeError("No output video found")
+    return output_files[0]
 
 def process_video_7b_single(input_path, output_path, resolution="720x1280", seed=42):
     """Process video using 7B model on single GPU"""
@@ -29,54 +66,38 @@ def process_video_7b_single(input_path, output_path, resolution="720x1280", seed
     print(f"🎮 GPU: {torch.cuda.get_device_name(0)} ({gpu_memory:.1f} GB)")
     print("📊 Using 7B model for better quality")
     
-    # 7B model needs more memory - limit to 720p on single GPU
-    if res_h * res_w > 1280 * 720:
-        print(f"⚠️  {res_w}x{res_h} too large for 7B model on single GPU")
-        print("📏 Limiting to 720p (1280x720)")
-        res_w, res_h = 1280, 720
+    # Frames past the memory budget are restored in overlapping tiles and blended
+    memory_gb = float(os.getenv("TILE_MEMORY_GB", "0")) or gpu_memory
+    max_pixels = tile_pixel_budget("7b", memory_gb)
     
     # Create output directory
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
     
-    # Use the 7B inference script
-    cmd = [
-        "python3",  # Single GPU, no torchrun needed
-        "/workspace/SeedVR/projects/inference_seedvr2_7b.py",  # 7B script
-        "--video_path", input_path,
-        "--output_dir", os.path.dirname(output_path),
-        "--seed", str(seed),
-        "--res_h", str(res_h),
-        "--res_w", str(res_w),
-        "--sp_size", "1",  # Single GPU
-        "--ckpt_path", "/workspace/ckpts/SeedVR2-7B"  # 7B model path
-    ]
-    
-    print(f"\n🚀 Running 7B model on single GPU:")
-    print(' '.join(cmd))
-    
-    # Set single GPU
-    env = os.environ.copy()
-    env['CUDA_VISIBLE_DEVICES'] = '0'
-    
-    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
-    
-    if result.returncode == 0:
-        print("✅ Processing completed with 7B model!")
-        
-        # Find output file
-        import glob
-        output_files = glob.glob(os.path.join(os.path.dirname(output_path), "*.mp4"))
-        if output_files:
+    try:
+        if res_h * res_w > max_pixels:
+            print(f"🧩 {res_w}x{res_h} exceeds the {memory_gb:.0f} GB budget, processing in tiles")
+            devices = range(torch.cuda.device_count())
+            tiled = TiledRestore(
+                lambda tile, path, tile_dir, device: run_7b(path, tile_dir, tile.height, tile.width, seed, device),
+                devices=devices,
+                max_pixels=max_pixels
+            )
+            with tempfile.TemporaryDirectory(dir=os.path.dirname(output_path) or ".") as workdir:
+                tiled.run(input_path, workdir, output_path, res_h, res_w)
+            print(f"✅ Processing completed with 7B model in {len(tiled.tiles)} tiles!")
+        else:
+            output_file = run_7b(input_path, os.path.dirname(output_path) or ".", res_h, res_w, seed)
+            print("✅ Processing completed with 7B model!")
             # Rename to desired output
-            os.rename(output_files[0], output_path)
-            return True
-    else:
-        print(f"❌ Error: {result.stderr}")
+            os.rename(output_file, output_path)
+        return True
+    except RuntimeError as e:
+        print(f"❌ Error: {e}")
         
-        # If OOM, suggest using 3B model
-        if "out of memory" in result.stderr.lower():
+        # If OOM, suggest a smaller memory budget
+        if "out of memory" in str(e).lower():
             print("\n💡 Suggestion: 7B model ran out of memory")
-            print("   Try: 1) Lower resolution, or")
+            print("   Try: 1) Lower TILE_MEMORY_GB for smaller tiles, or")
             print("        2) Use 3B model instead")
         return False
 
@@ -87,7 +108,7 @@ if __name__ == "__main__":
         print("\n📊 7B vs 3B models:")
         print("  • 7B: Better quality, more memory needed")
         print("  • 3B: Faster, less memory, still good quality")
-        print("\n⚠️  Single GPU limit: 720p (1280x720)")
+        print("\n🧩 Above ~720p frames are processed in tiles (budget: TILE_MEMORY_GB, default GPU memory)")
         sys.exit(1)
     
     input_video = sys.argv[1]
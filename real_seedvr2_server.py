@@ -9,7 +9,7 @@ import sys
 # Install dependencies
 subprocess.run([sys.executable, "-m", "pip", "install", "-q", "flask", "flask-cors"], capture_output=True)
 
-from flask import Flask, request, jsonify, send_file, Response
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os, uuid, shutil, threading, time
 from werkzeug.utils import secure_filename
@@ -19,18 +19,73 @@ CORS(app, origins="*")
 
 UPLOAD_FOLDER = '/workspace/uploads'
 OUTPUT_FOLDER = '/workspace/outputs'
+LOG_FOLDER = '/workspace/logs'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 # Add SeedVR to Python path
 sys.path.append("/workspace/SeedVR")
 
+# Warm inference worker lives next to the RunPod handler
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "runpod"))
+from inference_worker import InferenceWorkerClient, worker_command, DEFAULT_SOCKET_PATH
+from progress import ProgressTracker
+from process_runner import run_process_sync
+from file_ranges import content_etag, iter_segments, plan_response
+from admission import AdmissionController, AdmissionRejected, client_key, count_devices, parse_networks
+from cancellation import JobCancelled
+
 jobs = {}
+# Set to stop a running job; its process group is killed and the GPUs freed
+cancel_events = {}
+
+CKPT_PATH = "/workspace/ckpts/SeedVR2-7B"
+
+# Keeps the 7B model loaded on both GPUs between jobs
+inference_worker = InferenceWorkerClient(
+    DEFAULT_SOCKET_PATH,
+    worker_command(DEFAULT_SOCKET_PATH, script="/workspace/SeedVR/projects/inference_seedvr2_7b.py",
+                   model_size="7b", sp_size=2, ckpt_path=CKPT_PATH),
+    model_size="7b",
+    sp_size=2
+)
+USE_WARM_WORKER = os.getenv("WARM_WORKER", "true").lower() == "true"
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "16"))  # Accepted jobs waiting for the GPUs
+MAX_JOBS_PER_CLIENT = int(os.getenv("MAX_JOBS_PER_CLIENT", "4"))  # Queued plus running, per client
+TRUSTED_PROXIES = parse_networks(os.getenv("TRUSTED_PROXIES", ""))  # Only these may set X-Client-Id / X-Forwarded-For
+INFERENCES_PER_DEVICE = int(os.getenv("INFERENCES_PER_DEVICE", "1"))
+JOB_GPUS = 2  # Every job runs sequence-parallel on both GPUs
+
+def record_progress(job_id):
+    """Callback storing progress parsed from the model's output on the job"""
+    def on_progress(snapshot):
+        jobs[job_id]["progress"] = int(snapshot["progress"] * 100)
+        jobs[job_id]["stage"] = snapshot["stage"]
+        jobs[job_id]["eta_seconds"] = snapshot.get("eta_seconds")
+    return on_progress
 
 def run_seedvr2_processing(job_id, input_path, output_dir):
     """Actually run SeedVR2 processing"""
     print(f"\n🚀 Starting REAL SeedVR2 processing for job {job_id}")
     
+    if USE_WARM_WORKER:
+        try:
+            # Model stays loaded in the worker; only the first job pays for loading it
+            result = inference_worker.infer(input_path, output_dir, {"seed": 42, "res_h": 720, "res_w": 1280},
+                                            on_progress=record_progress(job_id), cancel=cancel_events.get(job_id))
+            print(f"✅ SeedVR2 processing completed for {job_id} in {result['infer_seconds']}s")
+            jobs[job_id]["status"] = "completed"
+            jobs[job_id]["output_file"] = result["output_path"]
+            return
+        except JobCancelled as e:
+            jobs[job_id]["status"] = "error"
+            jobs[job_id]["error"] = str(e)
+            return
+        except Exception as e:
+            # The cold run needs the same GPUs the worker holds; the next job starts it again
+            print(f"⚠️ Warm worker failed, retrying with a fresh process: {str(e)}")
+            inference_worker.kill()
+    
     # Build the command to run SeedVR2
     cmd = [
         "python3",
@@ -41,14 +96,18 @@ def run_seedvr2_processing(job_id, input_path, output_dir):
         "--res_h", "720",  # Start with 720p for faster processing
         "--res_w", "1280",
         "--sp_size", "2",  # Use both GPUs
-        "--ckpt_path", "/workspace/ckpts/SeedVR2-7B"
+        "--ckpt_path", CKPT_PATH
     ]
     
     print(f"Running command: {' '.join(cmd)}")
     
     try:
-        # Run the actual SeedVR2 model
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # Run the actual SeedVR2 model; output goes to a log file and the progress parser,
+        # only its tail stays in memory
+        tracker = ProgressTracker(record_progress(job_id))
+        result = run_process_sync(cmd, env={**os.environ, "PYTHONUNBUFFERED": "1"},
+                                  log_path=os.path.join(LOG_FOLDER, f"{job_id}.log"),
+                                  on_output=tracker.feed, cancel=cancel_events.get(job_id), check=False)
         
         if result.returncode == 0:
             print(f"✅ SeedVR2 processing completed for {job_id}")
@@ -64,15 +123,56 @@ def run_seedvr2_processing(job_id, input_path, output_dir):
                 jobs[job_id]["status"] = "error"
                 jobs[job_id]["error"] = "No output file generated"
         else:
-            print(f"❌ SeedVR2 processing failed: {result.stderr}")
+            print(f"❌ SeedVR2 processing failed: {result.tail}")
             jobs[job_id]["status"] = "error"
-            jobs[job_id]["error"] = result.stderr[:500]  # First 500 chars of error
+            jobs[job_id]["error"] = result.tail[-500:]  # Last 500 chars of output
             
     except Exception as e:
         print(f"❌ Exception during processing: {str(e)}")
         jobs[job_id]["status"] = "error"
         jobs[job_id]["error"] = str(e)
 
+def run_job(job_id, input_path, output_dir):
+    """Background thread: process the job, then settle it if it was cancelled meanwhile"""
+    try:
+        jobs[job_id]["status"] = "processing"
+        run_seedvr2_processing(job_id, input_path, output_dir)
+    finally:
+        # Its GPUs go to the next queued job
+        admission.finished(job_id)
+        if cancel_events.pop(job_id).is_set():
+            print(f"🛑 Job {job_id} cancelled")
+            jobs[job_id]["status"] = "cancelled"
+            jobs[job_id].pop("output_file", None)
+            shutil.rmtree(output_dir, ignore_errors=True)
+    
+    if jobs[job_id]["status"] == "completed" and "output_file" in jobs[job_id]:
+        # Hash the output now so the first download does not wait for its ETag
+        content_etag(jobs[job_id]["output_file"])
+
+def start_job(ticket):
+    """Called by the admission controller when a queued job gets the GPUs"""
+    threading.Thread(target=run_job, args=(ticket.job_id, *ticket.payload)).start()
+
+# One job at a time holds the GPUs; a burst waits in a bounded, per-client fair queue
+admission = AdmissionController(
+    start_job,
+    devices=count_devices(),
+    per_device=INFERENCES_PER_DEVICE,
+    max_queued=MAX_QUEUED_JOBS,
+    max_per_client=MAX_JOBS_PER_CLIENT
+)
+
+def client_id():
+    """Who the request counts against for fair share; see admission.client_key"""
+    return client_key(request.remote_addr, request.headers, TRUSTED_PROXIES)
+
+def too_busy(rejection):
+    response = jsonify(rejection.to_dict())
+    response.status_code = 429
+    response.headers["Retry-After"] = str(rejection.retry_after)
+    return response
+
 @app.after_request
 def after_request(response):
     response.headers['Access-Control-Allow-Origin'] = '*'
@@ -82,7 +182,7 @@ def after_request(response):
 
 @app.route('/')
 def root():
-    model_exists = os.path.exists("/workspace/ckpts/SeedVR2-7B")
+    model_exists = os.path.exists(CKPT_PATH)
     seedvr_exists = os.path.exists("/workspace/SeedVR/projects/inference_seedvr2_7b.py")
     
     return jsonify({
@@ -104,7 +204,7 @@ def health():
         "message": "Real SeedVR2 server running!",
         "runpod_status": {"status": "healthy"},
         "gpu_count": torch.cuda.device_count(),
-        "model_path": "/workspace/ckpts/SeedVR2-7B",
+        "model_path": CKPT_PATH,
         "processing_mode": "REAL"
     })
 
@@ -120,6 +220,13 @@ def upload():
     if file.filename == '':
         return jsonify({"error": "No file selected"}), 400
     
+    # Refuse before storing the upload when it could not be queued anyway
+    client = client_id()
+    try:
+        admission.check(client)
+    except AdmissionRejected as e:
+        return too_busy(e)
+    
     # Save uploaded file
     job_id = str(uuid.uuid4())[:8]
     filename = secure_filename(file.filename)
@@ -128,7 +235,7 @@ def upload():
     
     # Create job
     jobs[job_id] = {
-        "status": "processing",
+        "status": "queued",
         "input_file": filepath,
         "progress": 0,
         "started": time.time()
@@ -138,17 +245,22 @@ def upload():
     job_output_dir = os.path.join(OUTPUT_FOLDER, job_id)
     os.makedirs(job_output_dir, exist_ok=True)
     
-    # Start REAL processing in background thread
-    thread = threading.Thread(
-        target=run_seedvr2_processing,
-        args=(job_id, filepath, job_output_dir)
-    )
-    thread.start()
+    # Start REAL processing in a background thread once the GPUs are free
+    cancel_events[job_id] = threading.Event()
+    try:
+        position = admission.submit(job_id, client, JOB_GPUS, (filepath, job_output_dir))
+    except AdmissionRejected as e:
+        jobs.pop(job_id, None)
+        cancel_events.pop(job_id, None)
+        os.remove(filepath)
+        shutil.rmtree(job_output_dir, ignore_errors=True)
+        return too_busy(e)
     
     return jsonify({
         "status": "processing",
         "job_id": job_id,
-        "message": "REAL SeedVR2 processing started!"
+        "queue_position": position,
+        "message": f"Queued at position {position}" if position else "REAL SeedVR2 processing started!"
     })
 
 @app.route('/status/<job_id>', methods=['GET', 'OPTIONS'])
@@ -184,31 +296,88 @@ def status(job_id):
             "message": "SeedVR2 processing failed"
         })
     
+    elif job["status"] == "cancelled":
+        return jsonify({
+            "status": "cancelled",
+            "message": "SeedVR2 processing was cancelled"
+        })
+    
+    elif job["status"] == "queued":
+        position = admission.position(job_id)
+        return jsonify({
+            "status": "processing",
+            "progress": 0,
+            "stage": "queued",
+            "queue_position": position,
+            "message": f"Waiting for a GPU, position {position}",
+            "elapsed_time": time.time() - job["started"]
+        })
+    
     else:  # still processing
-        # Calculate approximate progress based on time
+        # Progress parsed from the model's output by record_progress
         elapsed = time.time() - job["started"]
-        estimated_progress = min(90, int(elapsed * 2))  # ~45 seconds estimate
+        progress = job.get("progress", 0)
+        stage = job.get("stage", "loading")
         
         return jsonify({
             "status": "processing",
-            "progress": estimated_progress,
-            "message": f"SeedVR2 processing... {estimated_progress}%",
+            "progress": progress,
+            "stage": stage,
+            "eta_seconds": job.get("eta_seconds"),
+            "message": f"SeedVR2 {stage}... {progress}%",
             "elapsed_time": elapsed
         })
 
+@app.route('/cancel/<job_id>', methods=['POST', 'OPTIONS'])
+def cancel(job_id):
+    if request.method == 'OPTIONS':
+        return Response(status=200)
+    
+    if job_id not in jobs:
+        return jsonify({"error": "Job not found"}), 404
+    
+    if admission.withdraw(job_id):
+        # Never started, so there is no thread to settle it
+        cancel_events.pop(job_id, None)
+        jobs[job_id]["status"] = "cancelled"
+        shutil.rmtree(os.path.join(OUTPUT_FOLDER, job_id), ignore_errors=True)
+        return jsonify({"status": "cancelled", "job_id": job_id, "message": "Removed from the queue"})
+    
+    event = cancel_events.get(job_id)
+    if event is None or jobs[job_id]["status"] != "processing":
+        return jsonify({"error": f"Cannot cancel job in {jobs[job_id]['status']} state"}), 400
+    
+    event.set()
+    jobs[job_id]["status"] = "cancelled"
+    return jsonify({"status": "cancelled", "job_id": job_id, "message": "Processing stopped"})
+
+@app.route('/queue')
+def queue():
+    """Admission queue depth, running jobs and wait times"""
+    return jsonify(admission.stats())
+
 @app.route('/download/<job_id>')
 def download(job_id):
+    """Serve the result with Range, If-Range and If-None-Match so players can seek"""
     if job_id not in jobs:
         return jsonify({"error": "Job not found"}), 404
     
     job = jobs[job_id]
     if "output_file" in job and os.path.exists(job["output_file"]):
-        return send_file(
-            job["output_file"],
-            as_attachment=True,
-            download_name=f"seedvr2_{job_id}.mp4",
-            mimetype='video/mp4'
-        )
+        path = job["output_file"]
+        plan = plan_response(path, request.headers, "video/mp4", f"seedvr2_{job_id}.mp4")
+        offset = plan.whole_tail()
+        file_wrapper = request.environ.get("wsgi.file_wrapper")
+        if request.method == "HEAD":
+            body = []
+        elif offset is not None and file_wrapper is not None:
+            # Runs to the end of the file, so the server's wrapper (sendfile under gunicorn) can send it as is
+            f = open(path, "rb")
+            f.seek(offset)
+            body = file_wrapper(f, 1024 * 1024)
+        else:
+            body = iter_segments(path, plan.segments)
+        return Response(body, status=plan.status, headers=plan.headers, direct_passthrough=True)
     
     return jsonify({"error": "Output file not found"}), 404
 
@@ -231,7 +400,7 @@ if __name__ == '__main__':
     print("="*60)
     
     # Check setup
-    model_ok = os.path.exists("/workspace/ckpts/SeedVR2-7B")
+    model_ok = os.path.exists(CKPT_PATH)
     script_ok = os.path.exists("/workspace/SeedVR/projects/inference_seedvr2_7b.py")
     
     if model_ok and script_ok:
@@ -250,4 +419,8 @@ if __name__ == '__main__':
     print("\n⚠️  Upload a video to see REAL SeedVR2 processing!")
     print("="*60 + "\n")
     
+    # Start loading the model now instead of on the first upload
+    if USE_WARM_WORKER:
+        threading.Thread(target=inference_worker.start, daemon=True).start()
+    
     app.run(host='0.0.0.0', port=8080, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Admission control for the SeedVR2 API servers
+Accepted jobs wait in a bounded queue and are started only while GPU slots
+are free (a device runs at most per_device inferences, a job takes one
+slot per device it spans). The next job comes from the waiting client
+with the fewest jobs running, the least recently served among equals, so one client's
+burst cannot push everyone else back; each client may also only hold
+max_per_client jobs.
+When a limit is hit the request is refused with a Retry-After estimate
+and the position it would have had, instead of launching another
+inference that runs the GPUs out of memory.
+"""
+
+import os
+import math
+import ipaddress
+import time
+import threading
+import subprocess
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence
+
+# Wait and run times kept for the percentiles in stats()
+HISTORY = 256
+# Assumed run time until the first job finishes
+DEFAULT_RUN_SECONDS = 120.0
+
+def count_devices() -> int:
+    """GPUs this server can use: SIMULATED_GPUS, CUDA_VISIBLE_DEVICES or nvidia-smi, else 1"""
+    for var in ("SIMULATED_GPUS", "CUDA_VISIBLE_DEVICES"):
+        value = os.getenv(var)
+        if value:
+            return len([d for d in value.split(",") if d.strip()])
+    try:
+        listing = subprocess.run(["nvidia-smi", "-L"], capture_output=True, text=True, timeout=10).stdout
+        return max(1, sum(1 for line in listing.splitlines() if line.startswith("GPU ")))
+    except (OSError, subprocess.SubprocessError):
+        return 1
+
+def parse_networks(value: str) -> List[Any]:
+    """Comma-separated addresses or CIDR blocks, such as 10.0.0.0/8,127.0.0.1"""
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip()]
+
+def _trusted(address: Optional[str], networks: Sequence[Any]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address or "")
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+def client_key(peer: Optional[str], headers: Mapping[str, str], trusted_proxies: Sequence[Any]) -> str:
+    """Who a request counts against for fair share
+
+    X-Client-Id and X-Forwarded-For are only believed when the request came
+    through a trusted proxy; anyone else could pick a fresh identity per
+    job. Forwarded addresses are read from the right, skipping our proxies,
+    since the left end is whatever the client sent.
+    """
+    if not _trusted(peer, trusted_proxies):
+        return peer or "unknown"
+    client = headers.get("x-client-id")
+    if client:
+        return client
+    forwarded = [hop.strip() for hop in (headers.get("x-forwarded-for") or "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not _trusted(hop, trusted_proxies):
+            return hop
+    return forwarded[0] if forwarded else peer
+
+class AdmissionRejected(Exception):
+    """The job was not accepted; retry after retry_after seconds"""
+
+    def __init__(self, reason: str, retry_after: int, position: int):
+        super().__init__(f"{reason}, retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+        self.position = position
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"error": self.reason, "retry_after": self.retry_after, "queue_position": self.position}
+
+class Ticket:
+    """One admitted job"""
+
+    def __init__(self, job_id: str, client: str, slots: int, payload: Any):
+        self.job_id = job_id
+        self.client = client
+        self.slots = slots
+        self.payload = payload
+        self.submitted = time.monotonic()
+        self.started: Optional[float] = None
+
+class AdmissionController:
+    """Bounded, per-client fair job queue in front of a fixed number of GPU slots
+
+    start(ticket) is called, outside the lock, whenever a job may begin;
+    the server must call finished(job_id) once it ends, however it ends.
+    """
+
+    def __init__(self, start: Callable[[Ticket], None], devices: int = 1, per_device: int = 1,
+                 max_queued: int = 16, max_per_client: int = 4):
+        self.start = start
+        self.slots = max(1, devices * per_device)
+        self.max_queued = max_queued
+        self.max_per_client = max_per_client
+        self._lock = threading.Lock()
+        # Waiting tickets per client, in order of arrival
+        self._waiting: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()
+        self._running: Dict[str, Ticket] = {}
+        self._per_client: Dict[str, int] = {}
+        # When each client with jobs last had one started
+        self._served: Dict[str, int] = {}
+        self._starts = 0
+        self._waits: Deque[float] = deque(maxlen=HISTORY)
+        self._runs: Deque[float] = deque(maxlen=HISTORY)
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.completed = 0
+        self.withdrawn = 0
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._waiting.values())
+
+    def _used(self) -> int:
+        return sum(ticket.slots for ticket in self._running.values())
+
+    def _running_by_client(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for ticket in self._running.values():
+            counts[ticket.client] = counts.get(ticket.client, 0) + 1
+        return counts
+
+    @staticmethod
+    def _next_client(waiting: "OrderedDict[str, Deque[Ticket]]", running: Dict[str, int],
+                     served: Dict[str, int]) -> str:
+        """Waiting client with the fewest running jobs, the least recently served on ties"""
+        return min(waiting, key=lambda client: (running.get(client, 0), served.get(client, -1)))
+
+    def _order(self) -> List[Ticket]:
+        """Waiting tickets in the order they will start, if every job took the same time"""
+        waiting = OrderedDict((client, deque(queue)) for client, queue in self._waiting.items())
+        running = self._running_by_client()
+        served = dict(self._served)
+        order = []
+        while waiting:
+            client = self._next_client(waiting, running, served)
+            order.append(waiting[client].popleft())
+            running[client] = running.get(client, 0) + 1
+            served[client] = self._starts + len(order)
+            if not waiting[client]:
+                del waiting[client]
+        return order
+
+    def _retry_after(self) -> int:
+        """Seconds until a running job is expected to end and free a place"""
+        run_seconds = sum(self._runs) / len(self._runs) if self._runs else DEFAULT_RUN_SECONDS
+        return max(1, math.ceil(run_seconds / max(1, len(self._running))))
+
+    def _refuse(self, reason: str, position: int) -> AdmissionRejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return AdmissionRejected(reason, self._retry_after(), position)
+
+    def check(self, client: str):
+        """Raise AdmissionRejected if a job from client would be refused now
+
+        Lets a server refuse before it stores an upload; submit() checks again.
+        """
+        with self._lock:
+            self._check(client)
+
+    def _check(self, client: str):
+        queued = self._queued()
+        if self._per_client.get(client, 0) >= self.max_per_client:
+            raise self._refuse("Too many jobs from this client", queued + 1)
+        if queued >= self.max_queued:
+            raise self._refuse("Queue is full", queued + 1)
+
+    def submit(self, job_id: str, client: str, slots: int = 1, payload: Any = None) -> int:
+        """Admit a job and return its queue position (0 once it has started)"""
+        ticket = Ticket(job_id, client, min(max(1, slots), self.slots), payload)
+        with self._lock:
+            self._check(client)
+            self._waiting.setdefault(client, deque()).append(ticket)
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+            self.admitted += 1
+        self._dispatch()
+        return self.position(job_id) or 0
+
+    def _dispatch(self):
+        startable = []
+        with self._lock:
+            running = self._running_by_client()
+            while self._waiting:
+                # The next client's oldest job; it waits for room rather than being skipped
+                client = self._next_client(self._waiting, running, self._served)
+                queue = self._waiting[client]
+                ticket = queue[0]
+                if self._used() + ticket.slots > self.slots:
+                    break
+                queue.popleft()
+                if not queue:
+                    del self._waiting[client]
+                self._starts += 1
+                self._served[client] = self._starts
+                ticket.started = time.monotonic()
+                self._waits.append(ticket.started - ticket.submitted)
+                self._running[ticket.job_id] = ticket
+                running[client] = running.get(client, 0) + 1
+                startable.append(ticket)
+        for ticket in startable:
+            self.start(ticket)
+
+    def _forget(self, ticket: Ticket):
+        self._per_client[ticket.client] -= 1
+        if not self._per_client[ticket.client]:
+            del self._per_client[ticket.client]
+            self._served.pop(ticket.client, None)
+
+    def finished(self, job_id: str):
+        """A started job ended; its slots go to the next waiting job"""
+        with self._lock:
+            ticket = self._running.pop(job_id, None)
+            if ticket is None:
+                return
+            self._forget(ticket)
+            self._runs.append(time.monotonic() - ticket.started)
+            self.completed += 1
+        self._dispatch()
+
+    def withdraw(self, job_id: str) -> bool:
+        """Drop a job that has not started yet; False if it is not waiting"""
+        with self._lock:
+            ticket = next((t for queue in self._waiting.values() for t in queue if t.job_id == job_id), None)
+            if ticket is None:
+                return False
+            queue = self._waiting[ticket.client]
+            queue.remove(ticket)
+            if not queue:
+                del self._waiting[ticket.client]
+            self._forget(ticket)
+            self.withdrawn += 1
+        # The withdrawn job may have been the one holding back smaller jobs behind it
+        self._dispatch()
+        return True
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place among waiting jobs, or None if the job is not waiting"""
+        with self._lock:
+            for index, ticket in enumerate(self._order()):
+                if ticket.job_id == job_id:
+                    return index + 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            now = time.monotonic()
+            oldest = min((q[0].submitted for q in self._waiting.values()), default=None)
+            return {
+                "queue_depth": self._queued(),
+                "running": len(self._running),
+                "slots": self.slots,
+                "slots_in_use": self._used(),
+                "max_queued": self.max_queued,
+                "max_per_client": self.max_per_client,
+                "clients": dict(self._per_client),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "completed": self.completed,
+                "withdrawn": self.withdrawn,
+                "oldest_wait_seconds": round(now - oldest, 1) if oldest is not None else 0.0,
+                "wait_seconds": {
+                    "avg": round(sum(waits) / len(waits), 2) if waits else 0.0,
+                    "p50": round(waits[len(waits) // 2], 2) if waits else 0.0,
+                    "p95": round(waits[int(len(waits) * 0.95)], 2) if waits else 0.0,
+                    "max": round(waits[-1], 2) if waits else 0.0
+                },
+                "avg_run_seconds": round(sum(self._runs) / len(self._runs), 1) if self._runs else None
+            }
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Expiry-driven garbage collector for worker files and job records
+Keeps a min-heap of expiry times so a sweep only touches entries that are due
+"""
+
+import time
+import heapq
+import shutil
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ExpiryHeap:
+    """Min-heap of (expires_at, key) with O(log n) reschedule and cancel
+
+    Rescheduling or cancelling a key leaves its old heap entry in place; stale
+    entries are recognised and skipped when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._expiry: Dict[str, float] = {}
+
+    def schedule(self, key: str, expires_at: float):
+        self._expiry[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, key))
+
+    def cancel(self, key: str):
+        self._expiry.pop(key, None)
+
+    def _drop_stale(self):
+        while self._heap and self._expiry.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_expiry(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float, limit: int) -> List[str]:
+        due = []
+        while len(due) < limit:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, key = heapq.heappop(self._heap)
+            del self._expiry[key]
+            due.append(key)
+        return due
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+class ArtifactCollector:
+    """Delete expired files, directories and job records in small time slices
+
+    Each scheduled key names a path on disk; on_expire, if given, is called
+    with the path after it is removed (e.g. to drop the matching job record).
+    Deletes run in a worker thread and the sweep yields to the event loop
+    every slice_seconds, so a large backlog never stalls request handling.
+    """
+
+    def __init__(self, slice_seconds: float = 0.01, batch_size: int = 64,
+                 max_sleep: float = 300.0, on_expire: Optional[Callable[[str], Any]] = None):
+        self.heap = ExpiryHeap()
+        self.slice_seconds = slice_seconds
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.on_expire = on_expire
+        self._task: Optional[asyncio.Task] = None
+        self.deleted = 0
+        self.errors = 0
+
+    def schedule(self, path: Path, ttl: float):
+        self.heap.schedule(str(path), time.time() + ttl)
+
+    def cancel(self, path: Path):
+        self.heap.cancel(str(path))
+
+    def seed_from_disk(self, directory: Path, ttl: float):
+        """Schedule what a previous run left behind, by modification time (startup only)"""
+        for entry in directory.iterdir():
+            self.heap.schedule(str(entry), entry.stat().st_mtime + ttl)
+
+    @staticmethod
+    def _remove(path: str):
+        target = Path(path)
+        if target.is_dir():
+            shutil.rmtree(target, ignore_errors=True)
+        elif target.exists():
+            target.unlink()
+
+    async def sweep(self) -> int:
+        """Delete everything that is due; returns the number of entries removed"""
+        removed = 0
+        slice_start = time.monotonic()
+        while True:
+            due = self.heap.pop_due(time.time(), self.batch_size)
+            for path in due:
+                try:
+                    await asyncio.to_thread(self._remove, path)
+                    if self.on_expire:
+                        self.on_expire(path)
+                    removed += 1
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning(f"Failed to delete {path}: {e}")
+                if time.monotonic() - slice_start >= self.slice_seconds:
+                    await asyncio.sleep(0)
+                    slice_start = time.monotonic()
+            if len(due) < self.batch_size:
+                self.deleted += removed
+                return removed
+
+    async def run(self):
+        while True:
+            await self.sweep()
+            # Sleep until the next entry expires (re-checked at least every max_sleep)
+            next_expiry = self.heap.next_expiry()
+            delay = self.max_sleep if next_expiry is None else next_expiry - time.time()
+            await asyncio.sleep(min(max(delay, 0.0), self.max_sleep))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scheduled": len(self.heap),
+            "deleted": self.deleted,
+            "errors": self.errors,
+            "next_expiry": self.heap.next_expiry()
+        }
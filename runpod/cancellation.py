@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Job cancellation tokens for the RunPod worker
+Every running job has a threading.Event that whoever learns of the
+cancellation sets; the stages check it between steps and hand it to
+anything long-running (GPU waits, inference processes, the warm worker)
+so they stop early and release what they hold.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+class JobCancelled(Exception):
+    """The job was cancelled while this worker was running it"""
+
+class CancelRegistry:
+    """Cancellation events of the jobs this worker is running, by job id"""
+
+    def __init__(self):
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def register(self, job_id: str) -> threading.Event:
+        with self._lock:
+            return self._events.setdefault(job_id, threading.Event())
+
+    def token(self, job_id: str) -> Optional[threading.Event]:
+        with self._lock:
+            return self._events.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Signal the job to stop; False when it is not running here"""
+        event = self.token(job_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def is_cancelled(self, job_id: str) -> bool:
+        event = self.token(job_id)
+        return event is not None and event.is_set()
+
+    def check(self, job_id: str):
+        """Raise JobCancelled if the job has been cancelled"""
+        if self.is_cancelled(job_id):
+            raise JobCancelled(f"Job {job_id} was cancelled")
+
+    def discard(self, job_id: str):
+        with self._lock:
+            self._events.pop(job_id, None)
+
+    def active(self) -> List[str]:
+        """Jobs still running and not yet cancelled"""
+        with self._lock:
+            return [job_id for job_id, event in self._events.items() if not event.is_set()]
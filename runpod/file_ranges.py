@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Byte-range and conditional GET handling for serving result files
+plan_response() turns the request headers into a status, response headers
+and the byte segments to send; each server streams those segments with
+its own response type. Single and multiple ranges, suffix ranges,
+If-None-Match and If-Range are supported. ETags are strong and derived
+from the file's SHA-256, so a player only revalidates against the same
+bytes.
+"""
+
+import os
+import re
+import uuid
+import hashlib
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+# More ranges than this are answered with the whole file, as RFC 9110 allows
+MAX_RANGES = 16
+MAX_CACHED_ETAGS = 4096
+
+# (prefix, offset, length): bytes to send before a slice of the file
+Segment = Tuple[bytes, int, int]
+
+_etags: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_etags_lock = threading.Lock()
+
+class RangeNotSatisfiable(Exception):
+    """None of the requested ranges overlaps the file"""
+
+class FilePlan:
+    """What to answer for one request for a file"""
+
+    def __init__(self, status: int, headers: Dict[str, str], segments: List[Segment], size: int):
+        self.status = status
+        self.headers = headers
+        self.segments = segments
+        self.size = size
+
+    def whole_tail(self) -> Optional[int]:
+        """Offset of the only segment when it runs to the end of the file, else None
+
+        Such a body can go to a server's file wrapper (sendfile) unchanged.
+        """
+        if len(self.segments) != 1 or self.segments[0][0]:
+            return None
+        _, offset, length = self.segments[0]
+        return offset if offset + length == self.size else None
+
+def content_etag(path) -> str:
+    """Strong ETag from the file's SHA-256, cached until its size or mtime changes"""
+    path = str(path)
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _etags_lock:
+        cached = _etags.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    with _etags_lock:
+        _etags[path] = (key, etag)
+        while len(_etags) > MAX_CACHED_ETAGS:
+            _etags.pop(next(iter(_etags)))
+    return etag
+
+def parse_ranges(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """Sorted, merged inclusive ranges of a Range header; None to send the whole file
+
+    Malformed headers are ignored as the RFC requires. Raises
+    RangeNotSatisfiable when the header is valid but misses the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length == 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+                continue
+            start = int(first)
+            end = int(last) if last else max(start, size - 1)
+        except ValueError:
+            return None
+        if end < start:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged if len(merged) <= MAX_RANGES else None
+
+def _etag_listed(header: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match list"""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _if_range_holds(value: str, etag: str, mtime: float) -> bool:
+    """If-Range needs a strong ETag match or the exact Last-Modified date"""
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        return value == etag
+    try:
+        return int(parsedate_to_datetime(value).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+def content_disposition(filename: str) -> str:
+    """Attachment header for any name: an ASCII fallback plus the RFC 5987 UTF-8 form"""
+    filename = re.sub(r"[\x00-\x1f\x7f]", "", filename) or "download"
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=utf-8''{quote(filename, safe='')}"
+
+def plan_response(path, request_headers: Mapping[str, str], content_type: str = "application/octet-stream",
+                  filename: Optional[str] = None) -> FilePlan:
+    """Status, headers and byte segments answering a GET for path
+
+    request_headers must look names up case-insensitively (Starlette and
+    Werkzeug headers both do).
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = content_etag(path)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+    }
+    if filename:
+        headers["Content-Disposition"] = content_disposition(filename)
+
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None and _etag_listed(if_none_match, etag):
+        return FilePlan(304, headers, [], size)
+
+    range_header = request_headers.get("range")
+    if_range = request_headers.get("if-range")
+    if range_header and if_range is not None and not _if_range_holds(if_range, etag, stat.st_mtime):
+        # The client's partial copy is stale: send the whole current file
+        range_header = None
+
+    try:
+        ranges = parse_ranges(range_header, size)
+    except RangeNotSatisfiable:
+        headers.update({"Content-Range": f"bytes */{size}", "Content-Length": "0"})
+        return FilePlan(416, headers, [], size)
+
+    if ranges is None:
+        headers.update({"Content-Type": content_type, "Content-Length": str(size)})
+        return FilePlan(200, headers, [(b"", 0, size)], size)
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers.update({
+            "Content-Type": content_type,
+            "Content-Length": str(end - start + 1),
+            "Content-Range": f"bytes {start}-{end}/{size}",
+        })
+        return FilePlan(206, headers, [(b"", start, end - start + 1)], size)
+
+    # Several ranges: one multipart/byteranges body
+    boundary = uuid.uuid4().hex
+    segments = []
+    for index, (start, end) in enumerate(ranges):
+        part = (f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n")
+        if index:
+            part = "\r\n" + part
+        segments.append((part.encode("latin-1"), start, end - start + 1))
+    segments.append((f"\r\n--{boundary}--\r\n".encode("latin-1"), 0, 0))
+    headers.update({
+        "Content-Type": f"multipart/byteranges; boundary={boundary}",
+        "Content-Length": str(sum(len(prefix) + length for prefix, _, length in segments)),
+    })
+    return FilePlan(206, headers, segments, size)
+
+def iter_segments(path, segments: List[Segment], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Bytes of a plan's segments, read with pread so no more than a chunk is held"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for prefix, offset, length in segments:
+            if prefix:
+                yield prefix
+            end = offset + length
+            while offset < end:
+                data = os.pread(fd, min(chunk_size, end - offset), offset)
+                if not data:
+                    return
+                offset += len(data)
+                yield data
+    finally:
+        os.close(fd)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Memory-aware GPU scheduler for the RunPod worker
+Tracks which devices are busy and how much memory each can offer, picks
+the sequence-parallel size a job needs from a per-model memory estimate,
+and hands concurrent jobs disjoint device sets. Jobs that do not fit yet
+wait in FIFO order until enough devices are released.
+"""
+
+import os
+import sys
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from cancellation import JobCancelled
+
+logger = logging.getLogger(__name__)
+
+# Peak memory per device: GB for weights and workspace (every device holds a
+# copy), plus GB per output megapixel over a full frame window, split across
+# the sequence-parallel devices. Matches the single-GPU 720p and 2-GPU 1080p
+# 7B limits on 80 GB cards.
+MODEL_MEMORY = {
+    "3b": (18.0, 40.0),
+    "7b": (36.0, 40.0),
+}
+
+# Frames the model attends over at once; shorter clips need proportionally less
+FRAME_WINDOW = 121
+
+SP_SIZES = (1, 2, 4, 8)
+
+def estimate_memory_gb(model_size: str, res_h: int, res_w: int, frames: Optional[int] = None,
+                       sp_size: int = 1) -> float:
+    """Peak GB per device to restore res_w x res_h output with sp_size devices"""
+    base_gb, gb_per_megapixel = MODEL_MEMORY[model_size]
+    window = min(frames, FRAME_WINDOW) / FRAME_WINDOW if frames else 1.0
+    return base_gb + gb_per_megapixel * res_h * res_w / 1e6 * window / sp_size
+
+class Device:
+    """One GPU: its memory, any model resident on it, and the job using it"""
+
+    def __init__(self, index: int, total_gb: float, name: str = "gpu"):
+        self.index = index
+        self.total_gb = total_gb
+        self.name = name
+        self.resident_gb = 0.0
+        self.resident_model: Optional[str] = None
+        self.job: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index": self.index, "name": self.name, "total_gb": round(self.total_gb, 1),
+                "resident_model": self.resident_model, "resident_gb": self.resident_gb, "job": self.job}
+
+def discover_devices() -> List[Device]:
+    """CUDA devices, or SIMULATED_GPUS (comma-separated GB, e.g. "80,80,40") for testing"""
+    simulated = os.getenv("SIMULATED_GPUS")
+    if simulated:
+        return [Device(i, float(gb), "simulated") for i, gb in enumerate(simulated.split(","))]
+    import torch
+    return [
+        Device(i, torch.cuda.get_device_properties(i).total_memory / 1e9, torch.cuda.get_device_name(i))
+        for i in range(torch.cuda.device_count())
+    ]
+
+class Allocation:
+    """Devices granted to one job"""
+
+    def __init__(self, job: str, devices: List[int], sp_size: int, estimate_gb: float, waited: float):
+        self.job = job
+        self.devices = devices
+        self.sp_size = sp_size
+        self.estimate_gb = estimate_gb
+        self.waited = waited
+
+class GPUScheduler:
+    """Grant jobs disjoint device sets that fit their memory estimate
+
+    A device runs one job at a time. Among idle devices with enough memory
+    the smallest are chosen (best fit), keeping large cards free for large
+    jobs. Memory held by a resident model, such as a warm worker's weights,
+    is unavailable to other jobs; a job may ask for those devices as warm
+    and then counts the resident weights as its own.
+    """
+
+    def __init__(self, devices: Sequence[Device], headroom_gb: float = 2.0):
+        self.devices = list(devices)
+        self.headroom_gb = headroom_gb
+        self._cond = threading.Condition()
+        self._queue: List[int] = []
+        self._tickets = 0
+        self.granted = 0
+        self.wait_seconds = 0.0
+
+    def reserve(self, indices: Sequence[int], model_size: str):
+        """Mark model_size weights as resident on these devices"""
+        with self._cond:
+            for i in indices:
+                self.devices[i].resident_model = model_size
+                self.devices[i].resident_gb = MODEL_MEMORY[model_size][0]
+
+    def unreserve(self, indices: Sequence[int]):
+        """The resident weights on these devices are gone (their process exited)"""
+        with self._cond:
+            for i in indices:
+                self.devices[i].resident_model = None
+                self.devices[i].resident_gb = 0.0
+            # Waiting jobs may fit in the memory just freed
+            self._cond.notify_all()
+
+    def _capacity(self, device: Device, warm: bool) -> float:
+        # A warm job reuses the resident weights; anything else must fit beside them
+        resident = 0.0 if warm else device.resident_gb
+        return device.total_gb - resident - self.headroom_gb
+
+    def max_free_gb(self) -> float:
+        """Memory the largest device offers a job that brings its own weights"""
+        return max((self._capacity(d, False) for d in self.devices), default=0.0)
+
+    def plan(self, model_size: str, res_h: int, res_w: int, frames: Optional[int] = None,
+             warm: Optional[Sequence[int]] = None) -> Optional[int]:
+        """Smallest sp_size whose per-device estimate fits on that many devices, or None"""
+        for sp_size in SP_SIZES:
+            need = estimate_memory_gb(model_size, res_h, res_w, frames, sp_size)
+            if self._pick(sp_size, need, warm, idle_only=False) is not None:
+                return sp_size
+        return None
+
+    def _pick(self, sp_size: int, need: float, warm: Optional[Sequence[int]],
+              idle_only: bool = True) -> Optional[List[int]]:
+        # The same rule decides what fits at all (idle_only=False) and what can be granted now
+        def usable(d: Device) -> bool:
+            return not idle_only or d.job is None
+
+        if warm and len(warm) == sp_size and all(
+            usable(self.devices[i]) and self._capacity(self.devices[i], True) >= need for i in warm
+        ):
+            return list(warm)
+        idle = sorted(
+            (d for d in self.devices if usable(d) and self._capacity(d, False) >= need),
+            key=lambda d: (self._capacity(d, False), d.index)
+        )
+        if len(idle) < sp_size:
+            return None
+        return sorted(d.index for d in idle[:sp_size])
+
+    def acquire(self, job: str, model_size: str, res_h: int, res_w: int, frames: Optional[int] = None,
+                sp_size: Optional[int] = None, warm: Optional[Sequence[int]] = None,
+                timeout: Optional[float] = None, cancel: Optional[threading.Event] = None) -> Allocation:
+        """Block until a device set for the job is free; jobs are granted in arrival order
+
+        Raises ValueError at once when no device set could ever hold the job.
+        Setting cancel gives up the place in line, raising JobCancelled.
+        """
+        sp_size = sp_size or self.plan(model_size, res_h, res_w, frames, warm)
+        if sp_size is None:
+            raise ValueError(f"{model_size} at {res_w}x{res_h} does not fit on the available GPUs")
+        need = estimate_memory_gb(model_size, res_h, res_w, frames, sp_size)
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._cond:
+            # Waiting for devices that could never hold the job would block the queue behind it
+            if self._pick(sp_size, need, warm, idle_only=False) is None:
+                raise ValueError(f"No {sp_size} GPU(s) can hold {need:.1f} GB for job {job}")
+            ticket = self._tickets
+            self._tickets += 1
+            self._queue.append(ticket)
+            try:
+                while True:
+                    devices = self._pick(sp_size, need, warm) if self._queue[0] == ticket else None
+                    if devices is not None:
+                        break
+                    if cancel is not None and cancel.is_set():
+                        raise JobCancelled(f"Job {job} was cancelled while waiting for GPUs")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No {sp_size} GPU(s) with {need:.1f} GB free for job {job}")
+                    # A cancel sets no condition, so waits are bounded to notice it
+                    self._cond.wait(min(remaining or 0.5, 0.5) if cancel is not None else remaining)
+            finally:
+                self._queue.remove(ticket)
+                # The next job in line may fit on what is left
+                self._cond.notify_all()
+            for i in devices:
+                self.devices[i].job = job
+            waited = time.monotonic() - start
+            self.granted += 1
+            self.wait_seconds += waited
+        logger.info(f"Job {job}: GPUs {devices} (sp_size={sp_size}, ~{need:.1f} GB each) after {waited:.1f}s")
+        return Allocation(job, devices, sp_size, need, waited)
+
+    def release(self, allocation: Allocation):
+        with self._cond:
+            for i in allocation.devices:
+                self.devices[i].job = None
+            self._cond.notify_all()
+
+    @contextmanager
+    def allocate(self, job: str, model_size: str, res_h: int, res_w: int, **kwargs) -> Iterator[Allocation]:
+        allocation = self.acquire(job, model_size, res_h, res_w, **kwargs)
+        try:
+            yield allocation
+        finally:
+            self.release(allocation)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "devices": [d.to_dict() for d in self.devices],
+                "busy": sum(1 for d in self.devices if d.job is not None),
+                "waiting": len(self._queue),
+                "granted": self.granted,
+                "wait_seconds": round(self.wait_seconds, 3)
+            }
+
+if __name__ == "__main__":
+    # Show the plan for a resolution: gpu_scheduler.py <height>x<width> <model> [frames]
+    res_h, res_w = map(int, sys.argv[1].split("x"))
+    frames = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    scheduler = GPUScheduler(discover_devices())
+    sp_size = scheduler.plan(sys.argv[2], res_h, res_w, frames)
+    estimate = estimate_memory_gb(sys.argv[2], res_h, res_w, frames, sp_size or 1)
+    print({"sp_size": sp_size, "estimate_gb": round(estimate, 1), **scheduler.stats()})
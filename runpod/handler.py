@@ -1,16 +1,30 @@
 import runpod
 import os
-import subprocess
-import torch
-import logging
-from typing import Dict, Any
-import requests
+import asyncio
+import shutil
 import tempfile
+import requests
+import logging
+from typing import Dict, Any, Optional
+import uuid
+from datetime import datetime
 from pathlib import Path
 from google.cloud import storage
 from google.oauth2 import service_account
 import json
 
+from storage_service import GCSStorage
+from inference_worker import InferenceWorkerClient, worker_command, DEFAULT_SOCKET_PATH
+from job_pipeline import JobPipeline, FinishEarly
+from range_downloader import RangeDownloader, file_digest
+from video_chunker import ChunkedRestore, Segment, probe_video
+from spatial_tiler import TiledRestore, tile_pixel_budget
+from gpu_scheduler import GPUScheduler, discover_devices
+from progress import ProgressTracker
+from process_runner import ProcessFailed, prune_logs, run_process_sync
+from cancellation import CancelRegistry, JobCancelled
+from result_cache import ResultCache, checkpoint_fingerprint, resolve_dimensions, select_model
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -20,39 +34,103 @@ INFERENCE_SCRIPT_3B = "/app/SeedVR/projects/inference_seedvr2_3b.py"
 INFERENCE_SCRIPT_7B = "/app/SeedVR/projects/inference_seedvr2_7b.py"
 GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "seedvr2-videos")
 GCS_KEY_JSON = os.getenv("GCS_KEY_JSON")  # JSON string of the service account key
+MODEL_SIZE = os.getenv("MODEL_SIZE", "3b")  # Model baked into the image
+WARM_WORKER = os.getenv("WARM_WORKER", "true").lower() == "true"
+WARM_WORKER_SP_SIZE = int(os.getenv("WARM_WORKER_SP_SIZE", "1"))
+PIPELINE_PREFETCH = int(os.getenv("PIPELINE_PREFETCH", "1"))  # Inputs downloaded ahead of the GPU
+PIPELINE_UPLOAD_BACKLOG = int(os.getenv("PIPELINE_UPLOAD_BACKLOG", "1"))  # Outputs waiting to upload
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "8"))
+DOWNLOAD_PIECE_MB = int(os.getenv("DOWNLOAD_PIECE_MB", "16"))
+RESULT_CACHE = os.getenv("RESULT_CACHE", "true").lower() == "true"
+RUNPOD_ENDPOINT_ID = os.getenv("RUNPOD_ENDPOINT_ID", "local")
+RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY")  # Needed to dispatch segment sub-jobs
+RUNPOD_API_BASE = os.getenv("RUNPOD_API_BASE", "https://api.runpod.ai/v2")
+CHUNK_MIN_SECONDS = float(os.getenv("CHUNK_MIN_SECONDS", "120"))  # Longer inputs are restored in segments; 0 disables
+CHUNK_SECONDS = float(os.getenv("CHUNK_SECONDS", "60"))
+CHUNK_OVERLAP_SECONDS = float(os.getenv("CHUNK_OVERLAP_SECONDS", "1"))
+CHUNK_MAX_PARALLEL = int(os.getenv("CHUNK_MAX_PARALLEL", "8"))
+SUB_JOB_POLL_SECONDS = float(os.getenv("SUB_JOB_POLL_SECONDS", "5"))
+CANCEL_POLL_SECONDS = float(os.getenv("CANCEL_POLL_SECONDS", "5"))  # How often running jobs are checked for cancellation
+TILING = os.getenv("TILING", "auto")  # auto: tile frames too large for the GPUs present; always; off
+TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", "64"))
+GPU_HEADROOM_GB = float(os.getenv("GPU_HEADROOM_GB", "2"))  # Kept free on every device
+INFERENCE_LOG_DIR = os.getenv("INFERENCE_LOG_DIR", "/tmp/seedvr2-logs")  # Full output of each inference
+INFERENCE_LOG_MB = int(os.getenv("INFERENCE_LOG_MB", "50"))  # Per log file before it rotates
+INFERENCE_LOGS_KEPT = int(os.getenv("INFERENCE_LOGS_KEPT", "100"))
+INFERENCE_TAIL_KB = int(os.getenv("INFERENCE_TAIL_KB", "64"))  # Output kept in memory for errors
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "0"))  # 0: no limit
+GPU_WAIT_SECONDS = float(os.getenv("GPU_WAIT_SECONDS", "0"))  # Longest wait for free GPUs before failing; 0: no limit
+
+# Hands concurrent jobs disjoint GPU sets sized from the memory table
+gpu_scheduler = GPUScheduler(discover_devices(), headroom_gb=GPU_HEADROOM_GB)
+# Set when a running job is cancelled; every long wait below watches its job's event
+cancellations = CancelRegistry()
+PIPELINE_INFER_WORKERS = int(os.getenv("PIPELINE_INFER_WORKERS", "0")) or max(len(gpu_scheduler.devices), 1)
 
 # Initialize GCS client
 gcs_client = None
+gcs_storage = None
 if GCS_KEY_JSON:
     try:
         key_data = json.loads(GCS_KEY_JSON)
         credentials = service_account.Credentials.from_service_account_info(key_data)
         gcs_client = storage.Client(credentials=credentials)
+        gcs_storage = GCSStorage(gcs_client, GCS_BUCKET_NAME)
         logger.info("GCS client initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize GCS client: {e}")
         gcs_client = None
 
-def download_video(url: str, output_path: str) -> str:
+# Finished results keyed by input hash, parameters and checkpoint
+result_cache = None
+if RESULT_CACHE and gcs_storage:
+    try:
+        result_cache = ResultCache(
+            gcs_storage,
+            checkpoints={MODEL_SIZE: checkpoint_fingerprint(MODEL_PATH)},
+            gpu_count=len(gpu_scheduler.devices)
+        )
+    except Exception as e:
+        logger.error(f"Result cache disabled: {e}")
+
+downloader = RangeDownloader(
+    connections=DOWNLOAD_CONNECTIONS,
+    piece_size=DOWNLOAD_PIECE_MB * 1024 * 1024,
+    timeout=300
+)
+
+# Keeps MODEL_SIZE loaded on WARM_WORKER_SP_SIZE GPUs between jobs
+inference_worker = None
+warm_devices = list(range(WARM_WORKER_SP_SIZE))
+if WARM_WORKER:
+    worker_env = os.environ.copy()
+    worker_env['CUDA_VISIBLE_DEVICES'] = ','.join(str(i) for i in range(WARM_WORKER_SP_SIZE))
+    inference_worker = InferenceWorkerClient(
+        DEFAULT_SOCKET_PATH,
+        worker_command(
+            DEFAULT_SOCKET_PATH,
+            script=INFERENCE_SCRIPT_7B if MODEL_SIZE == "7b" else INFERENCE_SCRIPT_3B,
+            model_size=MODEL_SIZE,
+            sp_size=WARM_WORKER_SP_SIZE
+        ),
+        env=worker_env,
+        model_size=MODEL_SIZE,
+        sp_size=WARM_WORKER_SP_SIZE
+    )
+
+# Per-tile budget; 0 uses the largest device's memory left beside any resident weights
+TILE_MEMORY_GB = float(os.getenv("TILE_MEMORY_GB", "0"))
+
+def tile_memory_gb() -> float:
+    return TILE_MEMORY_GB or gpu_scheduler.max_free_gb() or 80.0
+
+def download_video(url: str, output_path: str, sha256: Optional[str] = None) -> str:
     """Download video from URL"""
     logger.info(f"Downloading video from {url}")
     
     try:
-        response = requests.get(url, stream=True, timeout=300)
-        response.raise_for_status()
-        
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded = 0
-        
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0:
-                        progress = (downloaded / total_size) * 100
-                        if int(progress) % 10 == 0:
-                            logger.info(f"Download progress: {progress:.1f}%")
+        # Parallel ranged GETs, resumable, size/MD5-verified
+        downloader.download(url, output_path, sha256=sha256)
         
         logger.info(f"Downloaded video to {output_path}")
         return output_path
@@ -62,22 +140,14 @@ def download_video(url: str, output_path: str) -> str:
 
 def upload_to_gcs(file_path: str, destination_name: str) -> str:
     """Upload result to Google Cloud Storage"""
-    if not gcs_client:
+    if not gcs_storage:
         logger.error("GCS client not initialized")
         raise RuntimeError("GCS client not available")
     
     try:
-        bucket = gcs_client.bucket(GCS_BUCKET_NAME)
-        blob = bucket.blob(destination_name)
-        
-        # Upload with resumable upload for large files
+        # Resumable upload on the storage pool, bounded by the upload timeout
         logger.info(f"Uploading {file_path} to GCS: {destination_name}")
-        blob.upload_from_filename(file_path, timeout=600)
-        
-        # Make the blob publicly readable
-        blob.make_public()
-        
-        public_url = blob.public_url
+        public_url = gcs_storage.upload_file(file_path, destination_name, "video/mp4")
         logger.info(f"Uploaded to GCS: {public_url}")
         return public_url
     except Exception as e:
@@ -86,51 +156,67 @@ def upload_to_gcs(file_path: str, destination_name: str) -> str:
 
 def validate_dimensions(height: int, width: int) -> tuple[int, int]:
     """Ensure dimensions are multiples of 32"""
-    height = (height // 32) * 32
-    width = (width // 32) * 32
-    return height, width
-
-def determine_model_and_gpu_count(height: int, width: int) -> tuple[str, int, str]:
-    """Determine which model to use and GPU count based on resolution"""
-    pixels = height * width
-    
-    # For 720p and below, use 3B model with 1 GPU
-    if pixels <= 1280 * 720:
-        return "3b", 1, INFERENCE_SCRIPT_3B
-    # For 1080p, use 3B model with 4 GPUs or 7B with 2 GPUs
-    elif pixels <= 1920 * 1080:
-        # Check if we have multiple GPUs available
-        gpu_count = torch.cuda.device_count()
-        if gpu_count >= 4:
-            return "3b", 4, INFERENCE_SCRIPT_3B
-        else:
-            return "7b", min(gpu_count, 2), INFERENCE_SCRIPT_7B
-    # For 2K and above, use 7B model with 4 GPUs
-    else:
-        return "7b", 4, INFERENCE_SCRIPT_7B
+    return resolve_dimensions(height, width)
 
-def run_seedvr2(input_video: str, output_dir: str, params: Dict[str, Any]) -> str:
-    """Run SeedVR2 inference"""
-    logger.info(f"Running SeedVR2 with params: {params}")
-    
-    # Validate and adjust dimensions
-    res_h, res_w = validate_dimensions(
-        params.get('res_h', 720),
-        params.get('res_w', 1280)
-    )
-    
-    # Determine model and GPU configuration
-    model_size, sp_size, inference_script = determine_model_and_gpu_count(res_h, res_w)
-    logger.info(f"Using {model_size} model with {sp_size} GPU(s) for {res_w}x{res_h} resolution")
-    
-    # Prepare command
+def determine_model_and_gpu_count(height: int, width: int, frames: Optional[int] = None) -> tuple[str, Optional[int], str]:
+    """Model by resolution, GPU count from the memory table; None when no device set fits"""
+    # Same model rules the result cache keys on (result_cache.select_model)
+    model_size, _ = select_model(height, width, len(gpu_scheduler.devices))
+    # Counts the warm worker's resident weights exactly as allocation will
+    sp_size = gpu_scheduler.plan(model_size, height, width, frames, warm_devices_for(model_size, WARM_WORKER_SP_SIZE))
+    return model_size, sp_size, INFERENCE_SCRIPT_7B if model_size == "7b" else INFERENCE_SCRIPT_3B
+
+def count_frames(video_path: str) -> Optional[int]:
+    try:
+        info = probe_video(video_path)
+        return int(info["duration"] * info["fps"])
+    except Exception as e:
+        logger.warning(f"Could not probe frame count: {e}")
+        return None
+
+def warm_devices_for(model_size: str, sp_size: int) -> Optional[list]:
+    """The warm worker's devices when it serves this configuration"""
+    if inference_worker is not None and inference_worker.serves(model_size, sp_size):
+        return warm_devices
+    return None
+
+def run_warm(input_video: str, output_dir: str, params: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+    """Infer on the warm worker, keeping the scheduler's view of its resident weights current"""
+    try:
+        result = inference_worker.infer(input_video, output_dir, params, **kwargs)
+    except Exception:
+        if inference_worker.ping() is None:
+            # Killed (a cancel does that) or crashed: other jobs may use the whole devices
+            gpu_scheduler.unreserve(warm_devices)
+        raise
+    # infer() starts a worker that had gone, loading the weights again
+    gpu_scheduler.reserve(warm_devices, MODEL_SIZE)
+    return result
+
+def publish_progress(job_id: str, snapshot: Dict[str, Any]):
+    """Progress shown as the job's output while it runs"""
+    try:
+        runpod.serverless.progress_update({"id": job_id}, snapshot)
+    except Exception as e:
+        logger.debug(f"Progress update for {job_id} failed: {e}")
+
+def inference_reporter(job_id: str):
+    """Publish inference progress as the 5-95% middle of the whole job"""
+    def report(snapshot: Dict[str, Any]):
+        publish_progress(job_id, dict(snapshot, progress=round(0.05 + 0.9 * snapshot["progress"], 4)))
+    return report
+
+def run_inference_process(input_video: str, output_dir: str, res_h: int, res_w: int, seed: int,
+                          sp_size: int, inference_script: str, devices: list, on_progress=None,
+                          log_name: str = "local", cancel=None) -> str:
+    """Run one SeedVR2 inference in a fresh torchrun process on the given devices"""
     cmd = [
         "torchrun",
         f"--nproc-per-node={sp_size}",
         inference_script,
         "--video_path", input_video,
         "--output_dir", output_dir,
-        "--seed", str(params.get('seed', 42)),
+        "--seed", str(seed),
         "--res_h", str(res_h),
         "--res_w", str(res_w),
         "--sp_size", str(sp_size)
@@ -140,13 +226,29 @@ def run_seedvr2(input_video: str, output_dir: str, params: Dict[str, Any]) -> st
     logger.info(f"Running command: {' '.join(cmd)}")
     
     env = os.environ.copy()
-    env['CUDA_VISIBLE_DEVICES'] = ','.join(str(i) for i in range(sp_size))
-    
-    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    env['CUDA_VISIBLE_DEVICES'] = ','.join(str(i) for i in devices)
+    env['PYTHONUNBUFFERED'] = '1'
     
-    if result.returncode != 0:
-        logger.error(f"SeedVR2 stderr: {result.stderr}")
-        raise RuntimeError(f"SeedVR2 inference failed: {result.stderr}")
+    # Output streams to a rotating log and the progress parser; only the tail stays in memory
+    tracker = ProgressTracker(on_progress=on_progress)
+    prune_logs(INFERENCE_LOG_DIR, INFERENCE_LOGS_KEPT)
+    try:
+        result = run_process_sync(
+            cmd,
+            env=env,
+            log_path=os.path.join(INFERENCE_LOG_DIR, f"{log_name}.log"),
+            log_bytes=INFERENCE_LOG_MB * 1024 * 1024,
+            tail_bytes=INFERENCE_TAIL_KB * 1024,
+            timeout=INFERENCE_TIMEOUT_SECONDS or None,
+            cancel=cancel,
+            on_output=tracker.feed
+        )
+    except ProcessFailed as e:
+        if e.result.cancelled:
+            raise JobCancelled(f"Inference for {log_name} cancelled")
+        raise
+    tracker.finish()
+    logger.info(f"Inference process usage: {result.to_dict()}")
     
     # Find output video
     output_files = list(Path(output_dir).glob("*.mp4"))
@@ -162,7 +264,299 @@ def run_seedvr2(input_video: str, output_dir: str, params: Dict[str, Any]) -> st
     
     return str(output_files[0])
 
-def handler(job):
+def needs_tiling(sp_size: Optional[int]) -> bool:
+    """Whether the frame must be restored in tiles to fit the GPUs this worker has"""
+    if TILING == "always":
+        return True
+    return TILING == "auto" and sp_size is None
+
+def run_tiled(job_id: str, input_video: str, output_dir: str, res_h: int, res_w: int, seed: int,
+              frames: Optional[int], model_size: str, inference_script: str) -> str:
+    """Restore overlapping tiles on single GPUs granted by the scheduler, and blend them"""
+    report = inference_reporter(job_id)
+    cancel = cancellations.token(job_id)
+    fractions: Dict[int, float] = {}
+    
+    def tile_reporter(index: int):
+        # Blending takes the last few percent
+        def on_progress(snapshot: Dict[str, Any]):
+            fractions[index] = snapshot["progress"]
+            done = sum(fractions.values()) / max(len(tiled.tiles), 1)
+            report({"stage": "restoring", "progress": 0.95 * done, "tiles": len(tiled.tiles), "eta_seconds": None})
+        return on_progress
+    
+    def process(tile, tile_path: str, tile_dir: str, slot: int) -> str:
+        os.makedirs(tile_dir, exist_ok=True)
+        warm = warm_devices_for(model_size, 1)
+        with gpu_scheduler.allocate(f"{job_id}/tile{tile.index}", model_size, tile.height, tile.width,
+                                    frames=frames, sp_size=1, warm=warm, timeout=GPU_WAIT_SECONDS or None,
+                                    cancel=cancel) as allocation:
+            if allocation.devices == warm:
+                result = run_warm(tile_path, tile_dir, {"seed": seed, "res_h": tile.height, "res_w": tile.width},
+                                  on_progress=tile_reporter(tile.index), cancel=cancel)
+                return result["output_path"]
+            return run_inference_process(tile_path, tile_dir, tile.height, tile.width, seed, 1,
+                                         inference_script, allocation.devices, on_progress=tile_reporter(tile.index),
+                                         log_name=f"{job_id}-tile{tile.index}", cancel=cancel)
+    
+    tiled = TiledRestore(
+        process,
+        # Concurrent tile slots; the scheduler picks the actual devices
+        devices=range(max(len(gpu_scheduler.devices), 1)),
+        max_pixels=tile_pixel_budget(model_size, tile_memory_gb(), frames),
+        overlap=TILE_OVERLAP
+    )
+    return tiled.run(input_video, output_dir, os.path.join(output_dir, "tiled_output.mp4"), res_h, res_w)
+
+def run_seedvr2(input_video: str, output_dir: str, params: Dict[str, Any]) -> str:
+    """Run SeedVR2 inference"""
+    logger.info(f"Running SeedVR2 with params: {params}")
+    job_id = params.get("_job_id", "local")
+    
+    # Validate and adjust dimensions
+    res_h, res_w = validate_dimensions(
+        params.get('res_h', 720),
+        params.get('res_w', 1280)
+    )
+    seed = params.get('seed', 42)
+    frames = count_frames(input_video)
+    
+    # Determine model and GPU configuration
+    model_size, sp_size, inference_script = determine_model_and_gpu_count(res_h, res_w, frames)
+    
+    if needs_tiling(sp_size):
+        logger.info(f"Using {model_size} model in spatial tiles for {res_w}x{res_h} resolution")
+        return run_tiled(job_id, input_video, output_dir, res_h, res_w, seed, frames, model_size, inference_script)
+    if sp_size is None:
+        raise RuntimeError(f"{res_w}x{res_h} does not fit on this worker's GPUs and TILING is off")
+    
+    # Waits while other jobs hold the devices this one needs
+    report = inference_reporter(job_id)
+    report({"stage": "waiting_for_gpu", "progress": 0.0})
+    cancel = cancellations.token(job_id)
+    warm = warm_devices_for(model_size, sp_size)
+    with gpu_scheduler.allocate(job_id, model_size, res_h, res_w, frames=frames, sp_size=sp_size, warm=warm,
+                                timeout=GPU_WAIT_SECONDS or None, cancel=cancel) as allocation:
+        logger.info(f"Using {model_size} model on GPUs {allocation.devices} for {res_w}x{res_h} resolution")
+        
+        # Reuse the already-loaded model when the warm worker's devices were granted
+        if allocation.devices == warm:
+            result = run_warm(input_video, output_dir, {
+                "seed": seed,
+                "res_h": res_h,
+                "res_w": res_w
+            }, on_progress=report, cancel=cancel)
+            logger.info(f"Warm worker finished in {result['infer_seconds']}s")
+            return result["output_path"]
+        
+        return run_inference_process(input_video, output_dir, res_h, res_w, seed, sp_size,
+                                     inference_script, allocation.devices, on_progress=report, log_name=job_id,
+                                     cancel=cancel)
+
+def cached_output(job_input: Dict[str, Any], input_sha256: str) -> Optional[Dict[str, Any]]:
+    """Look the job up in the result cache, remembering its key for upload_stage"""
+    key = result_cache.key_for(input_sha256, job_input)
+    if key is None:
+        return None
+    job_input["_cache_key"] = key
+    try:
+        output = result_cache.lookup(key)
+    except Exception as e:
+        logger.warning(f"Result cache lookup failed: {e}")
+        return None
+    if output is not None:
+        logger.info(f"Result cache hit {key[:12]}, skipping inference")
+        return dict(output, cached=True)
+    return None
+
+def download_stage(job_input: Dict[str, Any], workdir: str) -> Any:
+    """Pipeline stage 1: fetch the input video"""
+    publish_progress(job_input.get("_job_id", "local"), {"stage": "downloading", "progress": 0.0})
+    input_path = os.path.join(workdir, "input.mp4")
+    download_video(job_input["video_url"], input_path, job_input.get("input_sha256"))
+    
+    # Callers that did not send the input hash are checked once the bytes are here;
+    # segments are transient and never cached
+    if result_cache is not None and not job_input.get("input_sha256") and "segment" not in job_input:
+        output = cached_output(job_input, file_digest(input_path, "sha256"))
+        if output is not None:
+            return FinishEarly(output)
+    return input_path
+
+def inference_stage(job_input: Dict[str, Any], input_path: str, workdir: str) -> str:
+    """Pipeline stage 2: run SeedVR2 on the GPU"""
+    output_dir = os.path.join(workdir, "output")
+    os.makedirs(output_dir, exist_ok=True)
+    return run_seedvr2(input_path, output_dir, job_input)
+
+def upload_stage(job_input: Dict[str, Any], output_path: str, workdir: str) -> Dict[str, Any]:
+    """Pipeline stage 3: publish the result and build the job output"""
+    publish_progress(job_input.get("_job_id", "local"), {"stage": "uploading", "progress": 0.95})
+    timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    unique_id = str(uuid.uuid4())[:8]
+    output_filename = f"output_{timestamp}_{unique_id}.mp4"
+    
+    object_name = f"outputs/{output_filename}"
+    if "segment" in job_input:
+        # Only the parent job reads this; it deletes it once the video is stitched
+        object_name = f"{segment_prefix(job_input['parent_job'])}restored_{job_input['segment']:04d}.mp4"
+    result_url = upload_to_gcs(output_path, object_name)
+    
+    output = {
+        "status": "success",
+        "result_url": result_url,
+        "message": "Video restoration completed successfully",
+        "details": {
+            "input_url": job_input["video_url"],
+            "output_resolution": f"{job_input.get('res_w', 1280)}x{job_input.get('res_h', 720)}",
+            "seed": job_input.get('seed', 42)
+        }
+    }
+    
+    if job_input.get("_cache_key"):
+        try:
+            result_cache.record(job_input["_cache_key"], output, object_name)
+        except Exception as e:
+            logger.warning(f"Failed to record result cache entry: {e}")
+    
+    return output
+
+def should_chunk(job_input: Dict[str, Any]) -> bool:
+    """Long inputs are split unless this job already is a segment"""
+    if CHUNK_MIN_SECONDS <= 0 or not RUNPOD_API_KEY or not gcs_storage or "segment" in job_input:
+        return False
+    try:
+        # Reads only the container header over HTTP
+        duration = probe_video(job_input["video_url"])["duration"]
+    except Exception as e:
+        logger.warning(f"Could not probe input duration, not chunking: {e}")
+        return False
+    return duration >= CHUNK_MIN_SECONDS
+
+runpod_api = requests.Session()
+runpod_api.headers["Authorization"] = f"Bearer {RUNPOD_API_KEY}"
+
+def submit_sub_job(payload: Dict[str, Any]) -> str:
+    response = runpod_api.post(f"{RUNPOD_API_BASE}/{RUNPOD_ENDPOINT_ID}/run", json={"input": payload}, timeout=30)
+    response.raise_for_status()
+    return response.json()["id"]
+
+def endpoint_job_status(job_id: str) -> Dict[str, Any]:
+    response = runpod_api.get(f"{RUNPOD_API_BASE}/{RUNPOD_ENDPOINT_ID}/status/{job_id}", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+def cancel_endpoint_job(job_id: str):
+    response = runpod_api.post(f"{RUNPOD_API_BASE}/{RUNPOD_ENDPOINT_ID}/cancel/{job_id}", timeout=30)
+    response.raise_for_status()
+
+async def watch_cancellations():
+    """Poll RunPod for cancelled jobs among those running here and signal them"""
+    while True:
+        await asyncio.sleep(CANCEL_POLL_SECONDS)
+        for job_id in cancellations.active():
+            try:
+                status = await asyncio.to_thread(endpoint_job_status, job_id)
+            except Exception as e:
+                logger.debug(f"Cancellation check for {job_id} failed: {e}")
+                continue
+            if status.get("status") == "CANCELLED" and cancellations.cancel(job_id):
+                logger.info(f"Job {job_id} was cancelled, stopping it")
+
+async def run_sub_job(payload: Dict[str, Any], report) -> Dict[str, Any]:
+    """Queue a job on this endpoint, wherever a worker is free, and wait for its output"""
+    sub_job_id = await asyncio.to_thread(submit_sub_job, payload)
+    try:
+        return await wait_for_sub_job(sub_job_id, payload["parent_job"], report)
+    except (JobCancelled, asyncio.CancelledError):
+        # The parent is gone; free the worker restoring this segment
+        try:
+            await asyncio.shield(asyncio.to_thread(cancel_endpoint_job, sub_job_id))
+        except Exception as e:
+            logger.warning(f"Failed to cancel segment job {sub_job_id}: {e}")
+        raise
+
+async def wait_for_sub_job(sub_job_id: str, parent_job: str, report) -> Dict[str, Any]:
+    while True:
+        await asyncio.sleep(SUB_JOB_POLL_SECONDS)
+        cancellations.check(parent_job)
+        status = await asyncio.to_thread(endpoint_job_status, sub_job_id)
+        state = status.get("status")
+        output = status.get("output")
+        if state == "COMPLETED":
+            if not isinstance(output, dict) or output.get("status") != "success":
+                raise RuntimeError(f"Segment job {sub_job_id} failed: {(output or {}).get('error')}")
+            return output
+        if state in ("FAILED", "CANCELLED", "TIMED_OUT"):
+            raise RuntimeError(f"Segment job {sub_job_id} {state.lower()}: {status.get('error')}")
+        if isinstance(output, dict) and output.get("progress") is not None:
+            report(output["progress"])
+
+def segment_prefix(parent_job: str) -> str:
+    """Bucket prefix holding a parent job's segment inputs and restored segments"""
+    return f"segments/{parent_job}/"
+
+async def restore_in_segments(job: Dict[str, Any], job_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Restore a long video as overlapping segments spread over the endpoint's workers"""
+    job_id = job.get("id", "local")
+    cancellations.register(job_id)
+    workdir = tempfile.mkdtemp(prefix=f"chunked_{job_id}_")
+    segment_objects = []
+    
+    async def process(segment: Segment, path: str, report) -> str:
+        name = f"{segment_prefix(job_id)}segment_{segment.index:04d}.mp4"
+        url = await asyncio.to_thread(upload_to_gcs, path, name)
+        # The sub-job uploads its restored segment next to the input
+        segment_objects.extend([name, f"{segment_prefix(job_id)}restored_{segment.index:04d}.mp4"])
+        payload = {key: value for key, value in job_input.items() if not key.startswith("_")}
+        payload.update(video_url=url, input_sha256=None, segment=segment.index, parent_job=job_id)
+        output = await run_sub_job(payload, report)
+        restored_path = os.path.join(workdir, f"restored_{segment.index:04d}.mp4")
+        await asyncio.to_thread(download_video, output["result_url"], restored_path)
+        return restored_path
+    
+    chunked = ChunkedRestore(
+        process,
+        segment_seconds=CHUNK_SECONDS,
+        overlap_seconds=CHUNK_OVERLAP_SECONDS,
+        max_parallel=CHUNK_MAX_PARALLEL,
+        on_progress=lambda summary: publish_progress(job_id, summary)
+    )
+    try:
+        input_path = await asyncio.to_thread(
+            download_video, job_input["video_url"], os.path.join(workdir, "input.mp4"), job_input.get("input_sha256")
+        )
+        output_path = await chunked.run(input_path, workdir, os.path.join(workdir, "output.mp4"))
+        output = await asyncio.to_thread(upload_stage, job_input, output_path, workdir)
+        output["details"]["segments"] = len(chunked.segments)
+        return output
+    finally:
+        cancellations.discard(job_id)
+        shutil.rmtree(workdir, ignore_errors=True)
+        for name in dict.fromkeys(segment_objects):
+            try:
+                await asyncio.to_thread(gcs_storage.delete, name)
+            except Exception as e:
+                # A sub-job that failed or was cancelled may not have uploaded anything
+                if type(e).__name__ != "NotFound":
+                    logger.warning(f"Failed to delete segment {name}: {e}")
+
+# Parent jobs waiting on their segments; they hold no pipeline slot
+active_chunked_jobs = 0
+
+# Downloads the next job and uploads the previous one while the GPU is busy
+pipeline = JobPipeline(
+    download_stage,
+    inference_stage,
+    upload_stage,
+    prefetch=PIPELINE_PREFETCH,
+    upload_backlog=PIPELINE_UPLOAD_BACKLOG,
+    infer_workers=PIPELINE_INFER_WORKERS,
+    cancellations=cancellations
+)
+cancel_watcher: Optional[asyncio.Task] = None
+
+async def handler(job):
     """RunPod handler function"""
     logger.info(f"Starting job: {job}")
     
@@ -182,39 +576,32 @@ def handler(job):
         if not video_url:
             raise ValueError("video_url is required")
         
-        # Create temporary directories
-        with tempfile.TemporaryDirectory() as temp_dir:
-            input_path = os.path.join(temp_dir, "input.mp4")
-            output_dir = os.path.join(temp_dir, "output")
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # Download input video
-            download_video(video_url, input_path)
-            
-            # Run SeedVR2
-            output_path = run_seedvr2(input_path, output_dir, job_input)
-            
-            # Generate output filename
-            import uuid
-            from datetime import datetime
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            unique_id = str(uuid.uuid4())[:8]
-            output_filename = f"output_{timestamp}_{unique_id}.mp4"
-            
-            # Upload result to GCS
-            result_url = upload_to_gcs(output_path, f"outputs/{output_filename}")
-            
-            return {
-                "status": "success",
-                "result_url": result_url,
-                "message": "Video restoration completed successfully",
-                "details": {
-                    "input_url": video_url,
-                    "output_resolution": f"{job_input.get('res_w', 1280)}x{job_input.get('res_h', 720)}",
-                    "seed": job_input.get('seed', 42)
-                }
-            }
-            
+        # Identical input, parameters and weights: answer without downloading
+        if result_cache is not None and job_input.get("input_sha256"):
+            output = await asyncio.to_thread(cached_output, job_input, job_input["input_sha256"])
+            if output is not None:
+                return output
+        
+        job_input["_job_id"] = job.get("id", "local")
+        global cancel_watcher
+        if cancel_watcher is None and RUNPOD_API_KEY:
+            cancel_watcher = asyncio.create_task(watch_cancellations())
+        if await asyncio.to_thread(should_chunk, job_input):
+            global active_chunked_jobs
+            active_chunked_jobs += 1
+            try:
+                return await restore_in_segments(job, job_input)
+            finally:
+                active_chunked_jobs -= 1
+        
+        return await pipeline.submit(job_input["_job_id"], job_input)
+    
+    except JobCancelled as e:
+        logger.info(f"Job cancelled: {str(e)}")
+        return {
+            "status": "cancelled",
+            "error": str(e)
+        }
     except Exception as e:
         logger.error(f"Job failed: {str(e)}")
         return {
@@ -223,8 +610,30 @@ def handler(job):
             "error_type": type(e).__name__
         }
 
+def concurrency_modifier(current_concurrency: int) -> int:
+    """Take enough jobs at once to keep every pipeline stage busy"""
+    # Waiting parents must not starve their own segments of slots
+    return pipeline.capacity + active_chunked_jobs
+
 # RunPod serverless worker
 if __name__ == "__main__":
+    # Load the model during worker cold start rather than on the first job
+    if inference_worker is not None:
+        try:
+            inference_worker.start()
+            # Other jobs only get what the resident weights leave on these devices
+            gpu_scheduler.reserve(warm_devices, MODEL_SIZE)
+        except Exception as e:
+            logger.error(f"Warm inference worker unavailable, falling back to torchrun per job: {e}")
+            inference_worker = None
+    
+    if result_cache is not None:
+        try:
+            result_cache.publish_profile(RUNPOD_ENDPOINT_ID)
+        except Exception as e:
+            logger.error(f"Failed to publish result cache profile: {e}")
+    
     runpod.serverless.start({
-        "handler": handler
+        "handler": handler,
+        "concurrency_modifier": concurrency_modifier
     })
\ No newline at end of file
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Persistent SeedVR2 inference worker
+Loads the model once and serves jobs over a Unix socket, so each job skips
+the torch import and checkpoint load that a fresh torchrun pays for
+
+Protocol: one JSON object per line in each direction
+  {"op": "ping"}                                          -> {"status": "ok", ...worker info}
+  {"op": "infer", "video_path", "output_dir", "params"}   -> {"status": "ok", "output_path", "infer_seconds"}
+  {"op": "shutdown"}                                      -> {"status": "ok"}
+Errors come back as {"status": "error", "error": "..."}
+
+Usage:
+  python inference_worker.py --backend seedvr2 --script /app/SeedVR/projects/inference_seedvr2_3b.py
+  python inference_worker.py --backend seedvr2 --script ... --ckpt-path /workspace/ckpts/SeedVR2-7B
+  torchrun --nproc-per-node=4 inference_worker.py --backend seedvr2 --script ... --sp-size 4
+  python inference_worker.py --backend fake --load-seconds 5
+  python inference_worker.py --backend fake --once --video in.mp4 --output-dir out/   (one job, then exit)
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from progress import ProgressTracker, capture_progress
+from process_runner import KILL_GRACE_SECONDS, kill_group
+from cancellation import JobCancelled
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET_PATH = os.getenv("INFERENCE_WORKER_SOCKET", "/tmp/seedvr2-worker.sock")
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+def find_output_video(output_dir: str) -> str:
+    """First video written to output_dir"""
+    for ext in VIDEO_EXTENSIONS:
+        output_files = sorted(Path(output_dir).glob(f"*{ext}"))
+        if output_files:
+            return str(output_files[0])
+    raise RuntimeError("No output video found")
+
+class InferenceBackend:
+    """Model held by the worker; load() runs once, infer() once per job"""
+
+    name = "base"
+
+    def load(self):
+        raise NotImplementedError
+
+    def infer(self, video_path: str, output_dir: str, params: Dict[str, Any]) -> str:
+        """Restore video_path into output_dir and return the output file"""
+        raise NotImplementedError
+
+    def share(self, request: Optional[Dict[str, Any]]):
+        """Hand a request (None to stop) to the other ranks of a multi-GPU worker"""
+
+    def follow(self):
+        """Loop run by non-zero ranks: receive requests from rank 0 and infer them"""
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+class FakeBackend(InferenceBackend):
+    """CPU-only stand-in with the cost profile of a real model
+
+    load() sleeps load_seconds and touches checkpoint_mb of memory, infer()
+    sleeps infer_seconds, drawing a tqdm-style bar as the real scripts do,
+    and copies the input to the output directory.
+    """
+
+    name = "fake"
+
+    def __init__(self, load_seconds: float = 2.0, infer_seconds: float = 0.5, checkpoint_mb: int = 256):
+        self.load_seconds = load_seconds
+        self.infer_seconds = infer_seconds
+        self.checkpoint_mb = checkpoint_mb
+        self.weights: Optional[bytearray] = None
+
+    def load(self):
+        time.sleep(self.load_seconds)
+        self.weights = bytearray(self.checkpoint_mb * 1024 * 1024)
+        for i in range(0, len(self.weights), 4096):
+            self.weights[i] = 1
+
+    def infer(self, video_path: str, output_dir: str, params: Dict[str, Any]) -> str:
+        steps = 10
+        for step in range(1, steps + 1):
+            time.sleep(self.infer_seconds / steps)
+            sys.stderr.write(f"\r{step * 100 // steps}%|{'#' * step:<{steps}}| {step}/{steps}")
+            sys.stderr.flush()
+        sys.stderr.write("\n")
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        output_path = Path(output_dir) / f"restored_{Path(video_path).name}"
+        shutil.copyfile(video_path, output_path)
+        return str(output_path)
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model_size": "fake", "sp_size": 1}
+
+class SeedVR2Backend(InferenceBackend):
+    """SeedVR2 loaded in-process from its inference script
+
+    The script's configure_runner() builds the model once; generation_loop()
+    is then called per job. Under torchrun (sp_size > 1) every rank holds a
+    shard: rank 0 receives jobs and broadcasts them so all ranks run the same
+    generation_loop call.
+    """
+
+    name = "seedvr2"
+
+    def __init__(self, script: str, model_size: str, sp_size: int = 1, ckpt_path: Optional[str] = None):
+        self.script = Path(script)
+        self.model_size = model_size
+        self.sp_size = sp_size
+        self.ckpt_path = ckpt_path
+        self.rank = int(os.getenv("RANK", "0"))
+        self.world_size = int(os.getenv("WORLD_SIZE", "1"))
+        self.module = None
+        self.runner = None
+
+    def load(self):
+        import inspect
+        import importlib.util
+        import torch  # noqa: F401 - imported once for the life of the worker
+
+        # The SeedVR scripts resolve configs and checkpoints relative to the repo root
+        repo_root = self.script.parent.parent
+        os.chdir(repo_root)
+        sys.path.insert(0, str(repo_root))
+
+        # Scripts that take --ckpt_path on the command line see the same argv a cold run gets
+        sys.argv = [str(self.script)] + (["--ckpt_path", self.ckpt_path] if self.ckpt_path else [])
+
+        spec = importlib.util.spec_from_file_location("seedvr2_inference", self.script)
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+        kwargs = {}
+        if self.ckpt_path and "ckpt_path" in inspect.signature(self.module.configure_runner).parameters:
+            kwargs["ckpt_path"] = self.ckpt_path
+        self.runner = self.module.configure_runner(self.sp_size, **kwargs)
+
+    def infer(self, video_path: str, output_dir: str, params: Dict[str, Any]) -> str:
+        import torch
+
+        # generation_loop restores every video in a directory; give it one
+        input_dir = Path(output_dir).parent / f"{Path(output_dir).name}_input"
+        if self.rank == 0:
+            input_dir.mkdir(parents=True, exist_ok=True)
+            link = input_dir / Path(video_path).name
+            if not link.exists():
+                os.symlink(os.path.abspath(video_path), link)
+            Path(output_dir).mkdir(parents=True, exist_ok=True)
+        if self.world_size > 1:
+            torch.distributed.barrier()
+
+        try:
+            self.module.generation_loop(
+                self.runner,
+                video_path=str(input_dir),
+                output_dir=output_dir,
+                seed=int(params.get("seed", 42)),
+                res_h=int(params.get("res_h", 720)),
+                res_w=int(params.get("res_w", 1280)),
+                sp_size=self.sp_size
+            )
+        finally:
+            torch.cuda.empty_cache()
+            if self.rank == 0:
+                shutil.rmtree(input_dir, ignore_errors=True)
+
+        return find_output_video(output_dir) if self.rank == 0 else ""
+
+    def share(self, request: Optional[Dict[str, Any]]):
+        if self.world_size > 1:
+            import torch.distributed as dist
+            dist.broadcast_object_list([request], src=0)
+
+    def follow(self):
+        import torch.distributed as dist
+        while True:
+            box = [None]
+            dist.broadcast_object_list(box, src=0)
+            request = box[0]
+            if request is None:
+                return
+            try:
+                self.infer(request["video_path"], request["output_dir"], request.get("params", {}))
+            except Exception as e:
+                logger.error(f"Rank {self.rank} inference failed: {e}")
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": self.name, "model_size": self.model_size, "sp_size": self.sp_size,
+                "ckpt_path": self.ckpt_path}
+
+def create_backend(args) -> InferenceBackend:
+    if args.backend == "fake":
+        return FakeBackend(args.load_seconds, args.infer_seconds, args.checkpoint_mb)
+    if not args.script:
+        raise ValueError("--script is required for the seedvr2 backend")
+    return SeedVR2Backend(args.script, args.model_size, args.sp_size, args.ckpt_path)
+
+def handle_request(backend: InferenceBackend, request: Dict[str, Any], info: Dict[str, Any]) -> Dict[str, Any]:
+    op = request.get("op")
+    if op == "ping":
+        return dict(info, status="ok")
+    if op == "infer":
+        start = time.monotonic()
+        backend.share(request)
+        output_path = backend.infer(request["video_path"], request["output_dir"], request.get("params", {}))
+        return {
+            "status": "ok",
+            "output_path": output_path,
+            "infer_seconds": round(time.monotonic() - start, 3)
+        }
+    raise ValueError(f"Unknown op: {op}")
+
+def serve(backend: InferenceBackend, socket_path: str):
+    """Load the model once, then answer requests until told to shut down"""
+    start = time.monotonic()
+    backend.load()
+    info = dict(backend.info(), pid=os.getpid(), load_seconds=round(time.monotonic() - start, 3), jobs=0)
+    logger.info(f"Model loaded in {info['load_seconds']}s: {backend.info()}")
+
+    if int(os.getenv("RANK", "0")) != 0:
+        backend.follow()
+        return
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen(8)
+    logger.info(f"Inference worker listening on {socket_path}")
+
+    try:
+        running = True
+        while running:
+            conn, _ = server.accept()
+            with conn, conn.makefile("rwb") as stream:
+                for line in stream:
+                    request = json.loads(line)
+                    if request.get("op") == "shutdown":
+                        response = {"status": "ok"}
+                        running = False
+                    else:
+                        try:
+                            if request.get("op") == "infer" and request.get("progress"):
+                                # Stream what the model prints as progress lines ahead of the reply
+                                def emit(snapshot, stream=stream):
+                                    stream.write(json.dumps({"progress": snapshot}).encode() + b"\n")
+                                    stream.flush()
+                                with capture_progress(ProgressTracker(on_progress=emit)):
+                                    response = handle_request(backend, request, info)
+                            else:
+                                response = handle_request(backend, request, info)
+                            if request.get("op") == "infer":
+                                info["jobs"] += 1
+                        except Exception as e:
+                            logger.error(f"Inference request failed: {e}")
+                            response = {"status": "error", "error": str(e)}
+                    stream.write(json.dumps(response).encode() + b"\n")
+                    stream.flush()
+                    if not running:
+                        break
+    finally:
+        backend.share(None)
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def worker_command(socket_path: str, backend: str = "seedvr2", script: Optional[str] = None,
+                   model_size: str = "3b", sp_size: int = 1, extra_args: Optional[List[str]] = None,
+                   python: str = sys.executable, prefix: Optional[List[str]] = None,
+                   ckpt_path: Optional[str] = None) -> List[str]:
+    """Command line that starts a worker (under torchrun when it spans GPUs)
+
+    prefix wraps the launcher, e.g. ["conda", "run", "--no-capture-output", "-n", "seedvr"].
+    """
+    args = [os.path.abspath(__file__), "--socket", socket_path, "--backend", backend,
+            "--model-size", model_size, "--sp-size", str(sp_size)]
+    if script:
+        args += ["--script", script]
+    if ckpt_path:
+        args += ["--ckpt-path", ckpt_path]
+    args += extra_args or []
+    launcher = ["torchrun", f"--nproc-per-node={sp_size}"] if sp_size > 1 else [python]
+    return (prefix or []) + launcher + args
+
+class InferenceWorkerClient:
+    """Start and talk to a warm worker; one job at a time"""
+
+    def __init__(self, socket_path: str, command: List[str], env: Optional[Dict[str, str]] = None,
+                 model_size: Optional[str] = None, sp_size: int = 1, start_timeout: float = 900.0):
+        self.socket_path = socket_path
+        self.command = command
+        self.env = env
+        self.model_size = model_size
+        self.sp_size = sp_size
+        self.start_timeout = start_timeout
+        self.process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    def serves(self, model_size: str, sp_size: int) -> bool:
+        """Whether this worker was started for the given model configuration"""
+        return model_size == self.model_size and sp_size == self.sp_size
+
+    def _call(self, request: Dict[str, Any], timeout: Optional[float] = None,
+              on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(self.socket_path)
+            with sock.makefile("rwb") as stream:
+                stream.write(json.dumps(request).encode() + b"\n")
+                stream.flush()
+                while True:
+                    line = stream.readline()
+                    if not line:
+                        raise RuntimeError("Inference worker closed the connection")
+                    message = json.loads(line)
+                    if "progress" in message and "status" not in message:
+                        if on_progress is not None:
+                            on_progress(message["progress"])
+                        continue
+                    return message
+
+    def ping(self) -> Optional[Dict[str, Any]]:
+        try:
+            return self._call({"op": "ping"}, timeout=5.0)
+        except (OSError, RuntimeError, ValueError):
+            return None
+
+    def start(self) -> Dict[str, Any]:
+        """Spawn the worker unless one is already answering, and wait for the model to load"""
+        with self._start_lock:
+            info = self.ping()
+            if info is not None:
+                return info
+
+            if self.process is None or self.process.poll() is not None:
+                logger.info(f"Starting inference worker: {' '.join(self.command)}")
+                # Own process group, so an abort reaches every torchrun rank
+                self.process = subprocess.Popen(self.command, env=self.env, start_new_session=True)
+
+            deadline = time.monotonic() + self.start_timeout
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"Inference worker exited during startup with code {self.process.returncode}")
+                info = self.ping()
+                if info is not None:
+                    return info
+                time.sleep(0.1)
+            raise TimeoutError(f"Inference worker did not start within {self.start_timeout}s")
+
+    def infer(self, video_path: str, output_dir: str, params: Dict[str, Any],
+              timeout: Optional[float] = None,
+              on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+              cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Run one job; on_progress receives parsed progress snapshots while it runs
+
+        A job cannot be interrupted inside the worker, so setting cancel
+        kills the worker to free its GPUs and raises JobCancelled; the next
+        job loads the model again.
+        """
+        with self._lock:
+            self.start()
+            finished = threading.Event()
+            aborter = threading.Thread(target=self._abort_on, args=(cancel, finished), daemon=True,
+                                       name="worker-abort")
+            if cancel is not None:
+                aborter.start()
+            try:
+                response = self._call({
+                    "op": "infer",
+                    "video_path": os.path.abspath(video_path),
+                    "output_dir": os.path.abspath(output_dir),
+                    "params": params,
+                    "progress": on_progress is not None
+                }, timeout=timeout, on_progress=on_progress)
+            except (OSError, RuntimeError, ValueError):
+                if cancel is not None and cancel.is_set():
+                    # The worker is being killed; let that finish before the next job starts one
+                    aborter.join()
+                    raise JobCancelled("Inference cancelled; the warm worker was stopped")
+                raise
+            finally:
+                finished.set()
+        if response.get("status") != "ok":
+            raise RuntimeError(f"SeedVR2 inference failed: {response.get('error')}")
+        return response
+
+    def _abort_on(self, cancel: threading.Event, finished: threading.Event):
+        while not finished.wait(0.2):
+            if cancel.is_set():
+                self.kill()
+                return
+
+    def kill(self):
+        """Stop the worker process group at once, whatever it is doing"""
+        process = self.process
+        if process is None:
+            logger.warning("Inference worker was not started by this client and cannot be stopped")
+            return
+        logger.warning(f"Killing inference worker (pid {process.pid})")
+        kill_group(process)
+        try:
+            process.wait(KILL_GRACE_SECONDS + 5)
+        except subprocess.TimeoutExpired:
+            logger.error(f"Inference worker (pid {process.pid}) did not exit")
+        if self.process is process:
+            self.process = None
+
+    def stop(self, timeout: float = 30.0):
+        try:
+            self._call({"op": "shutdown"}, timeout=5.0)
+        except (OSError, RuntimeError, ValueError):
+            pass
+        if self.process is not None:
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent SeedVR2 inference worker")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--backend", choices=["seedvr2", "fake"], default="seedvr2")
+    parser.add_argument("--script", help="SeedVR2 inference script (seedvr2 backend)")
+    parser.add_argument("--model-size", default=os.getenv("MODEL_SIZE", "3b"))
+    parser.add_argument("--sp-size", type=int, default=1)
+    parser.add_argument("--ckpt-path", help="Checkpoint directory passed to the script as --ckpt_path")
+    parser.add_argument("--load-seconds", type=float, default=2.0, help="Fake backend model load time")
+    parser.add_argument("--infer-seconds", type=float, default=0.5, help="Fake backend per-job time")
+    parser.add_argument("--checkpoint-mb", type=int, default=256, help="Fake backend weight size")
+    parser.add_argument("--once", action="store_true", help="Load, run one job and exit (cold path)")
+    parser.add_argument("--video", help="Input video for --once")
+    parser.add_argument("--output-dir", help="Output directory for --once")
+    args = parser.parse_args()
+
+    backend = create_backend(args)
+    if args.once:
+        backend.load()
+        print(backend.infer(args.video, args.output_dir, {}))
+        return
+    serve(backend, args.socket)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Three-stage job pipeline for the RunPod worker: download -> inference -> upload
+The next job's input downloads and the previous job's output uploads while
+the GPU works on the current job
+"""
+
+import time
+import shutil
+import asyncio
+import logging
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+from cancellation import CancelRegistry, JobCancelled
+
+logger = logging.getLogger(__name__)
+
+class FinishEarly:
+    """Returned by a stage to complete the job with result, skipping later stages"""
+
+    def __init__(self, result: Any):
+        self.result = result
+
+class PipelineItem:
+    """One job moving through the pipeline"""
+
+    def __init__(self, job_id: str, payload: Dict[str, Any], future: asyncio.Future):
+        self.job_id = job_id
+        self.payload = payload
+        self.future = future
+        self.workdir: Optional[str] = None
+        self.value: Any = None
+        self.timings: Dict[str, float] = {}
+
+class JobPipeline:
+    """Run download, inference and upload of consecutive jobs concurrently
+
+    Each stage is a blocking function run in a worker thread:
+      download(payload, workdir) -> input
+      infer(payload, input, workdir) -> output
+      upload(payload, output, workdir) -> result returned to the caller
+    A download that returns FinishEarly(result) completes the job right away,
+    e.g. when a cached result makes inference unnecessary.
+    Stages are joined by bounded queues. When inference falls behind, at most
+    prefetch downloaded inputs wait for it and the download workers stop
+    taking new jobs; when uploads fall behind, inference blocks after
+    upload_backlog finished outputs. Inference runs infer_workers jobs at a
+    time; with more than one, infer is expected to claim its own GPUs.
+    A job cancelled in cancellations is dropped at the next stage boundary,
+    so whatever it was queued behind moves up immediately; stages get the
+    same event to stop mid-way.
+    """
+
+    def __init__(
+        self,
+        download: Callable[[Dict[str, Any], str], Any],
+        infer: Callable[[Dict[str, Any], Any, str], Any],
+        upload: Callable[[Dict[str, Any], Any, str], Any],
+        prefetch: int = 1,
+        upload_backlog: int = 1,
+        download_workers: int = 1,
+        upload_workers: int = 1,
+        infer_workers: int = 1,
+        cancellations: Optional[CancelRegistry] = None
+    ):
+        self.download = download
+        self.infer = infer
+        self.upload = upload
+        self.prefetch = prefetch
+        self.upload_backlog = upload_backlog
+        self.download_workers = download_workers
+        self.upload_workers = upload_workers
+        self.infer_workers = infer_workers
+        self.cancellations = cancellations or CancelRegistry()
+        self._intake: Optional[asyncio.Queue] = None
+        self._ready: Optional[asyncio.Queue] = None
+        self._done: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.busy_seconds = {"download": 0.0, "infer": 0.0, "upload": 0.0}
+
+    @property
+    def capacity(self) -> int:
+        """Jobs the pipeline can hold at once; more only queue up at intake"""
+        return self.download_workers + self.prefetch + self.infer_workers + self.upload_backlog + self.upload_workers
+
+    def start(self):
+        if self._tasks:
+            return
+        self._intake = asyncio.Queue()
+        self._ready = asyncio.Queue(maxsize=self.prefetch)
+        self._done = asyncio.Queue(maxsize=self.upload_backlog)
+        self._tasks = (
+            [asyncio.create_task(self._download_loop()) for _ in range(self.download_workers)]
+            + [asyncio.create_task(self._infer_loop()) for _ in range(self.infer_workers)]
+            + [asyncio.create_task(self._upload_loop()) for _ in range(self.upload_workers)]
+        )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job_id: str, payload: Dict[str, Any]) -> Any:
+        """Queue a job and wait for its upload result"""
+        self.start()
+        item = PipelineItem(job_id, payload, asyncio.get_running_loop().create_future())
+        self.cancellations.register(job_id)
+        await self._intake.put(item)
+        try:
+            return await item.future
+        except asyncio.CancelledError:
+            # The caller gave up on the job; stop working on it too
+            self.cancellations.cancel(job_id)
+            raise
+
+    def _dropped(self, item: PipelineItem) -> bool:
+        """Finish a cancelled job instead of running its next stage"""
+        if not self.cancellations.is_cancelled(item.job_id):
+            return False
+        logger.info(f"Job {item.job_id} cancelled, dropping it after {item.timings}")
+        self._finish(item, error=JobCancelled(f"Job {item.job_id} was cancelled"))
+        return True
+
+    async def _run_stage(self, stage: str, item: PipelineItem, fn: Callable, *args) -> bool:
+        start = time.monotonic()
+        try:
+            item.value = await asyncio.to_thread(fn, item.payload, *args)
+            return True
+        except Exception as e:
+            # However a stage stopped after cancellation, the job ends as cancelled
+            if not self._dropped(item):
+                logger.error(f"Job {item.job_id} failed in {stage}: {e}")
+                self._finish(item, error=e)
+            return False
+        finally:
+            elapsed = time.monotonic() - start
+            item.timings[stage] = round(elapsed, 3)
+            self.busy_seconds[stage] += elapsed
+
+    def _finish(self, item: PipelineItem, result: Any = None, error: Optional[Exception] = None):
+        if item.workdir:
+            shutil.rmtree(item.workdir, ignore_errors=True)
+        self.cancellations.discard(item.job_id)
+        if isinstance(error, JobCancelled):
+            self.cancelled += 1
+            if not item.future.done():
+                item.future.set_exception(error)
+            return
+        if error is not None:
+            self.failed += 1
+            if not item.future.done():
+                item.future.set_exception(error)
+            return
+        self.completed += 1
+        logger.info(f"Job {item.job_id} stage times: {item.timings}")
+        if not item.future.done():
+            item.future.set_result(result)
+
+    async def _download_loop(self):
+        while True:
+            item = await self._intake.get()
+            if self._dropped(item):
+                continue
+            item.workdir = tempfile.mkdtemp(prefix=f"job_{item.job_id}_")
+            if not await self._run_stage("download", item, self.download, item.workdir):
+                continue
+            if isinstance(item.value, FinishEarly):
+                self._finish(item, result=item.value.result)
+            elif not self._dropped(item):
+                # Blocks while prefetch inputs are already waiting for the GPU
+                await self._ready.put(item)
+
+    async def _infer_loop(self):
+        while True:
+            item = await self._ready.get()
+            if self._dropped(item):
+                continue
+            if await self._run_stage("infer", item, self.infer, item.value, item.workdir) and not self._dropped(item):
+                # Blocks while upload_backlog outputs are already waiting to upload
+                await self._done.put(item)
+
+    async def _upload_loop(self):
+        while True:
+            item = await self._done.get()
+            if self._dropped(item):
+                continue
+            if await self._run_stage("upload", item, self.upload, item.value, item.workdir):
+                self._finish(item, result=item.value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "waiting_download": self._intake.qsize() if self._intake else 0,
+            "waiting_infer": self._ready.qsize() if self._ready else 0,
+            "waiting_upload": self._done.qsize() if self._done else 0,
+            "busy_seconds": {stage: round(s, 3) for stage, s in self.busy_seconds.items()}
+        }
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Bounded-output subprocess runner for inference processes
+Output (stderr merged into stdout) is streamed as it arrives to a rotating
+log on disk, and only the last tail_bytes are kept in memory for error
+messages. The child runs in its own process group so a timeout or a
+cancellation stops torchrun together with every rank it spawned. Peak RSS
+and CPU time of the whole group are sampled from /proc while it runs.
+"""
+
+import os
+import glob
+import time
+import codecs
+import signal
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TAIL_BYTES = 64 * 1024
+DEFAULT_LOG_BYTES = 50 * 1024 * 1024
+# Seconds between SIGTERM and SIGKILL when stopping a process group
+KILL_GRACE_SECONDS = 10.0
+
+class RingBuffer:
+    """The last capacity bytes written to it"""
+
+    def __init__(self, capacity: int = DEFAULT_TAIL_BYTES):
+        self.capacity = capacity
+        self.data = bytearray()
+        self.total = 0
+
+    def write(self, chunk: bytes):
+        self.total += len(chunk)
+        self.data += chunk[-self.capacity:]
+        excess = len(self.data) - self.capacity
+        if excess > 0:
+            del self.data[:excess]
+
+    def text(self) -> str:
+        return self.data.decode(errors="replace")
+
+class RotatingLog:
+    """Append-only log file rotated to path.1 .. path.<backups> once it reaches max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_LOG_BYTES, backups: int = 2):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "ab")
+
+    def write(self, chunk: bytes):
+        if self.file.tell() + len(chunk) > self.max_bytes and self.file.tell() > 0:
+            self.rotate()
+        self.file.write(chunk)
+
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups, 0, -1):
+            source = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i}")
+        if self.backups == 0:
+            os.remove(self.path)
+        self.file = open(self.path, "ab")
+
+    def close(self):
+        self.file.close()
+
+def prune_logs(directory: str, keep: int = 100):
+    """Delete all but the newest keep logs in directory, with their rotations"""
+    logs = sorted(glob.glob(os.path.join(directory, "*.log")), key=os.path.getmtime, reverse=True)
+    for path in logs[keep:]:
+        for name in [path, *glob.glob(f"{glob.escape(path)}.*")]:
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+class ProcessResult:
+    """Exit status, output tail and resource usage of one finished process"""
+
+    def __init__(self, cmd: Sequence[str], returncode: int, tail: str, output_bytes: int, log_path: Optional[str],
+                 wall_seconds: float, peak_rss_mb: Optional[float], cpu_seconds: Optional[float],
+                 timed_out: bool = False, cancelled: bool = False):
+        self.cmd = list(cmd)
+        self.returncode = returncode
+        self.tail = tail
+        self.output_bytes = output_bytes
+        self.log_path = log_path
+        self.wall_seconds = wall_seconds
+        self.peak_rss_mb = peak_rss_mb
+        self.cpu_seconds = cpu_seconds
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "returncode": self.returncode,
+            "output_bytes": self.output_bytes,
+            "log_path": self.log_path,
+            "wall_seconds": round(self.wall_seconds, 2),
+            "peak_rss_mb": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            "cpu_seconds": round(self.cpu_seconds, 2) if self.cpu_seconds is not None else None,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled
+        }
+
+class ProcessFailed(RuntimeError):
+    """A process exited non-zero, timed out or was cancelled; str() ends with its output tail"""
+
+    def __init__(self, result: ProcessResult, message: Optional[str] = None):
+        if message is None:
+            if result.cancelled:
+                message = "cancelled"
+            elif result.timed_out:
+                message = f"timed out after {result.wall_seconds:.0f}s"
+            else:
+                message = f"exited with code {result.returncode}"
+        super().__init__(f"{os.path.basename(result.cmd[0])} {message}: {result.tail[-4000:]}")
+        self.result = result
+
+class GroupUsage:
+    """Peak RSS and CPU time of every process in a process group, sampled from /proc"""
+
+    def __init__(self, pgid: int):
+        self.pgid = pgid
+        self.available = os.path.isdir("/proc")
+        self.peak_rss_kb = 0
+        self.cpu_ticks: Dict[int, int] = {}
+        self.page_kb = os.sysconf("SC_PAGE_SIZE") // 1024 if self.available else 4
+        self.ticks_per_second = os.sysconf("SC_CLK_TCK") if self.available else 100
+
+    def sample(self):
+        if not self.available:
+            return
+        rss_kb = 0
+        for pid in self._members():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except (OSError, IndexError):
+                continue
+            # Fields after the command name: state is [0], pgrp [2], utime [11], stime [12], rss [21]
+            if int(fields[2]) != self.pgid:
+                continue
+            self.cpu_ticks[pid] = int(fields[11]) + int(fields[12])
+            rss_kb += int(fields[21]) * self.page_kb
+        self.peak_rss_kb = max(self.peak_rss_kb, rss_kb)
+
+    def _members(self) -> List[int]:
+        try:
+            return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+        except OSError:
+            return []
+
+    def peak_rss_mb(self) -> Optional[float]:
+        return self.peak_rss_kb / 1024 if self.available else None
+
+    def cpu_seconds(self) -> Optional[float]:
+        return sum(self.cpu_ticks.values()) / self.ticks_per_second if self.available else None
+
+def kill_group(process, grace: float = KILL_GRACE_SECONDS):
+    """SIGTERM the process's group, then SIGKILL whatever is left after grace seconds"""
+    def signal_group(sig):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    signal_group(signal.SIGTERM)
+
+    def escalate():
+        # The leader may be gone while ranks it spawned still hold GPUs
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline:
+            if not _group_alive(process.pid):
+                return
+            time.sleep(0.1)
+        signal_group(signal.SIGKILL)
+
+    threading.Thread(target=escalate, daemon=True, name=f"kill-{process.pid}").start()
+
+def _group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+async def run_process(
+    cmd: Sequence[str],
+    env: Optional[Dict[str, str]] = None,
+    cwd: Optional[str] = None,
+    log_path: Optional[str] = None,
+    log_bytes: int = DEFAULT_LOG_BYTES,
+    tail_bytes: int = DEFAULT_TAIL_BYTES,
+    timeout: Optional[float] = None,
+    cancel: Optional[threading.Event] = None,
+    on_output: Optional[Callable[[str], None]] = None,
+    sample_interval: float = 1.0,
+    check: bool = True
+) -> ProcessResult:
+    """Run cmd to completion with bounded memory for its output
+
+    on_output receives decoded text as it streams (e.g. ProgressTracker.feed).
+    Setting cancel, passing timeout, or cancelling the awaiting task stops
+    the whole process group. With check, a non-zero exit raises
+    ProcessFailed; cancelling the task re-raises CancelledError after the
+    group is stopped.
+    """
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        env=env, cwd=cwd, start_new_session=True
+    )
+    tail = RingBuffer(tail_bytes)
+    log = RotatingLog(log_path, log_bytes) if log_path else None
+    usage = GroupUsage(process.pid)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    async def pump():
+        while True:
+            chunk = await process.stdout.read(65536)
+            if not chunk:
+                break
+            tail.write(chunk)
+            if log is not None:
+                log.write(chunk)
+            if on_output is not None:
+                on_output(decoder.decode(chunk))
+        if on_output is not None:
+            on_output(decoder.decode(b"", final=True))
+
+    async def watch() -> str:
+        deadline = start + timeout if timeout is not None else None
+        next_sample = start
+        while True:
+            now = time.monotonic()
+            if now >= next_sample:
+                usage.sample()
+                next_sample = now + sample_interval
+            if cancel is not None and cancel.is_set():
+                return "cancelled"
+            if deadline is not None and now >= deadline:
+                return "timed_out"
+            await asyncio.sleep(0.2)
+
+    reader = asyncio.ensure_future(pump())
+    watcher = asyncio.ensure_future(watch())
+    stopped = None
+    try:
+        done, _ = await asyncio.wait({reader, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if watcher in done:
+            stopped = watcher.result()
+            logger.warning(f"Stopping {cmd[0]} (pid {process.pid}): {stopped.replace('_', ' ')}")
+            kill_group(process)
+        await reader
+        await process.wait()
+    except asyncio.CancelledError:
+        kill_group(process)
+        # Reap the leader before giving up the loop that owns it
+        await process.wait()
+        raise
+    finally:
+        watcher.cancel()
+        reader.cancel()
+        if log is not None:
+            log.close()
+
+    result = ProcessResult(
+        cmd, process.returncode, tail.text(), tail.total, log_path, time.monotonic() - start,
+        usage.peak_rss_mb(), usage.cpu_seconds(),
+        timed_out=stopped == "timed_out", cancelled=stopped == "cancelled"
+    )
+    logger.info(f"{os.path.basename(cmd[0])} exited {result.returncode} after {result.wall_seconds:.1f}s, "
+                f"{result.output_bytes} bytes of output, peak RSS {result.peak_rss_mb or 0:.0f} MB, "
+                f"CPU {result.cpu_seconds or 0:.1f}s")
+    if check and (stopped or result.returncode != 0):
+        raise ProcessFailed(result)
+    return result
+
+def run_process_sync(cmd: Sequence[str], **kwargs) -> ProcessResult:
+    """run_process for threads and scripts without an event loop"""
+    return asyncio.run(run_process(cmd, **kwargs))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Progress parsing for SeedVR2 inference output
+The inference scripts only print: tqdm bars (redrawn with carriage
+returns), "step 3/50"-style counters and stage messages. ProgressTracker
+turns that text, fed in arbitrary chunks as it streams, into a stage,
+an overall fraction and an ETA, and calls back at a bounded rate.
+"""
+
+import re
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Share of the inference each stage accounts for
+STAGES = {
+    "loading": (0.0, 0.1),
+    "restoring": (0.1, 0.95),
+    "saving": (0.95, 1.0),
+    "done": (1.0, 1.0),
+}
+
+TQDM = re.compile(r"\d+%\|[^|]*\|\s*(\d+)/(\d+)")
+LABELLED = re.compile(r"\b(?:frame|step|batch|chunk|video|sample|iter)s?\b\D{0,8}?(\d+)\s*(?:/|of)\s*(\d+)", re.I)
+STAGE_HINTS = [
+    (re.compile(r"\b(?:sav|writ|export)", re.I), "saving"),
+    (re.compile(r"\b(?:load|configur|initiali[sz])", re.I), "loading"),
+    (re.compile(r"\b(?:sampl|generat|restor|infer|denois)", re.I), "restoring"),
+]
+
+class ProgressTracker:
+    """Incremental parser of inference output into progress snapshots
+
+    feed() accepts text as it arrives; lines end at "\\n" or "\\r" so every
+    tqdm redraw counts. on_progress(snapshot) fires when the stage changes,
+    or when progress moved and min_interval has passed since the last call.
+    """
+
+    def __init__(self, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 min_interval: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.on_progress = on_progress
+        self.min_interval = min_interval
+        self.clock = clock
+        self.stage = "loading"
+        self.current = 0
+        self.total = 0
+        self.started = clock()
+        self._counting_since: Optional[float] = None
+        self._counted_from = 0
+        self._partial = ""
+        self._last_emit = float("-inf")
+        self._last_progress = -1.0
+
+    def feed(self, text: str):
+        lines = re.split(r"[\r\n]", self._partial + text)
+        self._partial = lines.pop()
+        # An unterminated line is bounded so a stream without newlines cannot grow it
+        if len(self._partial) > 4096:
+            lines.append(self._partial)
+            self._partial = ""
+        for line in lines:
+            if line.strip():
+                self.parse_line(line)
+
+    def parse_line(self, line: str):
+        hinted = next((stage for pattern, stage in STAGE_HINTS if pattern.search(line)), None)
+        stage = hinted or self.stage
+
+        match = TQDM.search(line) or LABELLED.search(line)
+        if match and int(match.group(2)) > 0:
+            current, total = int(match.group(1)), int(match.group(2))
+            # An unlabelled counter after loading is the restoration loop
+            if hinted is None and stage == "loading":
+                stage = "restoring"
+            if stage == "restoring":
+                if self._counting_since is None or current < self.current or total != self.total:
+                    # A new counter started: time it from here
+                    self._counting_since = self.clock()
+                    self._counted_from = current
+                self.current, self.total = min(current, total), total
+        self._set_stage(stage)
+
+    def _set_stage(self, stage: str):
+        # Stages only move forward; a stray "loading" line mid-run is ignored
+        if list(STAGES).index(stage) < list(STAGES).index(self.stage):
+            stage = self.stage
+        changed = stage != self.stage
+        self.stage = stage
+        self._maybe_emit(force=changed)
+
+    def finish(self):
+        if self._partial.strip():
+            self.parse_line(self._partial)
+        self._partial = ""
+        self.stage = "done"
+        self._maybe_emit(force=True)
+
+    def progress(self) -> float:
+        low, high = STAGES[self.stage]
+        within = self.current / self.total if self.stage == "restoring" and self.total else 0.0
+        return low + (high - low) * within
+
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining time at the current counter's rate, plus a proportional share for saving"""
+        if self.stage != "restoring" or self._counting_since is None:
+            return None
+        done = self.current - self._counted_from
+        if done <= 0:
+            return None
+        elapsed = self.clock() - self._counting_since
+        remaining = elapsed / done * (self.total - self.current)
+        low, high = STAGES["restoring"]
+        return remaining + (remaining + elapsed) * (1.0 - high) / (high - low)
+
+    def snapshot(self) -> Dict[str, Any]:
+        eta = self.eta_seconds()
+        return {
+            "stage": self.stage,
+            "progress": round(self.progress(), 4),
+            "current": self.current,
+            "total": self.total,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "elapsed_seconds": round(self.clock() - self.started, 1)
+        }
+
+    def _maybe_emit(self, force: bool = False):
+        if self.on_progress is None:
+            return
+        progress = self.progress()
+        now = self.clock()
+        if force or (progress > self._last_progress and now - self._last_emit >= self.min_interval):
+            self._last_emit = now
+            self._last_progress = progress
+            self.on_progress(self.snapshot())
+
+class TeeStream:
+    """File-like wrapper that writes through to a stream and feeds a tracker"""
+
+    def __init__(self, stream, tracker: ProgressTracker):
+        self.stream = stream
+        self.tracker = tracker
+
+    def write(self, text: str) -> int:
+        self.tracker.feed(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
+@contextmanager
+def capture_progress(tracker: ProgressTracker) -> Iterator[ProgressTracker]:
+    """Feed everything this process prints to stdout/stderr into tracker while active"""
+    saved = (sys.stdout, sys.stderr)
+    sys.stdout = TeeStream(sys.stdout, tracker)
+    sys.stderr = TeeStream(sys.stderr, tracker)
+    try:
+        yield tracker
+    finally:
+        sys.stdout, sys.stderr = saved
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Parallel ranged-GET downloader for worker input videos
+Splits the file into pieces fetched over several connections with large
+buffers and writes each piece in place with positional writes. Completed
+pieces are recorded so an interrupted download resumes where it stopped,
+and servers without Range support get a single streamed GET.
+"""
+
+import os
+import json
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTIONS = 8
+DEFAULT_PIECE_SIZE = 16 * 1024 * 1024
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+class DownloadError(Exception):
+    pass
+
+def parse_goog_hash(header: Optional[str]) -> Optional[str]:
+    """Hex MD5 from a GCS x-goog-hash header ("crc32c=...,md5=<base64>")"""
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "md5" and value:
+            return base64.b64decode(value).hex()
+    return None
+
+def file_digest(path: str, algorithm: str, buffer_size: int = 8 * 1024 * 1024) -> str:
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        while chunk := f.read(buffer_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class RangeDownloader:
+    """Download one URL to a local path, in parallel when the server allows it"""
+
+    def __init__(self, connections: int = DEFAULT_CONNECTIONS, piece_size: int = DEFAULT_PIECE_SIZE,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE, retries: int = 3, timeout: float = 60.0,
+                 session: Optional[requests.Session] = None):
+        self.connections = connections
+        self.piece_size = piece_size
+        self.buffer_size = buffer_size
+        self.retries = retries
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def probe(self, url: str) -> Dict[str, Any]:
+        """Size, validator and Range support, from a one-byte ranged GET"""
+        response = self.session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+            headers = response.headers
+            etag = headers.get("ETag")
+            if etag and etag.startswith("W/"):
+                # Weak validators are not allowed in If-Range
+                etag = None
+            info = {
+                "size": None,
+                "ranges": False,
+                "etag": etag or headers.get("Last-Modified"),
+                "md5": parse_goog_hash(headers.get("x-goog-hash"))
+            }
+            content_range = headers.get("Content-Range", "")
+            if response.status_code == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                if total != "*":
+                    info["size"] = int(total)
+                    info["ranges"] = True
+            elif headers.get("Content-Length"):
+                info["size"] = int(headers["Content-Length"])
+            return info
+        finally:
+            response.close()
+
+    def download(self, url: str, dest: str, expected_size: Optional[int] = None,
+                 sha256: Optional[str] = None, md5: Optional[str] = None) -> str:
+        """Download url to dest and verify its size (and checksum when known)"""
+        info = self.probe(url)
+        size = info["size"]
+        if expected_size is not None and size is not None and size != expected_size:
+            raise DownloadError(f"Server reports {size} bytes, expected {expected_size}")
+
+        part_path = dest + ".part"
+        if info["ranges"] and size:
+            self._download_ranges(url, part_path, size, info["etag"])
+        else:
+            logger.info("Server does not support ranges, falling back to a single stream")
+            self._download_stream(url, part_path)
+
+        actual_size = os.path.getsize(part_path)
+        wanted_size = expected_size if expected_size is not None else size
+        if wanted_size is not None and actual_size != wanted_size:
+            raise DownloadError(f"Downloaded {actual_size} bytes, expected {wanted_size}")
+
+        md5 = md5 or info["md5"]
+        for algorithm, expected in (("sha256", sha256), ("md5", md5)):
+            if expected and file_digest(part_path, algorithm) != expected.lower():
+                os.unlink(part_path)
+                self._clear_state(part_path)
+                raise DownloadError(f"{algorithm} mismatch for {url}")
+
+        os.replace(part_path, dest)
+        self._clear_state(part_path)
+        return dest
+
+    def _state_path(self, part_path: str) -> str:
+        return part_path + ".json"
+
+    def _load_state(self, part_path: str, url: str, size: int, etag: Optional[str]) -> set:
+        """Pieces already on disk from an interrupted download of the same object"""
+        try:
+            with open(self._state_path(part_path)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if (state.get("url"), state.get("size"), state.get("etag"), state.get("piece_size")) != \
+                (url, size, etag, self.piece_size) or not os.path.exists(part_path):
+            return set()
+        return set(state.get("done", []))
+
+    def _save_state(self, part_path: str, state: Dict[str, Any]):
+        tmp_path = self._state_path(part_path) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._state_path(part_path))
+
+    def _clear_state(self, part_path: str):
+        try:
+            os.unlink(self._state_path(part_path))
+        except FileNotFoundError:
+            pass
+
+    def _download_ranges(self, url: str, part_path: str, size: int, etag: Optional[str]):
+        pieces: List[Tuple[int, int]] = [
+            (start, min(start + self.piece_size, size) - 1) for start in range(0, size, self.piece_size)
+        ]
+        done = self._load_state(part_path, url, size, etag)
+        if done:
+            logger.info(f"Resuming download: {len(done)}/{len(pieces)} pieces already present")
+
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # Preallocate so positional writes never extend the file piecemeal
+            os.ftruncate(fd, size)
+            if hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(fd, 0, size)
+                except OSError:
+                    pass
+
+            state = {"url": url, "size": size, "etag": etag, "piece_size": self.piece_size, "done": sorted(done)}
+            lock = threading.Lock()
+            progress = {"bytes": sum(pieces[i][1] - pieces[i][0] + 1 for i in done), "logged": 0}
+
+            def fetch(index: int):
+                start, end = pieces[index]
+                self._fetch_piece(url, fd, start, end, etag)
+                with lock:
+                    state["done"].append(index)
+                    self._save_state(part_path, state)
+                    progress["bytes"] += end - start + 1
+                    percent = progress["bytes"] * 100 // size
+                    if percent >= progress["logged"] + 10:
+                        progress["logged"] = percent - percent % 10
+                        logger.info(f"Download progress: {percent}%")
+
+            todo = [i for i in range(len(pieces)) if i not in done]
+            with ThreadPoolExecutor(max_workers=min(self.connections, max(len(todo), 1))) as executor:
+                for future in [executor.submit(fetch, i) for i in todo]:
+                    future.result()
+        finally:
+            os.close(fd)
+
+    def _fetch_piece(self, url: str, fd: int, start: int, end: int, etag: Optional[str]):
+        offset = start
+        for attempt in range(self.retries + 1):
+            headers = {"Range": f"bytes={offset}-{end}"}
+            if etag:
+                # Fail instead of mixing bytes from two versions of the object
+                headers["If-Range"] = etag
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code != 206:
+                        raise DownloadError(f"Expected 206 for range {offset}-{end}, got {response.status_code}")
+                    for chunk in response.raw.stream(self.buffer_size, decode_content=False):
+                        view = memoryview(chunk)
+                        while view:
+                            written = os.pwrite(fd, view, offset)
+                            offset += written
+                            view = view[written:]
+                if offset != end + 1:
+                    raise DownloadError(f"Range {start}-{end} ended early at {offset}")
+                return
+            except (requests.RequestException, DownloadError) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning(f"Retrying range {offset}-{end} after error: {e}")
+
+    def _download_stream(self, url: str, part_path: str):
+        with self.session.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(part_path, "wb", buffering=0) as f:
+                for chunk in response.raw.stream(self.buffer_size, decode_content=True):
+                    f.write(chunk)
+
+def download_file(url: str, dest: str, **kwargs) -> str:
+    """One-shot convenience wrapper around RangeDownloader.download"""
+    verify = {key: kwargs.pop(key) for key in ("expected_size", "sha256", "md5") if key in kwargs}
+    return RangeDownloader(**kwargs).download(url, dest, **verify)
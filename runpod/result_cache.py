@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of finished restorations
+A result is keyed by the SHA-256 of the input bytes plus everything that
+changes the output: resolved dimensions, seed, model size and a fingerprint
+of the checkpoint weights. The worker records an entry after each upload and
+publishes the models it serves, so the backend (backend/api/services/
+result_cache.py, which mirrors the key derivation) can answer a repeated
+request before it is ever submitted.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "cache"
+KEY_VERSION = 1
+FINGERPRINT_FILE = ".checkpoint_sha256"
+WEIGHT_SUFFIXES = (".safetensors", ".pth", ".bin", ".pt")
+
+def resolve_dimensions(height: int, width: int) -> Tuple[int, int]:
+    """Round dimensions down to multiples of 32"""
+    return (height // 32) * 32, (width // 32) * 32
+
+def select_model(height: int, width: int, gpu_count: int) -> Tuple[str, int]:
+    """Model size and sequence-parallel GPU count for a resolution"""
+    pixels = height * width
+    # For 720p and below, use 3B model with 1 GPU
+    if pixels <= 1280 * 720:
+        return "3b", 1
+    # For 1080p, use 3B model with 4 GPUs or 7B with 2 GPUs
+    if pixels <= 1920 * 1080:
+        if gpu_count >= 4:
+            return "3b", 4
+        return "7b", min(gpu_count, 2)
+    # For 2K and above, use 7B model with 4 GPUs
+    return "7b", 4
+
+def cache_key(input_sha256: str, res_h: int, res_w: int, seed: int, model_size: str, checkpoint: str) -> str:
+    """Key for one (input, parameters, weights) combination"""
+    canonical = json.dumps({
+        "v": KEY_VERSION,
+        "input": input_sha256.lower(),
+        "res_h": int(res_h),
+        "res_w": int(res_w),
+        "seed": int(seed),
+        "model": model_size,
+        "checkpoint": checkpoint
+    }, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def entry_name(key: str) -> str:
+    return f"{CACHE_PREFIX}/results/{key}.json"
+
+def profile_name(endpoint_id: str) -> str:
+    return f"{CACHE_PREFIX}/profiles/{endpoint_id}.json"
+
+def checkpoint_fingerprint(model_dir: str) -> str:
+    """SHA-256 over every weight file in model_dir, remembered next to the weights"""
+    marker = os.path.join(model_dir, FINGERPRINT_FILE)
+    try:
+        with open(marker) as f:
+            return f.read().strip()
+    except OSError:
+        pass
+
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_dir):
+        dirs[:] = sorted(d for d in dirs if d != "cache")
+        for name in sorted(files):
+            if not name.endswith(WEIGHT_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            file_hash = hashlib.sha256()
+            with open(path, "rb") as f:
+                while chunk := f.read(8 * 1024 * 1024):
+                    file_hash.update(chunk)
+            digest.update(f"{os.path.relpath(path, model_dir)}\0{file_hash.hexdigest()}\n".encode())
+    fingerprint = digest.hexdigest()
+
+    try:
+        with open(marker, "w") as f:
+            f.write(fingerprint)
+    except OSError as e:
+        logger.warning(f"Could not store checkpoint fingerprint in {model_dir}: {e}")
+    return fingerprint
+
+class ResultCache:
+    """Cache entries in the results bucket, one small JSON object per key"""
+
+    def __init__(self, storage, checkpoints: Dict[str, str], gpu_count: int):
+        self.storage = storage
+        self.checkpoints = checkpoints
+        self.gpu_count = gpu_count
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, input_sha256: str, params: Dict[str, Any]) -> Optional[str]:
+        """Cache key for a job, or None when this worker lacks the model it resolves to"""
+        res_h, res_w = resolve_dimensions(params.get("res_h", 720), params.get("res_w", 1280))
+        model_size, _ = select_model(res_h, res_w, self.gpu_count)
+        checkpoint = self.checkpoints.get(model_size)
+        if checkpoint is None:
+            return None
+        return cache_key(input_sha256, res_h, res_w, params.get("seed", 42), model_size, checkpoint)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Stored job output for key, if its result object still exists"""
+        entry = self.storage.read_json(entry_name(key))
+        if entry is None or not self.storage.exists(entry["object_name"]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["output"]
+
+    def record(self, key: str, output: Dict[str, Any], object_name: str):
+        self.storage.write_json(entry_name(key), {
+            "output": output,
+            "object_name": object_name,
+            "created_at": datetime.utcnow().isoformat()
+        })
+
+    def publish_profile(self, endpoint_id: str):
+        """Tell the backend which models this endpoint serves and on how many GPUs"""
+        self.storage.write_json(profile_name(endpoint_id), {
+            "gpu_count": self.gpu_count,
+            "checkpoints": self.checkpoints,
+            "updated_at": datetime.utcnow().isoformat()
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses}
+
+if __name__ == "__main__":
+    # Run at image build time so workers never hash the weights on cold start
+    print(checkpoint_fingerprint(sys.argv[1]))
@@ -10,6 +10,7 @@ import uuid
 import shutil
 import asyncio
 import tempfile
+import threading
 import subprocess
 from pathlib import Path
 from datetime import datetime
@@ -17,24 +18,38 @@ from typing import Optional, Dict, Any
 
 # Add FastAPI imports
 try:
-    from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-    from fastapi.responses import FileResponse, JSONResponse
+    from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+    from fastapi.responses import JSONResponse, Response
     from fastapi.middleware.cors import CORSMiddleware
     import uvicorn
 except ImportError:
     print("Installing required packages...")
     subprocess.check_call([sys.executable, "-m", "pip", "install", "fastapi", "uvicorn", "python-multipart"])
-    from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-    from fastapi.responses import FileResponse, JSONResponse
+    from fastapi import FastAPI, File, UploadFile, HTTPException, Request
+    from fastapi.responses import JSONResponse, Response
     from fastapi.middleware.cors import CORSMiddleware
     import uvicorn
 
+from artifact_gc import ArtifactCollector
+from inference_worker import InferenceWorkerClient, worker_command, DEFAULT_SOCKET_PATH
+from process_runner import run_process
+from cancellation import JobCancelled
+from file_ranges import FilePlan, content_etag, plan_response
+from admission import AdmissionController, AdmissionRejected, Ticket, client_key, count_devices, parse_networks
+
 # Configuration
 MODEL_PATH = "/models/seedvr2-7b"
 INFERENCE_SCRIPT = "/app/SeedVR/projects/inference_seedvr2_7b.py"
 UPLOAD_DIR = Path("/tmp/seedvr2_uploads")
 OUTPUT_DIR = Path("/tmp/seedvr2_outputs")
 MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+UPLOAD_TTL = 24 * 3600  # Keep uploads for 24 hours
+OUTPUT_TTL = 48 * 3600  # Keep outputs and job records for 48 hours
+CONDA_RUN = ["conda", "run", "--no-capture-output", "-n", "seedvr"]
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "16"))  # Accepted jobs waiting for a GPU
+MAX_JOBS_PER_CLIENT = int(os.getenv("MAX_JOBS_PER_CLIENT", "4"))  # Queued plus running, per client
+TRUSTED_PROXIES = parse_networks(os.getenv("TRUSTED_PROXIES", ""))  # Only these may set X-Client-Id / X-Forwarded-For
+INFERENCES_PER_DEVICE = int(os.getenv("INFERENCES_PER_DEVICE", "1"))
 
 # Create directories
 UPLOAD_DIR.mkdir(exist_ok=True)
@@ -54,6 +69,70 @@ app.add_middleware(
 
 # Job storage (in production, use Redis or database)
 jobs: Dict[str, Dict[str, Any]] = {}
+# Set to stop a queued or running job
+cancel_events: Dict[str, threading.Event] = {}
+
+def forget_job(path: str):
+    """Drop a job's record once its output directory has expired"""
+    path = Path(path)
+    if path.parent == OUTPUT_DIR:
+        jobs.pop(path.name, None)
+
+# Keeps the 7B model loaded on one GPU between jobs
+inference_worker = InferenceWorkerClient(
+    DEFAULT_SOCKET_PATH,
+    worker_command(DEFAULT_SOCKET_PATH, script=INFERENCE_SCRIPT, model_size="7b",
+                   sp_size=1, python="python", prefix=CONDA_RUN),
+    model_size="7b",
+    sp_size=1
+)
+
+# Deletes uploads and outputs as they expire instead of scanning the directories
+artifact_gc = ArtifactCollector(on_expire=forget_job)
+
+# Tasks of started jobs, referenced until they finish
+running_tasks: set = set()
+# Background model load started with the server
+worker_startup: Optional[asyncio.Task] = None
+
+def start_job(ticket: Ticket):
+    """Called by the admission controller when a queued job gets its GPUs"""
+    input_path, params = ticket.payload
+    task = asyncio.get_running_loop().create_task(run_seedvr2_async(ticket.job_id, input_path, params))
+    running_tasks.add(task)
+    task.add_done_callback(running_tasks.discard)
+
+# Jobs start only while GPU slots are free; a burst waits in a bounded, per-client fair queue
+admission = AdmissionController(
+    start_job,
+    devices=count_devices(),
+    per_device=INFERENCES_PER_DEVICE,
+    max_queued=MAX_QUEUED_JOBS,
+    max_per_client=MAX_JOBS_PER_CLIENT
+)
+
+def client_id(request: Request) -> str:
+    """Who a request counts against for fair share; see admission.client_key"""
+    return client_key(request.client.host if request.client else None, request.headers, TRUSTED_PROXIES)
+
+def too_busy(rejection: AdmissionRejected) -> HTTPException:
+    return HTTPException(429, rejection.to_dict(), headers={"Retry-After": str(rejection.retry_after)})
+
+@app.on_event("startup")
+async def start_artifact_gc():
+    """Pick up files left by a previous run, then collect in the background"""
+    artifact_gc.seed_from_disk(UPLOAD_DIR, UPLOAD_TTL)
+    artifact_gc.seed_from_disk(OUTPUT_DIR, OUTPUT_TTL)
+    artifact_gc.start()
+    # Load the model in the background so the server answers immediately
+    global worker_startup
+    worker_startup = asyncio.create_task(asyncio.to_thread(inference_worker.start))
+    worker_startup.add_done_callback(log_worker_startup)
+
+def log_worker_startup(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        # Jobs still run: the first one retries the start, then falls back to a cold run
+        print(f"⚠️ Warm worker failed to start: {task.exception()}")
 
 def validate_dimensions(height: int, width: int) -> tuple[int, int]:
     """Ensure dimensions are multiples of 32"""
@@ -61,15 +140,23 @@ def validate_dimensions(height: int, width: int) -> tuple[int, int]:
     width = (width // 32) * 32
     return height, width
 
+def gpu_count_for(res_h: int, res_w: int) -> int:
+    """Sequence-parallel GPUs a job at this resolution runs on"""
+    return 4 if (res_h > 720 or res_w > 1280) else 1
+
 async def run_seedvr2_async(job_id: str, input_path: str, params: Dict[str, Any]):
     """Run SeedVR2 inference asynchronously"""
+    job_output_dir = OUTPUT_DIR / job_id
+    cancel = cancel_events.setdefault(job_id, threading.Event())
     try:
+        if cancel.is_set():
+            return
+        
         # Update job status
         jobs[job_id]["status"] = "processing"
         jobs[job_id]["started_at"] = datetime.now().isoformat()
         
         # Prepare output directory
-        job_output_dir = OUTPUT_DIR / job_id
         job_output_dir.mkdir(exist_ok=True)
         
         # Validate dimensions
@@ -79,50 +166,88 @@ async def run_seedvr2_async(job_id: str, input_path: str, params: Dict[str, Any]
         )
         
         # Determine GPU count
-        sp_size = 4 if (res_h > 720 or res_w > 1280) else 1
+        sp_size = gpu_count_for(res_h, res_w)
         
-        # Prepare command
-        cmd = [
-            "conda", "run", "-n", "seedvr",
-            "torchrun", f"--nproc-per-node={sp_size}",
-            INFERENCE_SCRIPT,
-            "--video_path", str(input_path),
-            "--output_dir", str(job_output_dir),
-            "--seed", str(params.get("seed", 42)),
-            "--res_h", str(res_h),
-            "--res_w", str(res_w),
-            "--sp_size", str(sp_size)
-        ]
+        warm = inference_worker.serves("7b", sp_size)
+        if warm:
+            try:
+                # Warm path: the model is already loaded in the worker process
+                await asyncio.to_thread(
+                    inference_worker.infer,
+                    str(input_path),
+                    str(job_output_dir),
+                    {"seed": params.get("seed", 42), "res_h": res_h, "res_w": res_w},
+                    cancel=cancel
+                )
+            except JobCancelled:
+                raise
+            except Exception as e:
+                # The cold run needs the GPU the worker holds; the next job starts it again
+                print(f"⚠️ Warm worker failed for {job_id}, retrying with a fresh process: {e}")
+                await asyncio.to_thread(inference_worker.kill)
+                warm = False
+        elif inference_worker.process is not None:
+            # A multi-GPU run would land on the GPU holding the warm weights and run out of memory
+            await asyncio.to_thread(inference_worker.kill)
+        if not warm:
+            await run_torchrun(input_path, job_output_dir, params, res_h, res_w, sp_size, cancel)
         
-        # Run inference
-        print(f"Running command: {' '.join(cmd)}")
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            raise RuntimeError(f"SeedVR2 inference failed: {stderr.decode()}")
+        if cancel.is_set():
+            raise JobCancelled(f"Job {job_id} was cancelled")
         
         # Find output video
         output_files = list(job_output_dir.glob("*.mp4"))
         if not output_files:
             raise RuntimeError("No output video found")
         
+        # Hash the output now so the first download does not wait for its ETag
+        await asyncio.to_thread(content_etag, output_files[0])
+        
         # Update job with success
         jobs[job_id]["status"] = "completed"
         jobs[job_id]["output_path"] = str(output_files[0])
         jobs[job_id]["completed_at"] = datetime.now().isoformat()
         
     except Exception as e:
+        if cancel.is_set():
+            # The GPUs are already free; its partial output is of no use
+            shutil.rmtree(job_output_dir, ignore_errors=True)
+            print(f"Job {job_id} cancelled")
+            return
+        
         # Update job with error
         jobs[job_id]["status"] = "failed"
         jobs[job_id]["error"] = str(e)
         jobs[job_id]["failed_at"] = datetime.now().isoformat()
         print(f"Job {job_id} failed: {str(e)}")
+    
+    finally:
+        cancel_events.pop(job_id, None)
+        # Its GPU slots go to the next queued job
+        admission.finished(job_id)
+        # Outputs (and the job record with them) expire OUTPUT_TTL after finishing
+        artifact_gc.schedule(job_output_dir, OUTPUT_TTL)
+
+async def run_torchrun(input_path: Path, job_output_dir: Path, params: Dict[str, Any],
+                       res_h: int, res_w: int, sp_size: int, cancel: Optional[threading.Event] = None):
+    """Cold path: a fresh torchrun that loads the model for this job only"""
+    # Prepare command
+    cmd = [
+        *CONDA_RUN,
+        "torchrun", f"--nproc-per-node={sp_size}",
+        INFERENCE_SCRIPT,
+        "--video_path", str(input_path),
+        "--output_dir", str(job_output_dir),
+        "--seed", str(params.get("seed", 42)),
+        "--res_h", str(res_h),
+        "--res_w", str(res_w),
+        "--sp_size", str(sp_size)
+    ]
+    
+    # Run inference
+    print(f"Running command: {' '.join(cmd)}")
+    # Output goes to a log beside the result (expiring with it); failures carry only its tail
+    await run_process(cmd, log_path=str(job_output_dir / "inference.log"), cancel=cancel)
 
 @app.get("/")
 async def root():
@@ -136,18 +261,25 @@ async def root():
 
 @app.post("/api/restore")
 async def restore_video(
-    background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
     res_h: int = 720,
     res_w: int = 1280,
     seed: int = 42
 ):
-    """Submit video for restoration"""
+    """Submit video for restoration; 429 with Retry-After while the queue or the client's share is full"""
     
     # Validate file
     if not file.filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
         raise HTTPException(400, "Invalid file format. Supported: MP4, AVI, MOV, MKV")
     
+    # Refuse before storing the upload when it could not be queued anyway
+    client = client_id(request)
+    try:
+        admission.check(client)
+    except AdmissionRejected as e:
+        raise too_busy(e)
+    
     # Generate job ID
     job_id = str(uuid.uuid4())
     
@@ -166,6 +298,8 @@ async def restore_video(
             input_path.unlink()
             raise HTTPException(400, f"File too large. Maximum size: {MAX_FILE_SIZE // (1024**3)}GB")
         
+        artifact_gc.schedule(input_path, UPLOAD_TTL)
+        
         # Create job entry
         jobs[job_id] = {
             "id": job_id,
@@ -178,21 +312,28 @@ async def restore_video(
             },
             "created_at": datetime.now().isoformat()
         }
+        cancel_events[job_id] = threading.Event()
         
-        # Start processing in background
-        background_tasks.add_task(
-            run_seedvr2_async,
-            job_id,
-            input_path,
-            jobs[job_id]["params"]
-        )
+        # Starts now if GPU slots are free, otherwise when its turn comes
+        try:
+            position = admission.submit(
+                job_id, client, gpu_count_for(res_h, res_w), (input_path, jobs[job_id]["params"])
+            )
+        except AdmissionRejected as e:
+            jobs.pop(job_id, None)
+            cancel_events.pop(job_id, None)
+            input_path.unlink(missing_ok=True)
+            raise too_busy(e)
         
         return JSONResponse({
             "job_id": job_id,
             "status": "queued",
+            "queue_position": position,
             "message": "Video submitted for restoration"
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         # Clean up on error
         if input_path.exists():
@@ -209,12 +350,81 @@ async def get_job_status(job_id: str):
     # Don't expose internal paths
     if "output_path" in job:
         job.pop("output_path")
+    if job["status"] == "queued":
+        job["queue_position"] = admission.position(job_id)
     
     return job
 
-@app.get("/api/download/{job_id}")
-async def download_result(job_id: str):
-    """Download restored video"""
+@app.get("/api/queue")
+async def queue_stats():
+    """Admission queue depth, running jobs and wait times"""
+    return admission.stats()
+
+@app.post("/api/cancel/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job, stopping its inference"""
+    if job_id not in jobs:
+        raise HTTPException(404, "Job not found")
+    
+    job = jobs[job_id]
+    if job["status"] not in ("queued", "processing"):
+        raise HTTPException(400, f"Cannot cancel job in {job['status']} state")
+    
+    # The running job's process group is killed and its output removed
+    job["status"] = "cancelled"
+    job["cancelled_at"] = datetime.now().isoformat()
+    if admission.withdraw(job_id):
+        # Never started, so nothing else will clean up after it
+        cancel_events.pop(job_id, None)
+    event = cancel_events.get(job_id)
+    if event is not None:
+        event.set()
+    
+    return {"message": "Job cancelled", "job_id": job_id}
+
+class RangeFileResponse(Response):
+    """Send a FilePlan's segments, zero-copy where the server offers it
+    
+    Servers implementing the ASGI zero-copy send extension get the file
+    descriptor and offsets (sendfile); otherwise slices are read with
+    pread off the event loop, one chunk at a time.
+    """
+    
+    chunk_size = 1024 * 1024
+    
+    def __init__(self, path: Path, plan: FilePlan):
+        super().__init__(status_code=plan.status, headers=plan.headers)
+        self.path = path
+        self.plan = plan
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or not self.plan.segments:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        with open(self.path, "rb") as f:
+            for prefix, offset, length in self.plan.segments:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                if zero_copy:
+                    if length:
+                        await send({"type": "http.response.zerocopysend", "file": f,
+                                    "offset": offset, "count": length, "more_body": True})
+                    continue
+                end = offset + length
+                while offset < end:
+                    data = await asyncio.to_thread(os.pread, f.fileno(), min(self.chunk_size, end - offset), offset)
+                    if not data:
+                        break
+                    offset += len(data)
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+@app.api_route("/api/download/{job_id}", methods=["GET", "HEAD"])
+async def download_result(job_id: str, request: Request):
+    """Download restored video; Range, If-Range and If-None-Match let players seek and revalidate"""
     if job_id not in jobs:
         raise HTTPException(404, "Job not found")
     
@@ -226,11 +436,11 @@ async def download_result(job_id: str):
     if not output_path.exists():
         raise HTTPException(404, "Output file not found")
     
-    return FileResponse(
-        output_path,
-        media_type="video/mp4",
-        filename=f"restored_{job['input_filename']}"
+    # Hashing is cached per file, so this only reads the file when it changed
+    plan = await asyncio.to_thread(
+        plan_response, output_path, request.headers, "video/mp4", f"restored_{job['input_filename']}"
     )
+    return RangeFileResponse(output_path, plan)
 
 @app.get("/api/jobs")
 async def list_jobs():
@@ -244,24 +454,11 @@ async def list_jobs():
 
 @app.delete("/api/cleanup")
 async def cleanup_old_files():
-    """Clean up old files (admin endpoint)"""
-    import time
-    current_time = time.time()
-    cleaned = {"uploads": 0, "outputs": 0}
-    
-    # Clean uploads older than 24 hours
-    for file in UPLOAD_DIR.glob("*"):
-        if file.is_file() and (current_time - file.stat().st_mtime) > 86400:
-            file.unlink()
-            cleaned["uploads"] += 1
-    
-    # Clean outputs older than 48 hours
-    for dir in OUTPUT_DIR.glob("*"):
-        if dir.is_dir() and (current_time - dir.stat().st_mtime) > 172800:
-            shutil.rmtree(dir)
-            cleaned["outputs"] += 1
+    """Clean up expired files now (admin endpoint)"""
+    # Only entries that are due are touched; nothing is listed or stat()ed
+    cleaned = await artifact_gc.sweep()
     
-    return {"message": "Cleanup completed", "cleaned": cleaned}
+    return {"message": "Cleanup completed", "cleaned": cleaned, "gc": artifact_gc.stats()}
 
 if __name__ == "__main__":
     # Check if model exists
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Spatial tiling of high-resolution restorations for single-GPU workers
+The target frame is split into overlapping tiles small enough for the
+model to fit in a GPU memory budget. Each tile is cropped from the input
+(scaled to the target size), restored on its own, possibly on several
+devices at once, and the restored tiles are feather-blended back together
+so the seams vanish into the overlaps.
+"""
+
+import os
+import sys
+import queue
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from video_chunker import FFMPEG, STITCH_ENCODER, probe_video, run_tool
+from gpu_scheduler import MODEL_MEMORY, estimate_memory_gb
+
+logger = logging.getLogger(__name__)
+
+# Tile sides are multiples of this, as the model requires
+TILE_MULTIPLE = 32
+DEFAULT_OVERLAP = 64
+# Longest side of a tile over its shortest; thin strips restore poorly at the edges
+MAX_TILE_ASPECT = 2.5
+
+def tile_pixel_budget(model_size: str, memory_gb: float, frames: Optional[int] = None) -> int:
+    """Largest tile area (pixels) the model can restore on one GPU within memory_gb"""
+    base_gb = MODEL_MEMORY[model_size][0]
+    # Estimated memory is linear in pixels; the per-megapixel cost comes from the shared table
+    per_megapixel = estimate_memory_gb(model_size, 1000, 1000, frames) - base_gb
+    return max(0, int((memory_gb - base_gb) / per_megapixel * 1e6))
+
+class Tile:
+    """One rectangle of the output frame, overlapping its neighbours by overlap pixels"""
+
+    def __init__(self, index: int, x: int, y: int, width: int, height: int, overlap: int):
+        self.index = index
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.overlap = overlap
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index": self.index, "x": self.x, "y": self.y,
+                "width": self.width, "height": self.height, "overlap": self.overlap}
+
+def _round_up(value: float, multiple: int) -> int:
+    return int(-(-value // multiple) * multiple)
+
+def _positions(length: int, tile: int, count: int) -> List[int]:
+    """Evenly spaced even offsets with the last tile flush to the edge"""
+    if count == 1:
+        return [0]
+    return [round(i * (length - tile) / (count - 1) / 2) * 2 for i in range(count)]
+
+def plan_tiles(height: int, width: int, max_pixels: int, overlap: int = DEFAULT_OVERLAP) -> List[Tile]:
+    """Fewest tiles of at most max_pixels covering the frame, preferring square tiles
+
+    A frame that already fits is a single tile. Otherwise rows and columns
+    are added until each tile, grown by the overlap and rounded up to a
+    multiple of 32, fits the budget without becoming a thin strip.
+    """
+    if height * width <= max_pixels:
+        return [Tile(0, 0, 0, width, height, 0)]
+
+    best = None
+    for rows in range(1, height // TILE_MULTIPLE + 1):
+        tile_h = min(height, _round_up((height + (rows - 1) * overlap) / rows, TILE_MULTIPLE))
+        for cols in range(1, width // TILE_MULTIPLE + 1):
+            tile_w = min(width, _round_up((width + (cols - 1) * overlap) / cols, TILE_MULTIPLE))
+            # Fewest tiles first, then the least elongated ones
+            score = (rows * cols, max(tile_h, tile_w) / min(tile_h, tile_w))
+            if tile_h * tile_w > max_pixels or score[1] > MAX_TILE_ASPECT:
+                continue
+            if best is None or score < best[0]:
+                best = (score, rows, cols, tile_h, tile_w)
+            # More columns only add tiles
+            break
+    if best is None:
+        raise ValueError(f"No tiling of {width}x{height} fits {max_pixels} pixels per tile")
+
+    _, rows, cols, tile_h, tile_w = best
+    tiles = []
+    for y in _positions(height, tile_h, rows):
+        for x in _positions(width, tile_w, cols):
+            tiles.append(Tile(len(tiles), x, y, tile_w, tile_h, overlap))
+    return tiles
+
+def crop_tiles(input_path: str, tiles: List[Tile], height: int, width: int, output_dir: str) -> List[str]:
+    """Scale the input to the target size once and write every tile's crop losslessly"""
+    os.makedirs(output_dir, exist_ok=True)
+    filters = [f"[0:v]scale={width}:{height}:flags=lanczos,format=yuv420p,split={len(tiles)}"
+               + "".join(f"[s{t.index}]" for t in tiles)]
+    outputs = []
+    paths = []
+    for tile in tiles:
+        filters.append(f"[s{tile.index}]crop={tile.width}:{tile.height}:{tile.x}:{tile.y}[t{tile.index}]")
+        path = os.path.join(output_dir, f"tile_{tile.index:03d}.mp4")
+        outputs += ["-map", f"[t{tile.index}]", "-c:v", "libx264", "-preset", "veryfast", "-qp", "0", path]
+        paths.append(path)
+    run_tool([FFMPEG, "-v", "error", "-y", "-i", input_path, "-filter_complex", ";".join(filters), *outputs])
+    return paths
+
+def feather_weights(tile: Tile, height: int, width: int):
+    """Blend weights for a tile: linear ramps across the overlap on sides that touch a neighbour"""
+    import numpy as np
+
+    def ramp(length: int, start_inside: bool, end_inside: bool):
+        weights = np.ones(length, dtype=np.float32)
+        fade = min(tile.overlap, length // 2)
+        if fade:
+            rising = np.arange(1, fade + 1, dtype=np.float32) / (fade + 1)
+            if start_inside:
+                weights[:fade] = rising
+            if end_inside:
+                weights[-fade:] = rising[::-1]
+        return weights
+
+    wy = ramp(tile.height, tile.y > 0, tile.y + tile.height < height)
+    wx = ramp(tile.width, tile.x > 0, tile.x + tile.width < width)
+    return np.outer(wy, wx)[:, :, None]
+
+def blend_tiles(paths: List[str], tiles: List[Tile], height: int, width: int, output_path: str,
+                audio_source: Optional[str] = None) -> str:
+    """Feather-blend restored tiles frame by frame into one video"""
+    import numpy as np
+
+    if len(tiles) == 1:
+        os.replace(paths[0], output_path)
+        return output_path
+
+    fps = probe_video(paths[0])["fps"] or 30.0
+    weights = [feather_weights(tile, height, width) for tile in tiles]
+    norm = np.zeros((height, width, 1), dtype=np.float32)
+    for tile, w in zip(tiles, weights):
+        norm[tile.y:tile.y + tile.height, tile.x:tile.x + tile.width] += w
+
+    # Restored tiles are decoded back to exactly their planned size
+    decoders = [subprocess.Popen(
+        [FFMPEG, "-v", "error", "-i", path, "-vf", f"scale={tile.width}:{tile.height}",
+         "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+        stdout=subprocess.PIPE
+    ) for path, tile in zip(paths, tiles)]
+    audio_inputs = ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "copy"] if audio_source else []
+    encoder = subprocess.Popen(
+        [FFMPEG, "-v", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+         "-r", f"{fps:.6f}", "-i", "-", *audio_inputs, *STITCH_ENCODER, output_path],
+        stdin=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+    frames = 0
+    try:
+        canvas = np.empty((height, width, 3), dtype=np.float32)
+        while True:
+            canvas.fill(0.0)
+            complete = True
+            for decoder, tile, w in zip(decoders, tiles, weights):
+                size = tile.width * tile.height * 3
+                data = decoder.stdout.read(size)
+                if len(data) < size:
+                    complete = False
+                    break
+                frame = np.frombuffer(data, dtype=np.uint8).reshape(tile.height, tile.width, 3)
+                canvas[tile.y:tile.y + tile.height, tile.x:tile.x + tile.width] += frame * w
+            if not complete:
+                break
+            encoder.stdin.write(np.clip(canvas / norm + 0.5, 0, 255).astype(np.uint8).tobytes())
+            frames += 1
+    finally:
+        for decoder in decoders:
+            decoder.stdout.close()
+            decoder.kill()
+            decoder.wait()
+        encoder.stdin.close()
+        stderr = encoder.stderr.read().decode(errors="replace")
+        encoder.wait()
+
+    if encoder.returncode != 0 or frames == 0:
+        raise RuntimeError(f"Tile blending failed after {frames} frames: {stderr[-2000:]}")
+    logger.info(f"Blended {len(tiles)} tiles over {frames} frames")
+    return output_path
+
+class TiledRestore:
+    """Restore a video tile by tile across devices, then blend
+
+    process(tile, tile_path, output_dir, device) restores one tile at its
+    planned size on the given device and returns the output path. Each
+    device works on one tile at a time.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Tile, str, str, Any], str],
+        devices: Sequence[Any] = (0,),
+        max_pixels: int = 1280 * 720,
+        overlap: int = DEFAULT_OVERLAP
+    ):
+        self.process = process
+        self.devices = list(devices) or [0]
+        self.max_pixels = max_pixels
+        self.overlap = overlap
+        self.tiles: List[Tile] = []
+
+    def run(self, input_path: str, workdir: str, output_path: str, height: int, width: int) -> str:
+        self.tiles = plan_tiles(height, width, self.max_pixels, self.overlap)
+        logger.info(f"Restoring {width}x{height} as {len(self.tiles)} tiles of "
+                    f"{self.tiles[0].width}x{self.tiles[0].height} on {len(self.devices)} device(s)")
+        paths = crop_tiles(input_path, self.tiles, height, width, os.path.join(workdir, "tiles"))
+
+        free = queue.Queue()
+        for device in self.devices:
+            free.put(device)
+
+        def restore(tile: Tile, path: str) -> str:
+            device = free.get()
+            try:
+                return self.process(tile, path, os.path.join(workdir, f"tile_{tile.index:03d}_out"), device)
+            finally:
+                free.put(device)
+
+        with ThreadPoolExecutor(max_workers=len(self.devices), thread_name_prefix="tile") as pool:
+            outputs = list(pool.map(restore, self.tiles, paths))
+        return blend_tiles(outputs, self.tiles, height, width, output_path, input_path)
+
+if __name__ == "__main__":
+    # Show the tiling a resolution gets: spatial_tiler.py <height>x<width> <model> <memory_gb>
+    res_h, res_w = map(int, sys.argv[1].split("x"))
+    budget = tile_pixel_budget(sys.argv[2], float(sys.argv[3]))
+    for tile in plan_tiles(res_h, res_w, budget):
+        print(tile.to_dict())
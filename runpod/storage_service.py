@@ -0,0 +1,127 @@
+"""
+GCS storage service for the RunPod worker.
+
+Blocking google-cloud-storage calls run on a small bounded thread pool with
+per-operation timeouts and call metrics, mirroring the backend's AsyncStorage
+(backend/api/services/storage.py). The worker image is built from this
+directory, so it carries its own copy of the service.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+from google.api_core.exceptions import NotFound
+
+logger = logging.getLogger(__name__)
+
+# Resumable chunks must be a multiple of 256 KB
+GCS_CHUNK_SIZE = 8 * 1024 * 1024
+
+DEFAULT_TIMEOUTS = {
+    "upload_file": 600.0,
+    "delete": 30.0,
+    "read_json": 30.0,
+    "write_json": 30.0,
+    "exists": 30.0,
+}
+
+class GCSStorage:
+    """Bounded, time-limited access to a GCS bucket"""
+
+    def __init__(self, client, bucket_name: str, max_workers: int = 4,
+                 timeouts: Optional[Dict[str, float]] = None):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.bucket = client.bucket(bucket_name)
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gcs")
+        self._lock = threading.Lock()
+        self._ops: Dict[str, Dict[str, Any]] = {}
+
+    def _record(self, op: str, elapsed: Optional[float] = None, outcome: str = "started"):
+        with self._lock:
+            stats = self._ops.setdefault(op, {
+                "calls": 0, "errors": 0, "timeouts": 0, "in_flight": 0, "total_seconds": 0.0
+            })
+            if outcome == "started":
+                stats["calls"] += 1
+                stats["in_flight"] += 1
+                return
+            stats["in_flight"] -= 1
+            stats["total_seconds"] += elapsed
+            if outcome == "error":
+                stats["errors"] += 1
+            elif outcome == "timeout":
+                stats["timeouts"] += 1
+
+    def submit(self, op: str, fn: Callable, *args) -> Future:
+        """Schedule a blocking storage call on the pool"""
+        def call():
+            start = time.monotonic()
+            try:
+                result = fn(*args)
+            except Exception:
+                self._record(op, time.monotonic() - start, "error")
+                raise
+            self._record(op, time.monotonic() - start, "ok")
+            return result
+
+        self._record(op)
+        return self._executor.submit(call)
+
+    def run(self, op: str, fn: Callable, *args) -> Any:
+        """Run a blocking storage call and wait for it with the operation timeout"""
+        timeout = self.timeouts.get(op)
+        future = self.submit(op, fn, *args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._ops[op]["timeouts"] += 1
+            raise TimeoutError(f"Storage operation '{op}' timed out after {timeout}s")
+
+    async def run_async(self, op: str, fn: Callable, *args) -> Any:
+        """Await a storage call from a coroutine without blocking the loop"""
+        timeout = self.timeouts.get(op)
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(op, fn, *args)), timeout)
+
+    def _upload_file(self, file_path: str, name: str, content_type: Optional[str]) -> str:
+        blob = self.bucket.blob(name, chunk_size=GCS_CHUNK_SIZE)
+        blob.upload_from_filename(file_path, content_type=content_type,
+                                  timeout=self.timeouts["upload_file"])
+        blob.make_public()
+        return blob.public_url
+
+    def upload_file(self, file_path: str, name: str, content_type: Optional[str] = None) -> str:
+        """Upload a local file and return its public URL"""
+        return self.run("upload_file", self._upload_file, file_path, name, content_type)
+
+    def delete(self, name: str):
+        self.run("delete", lambda: self.bucket.blob(name).delete())
+
+    def _read_json(self, name: str) -> Optional[Any]:
+        blob = self.bucket.blob(name)
+        try:
+            return json.loads(blob.download_as_bytes(timeout=self.timeouts["read_json"]))
+        except NotFound:
+            return None
+
+    def read_json(self, name: str) -> Optional[Any]:
+        """Small JSON object from the bucket, or None if it does not exist"""
+        return self.run("read_json", self._read_json, name)
+
+    def write_json(self, name: str, data: Any):
+        self.run("write_json", lambda: self.bucket.blob(name).upload_from_string(
+            json.dumps(data), content_type="application/json", timeout=self.timeouts["write_json"]))
+
+    def exists(self, name: str) -> bool:
+        return self.run("exists", lambda: self.bucket.blob(name).exists(timeout=self.timeouts["exists"]))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {op: dict(stats) for op, stats in self._ops.items()}
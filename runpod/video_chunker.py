@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Temporal chunking of long videos for the RunPod worker
+The input is cut at keyframes into segments that overlap by a short
+window, so the cut itself is a stream copy. Segments are restored as
+independent sub-jobs, then stitched back: overlaps are cross-faded, and
+without overlap the segments are concatenated without re-encoding.
+"""
+
+import os
+import json
+import bisect
+import time
+import asyncio
+import logging
+import subprocess
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cancellation import JobCancelled
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFPROBE = os.getenv("FFPROBE_BIN", "ffprobe")
+
+# Encoder for stitched output when overlaps have to be blended
+STITCH_ENCODER = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "16", "-pix_fmt", "yuv420p"]
+
+def run_tool(cmd: List[str]) -> str:
+    """Run ffmpeg/ffprobe and return stdout, raising with the tail of stderr on failure"""
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(cmd[0])} failed: {result.stderr[-2000:]}")
+    return result.stdout
+
+def probe_video(path: str) -> Dict[str, Any]:
+    """Duration and frame rate of the first video stream (path may be a URL)"""
+    info = json.loads(run_tool([
+        FFPROBE, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=avg_frame_rate:format=duration", "-of", "json", path
+    ]))
+    num, _, den = info["streams"][0]["avg_frame_rate"].partition("/")
+    return {
+        "duration": float(info["format"]["duration"]),
+        "fps": float(num) / float(den or 1) if float(den or 1) else 0.0
+    }
+
+def scan_packets(path: str) -> List[Tuple[float, bool]]:
+    """(pts, is_keyframe) of every video packet in decode order, read without decoding"""
+    output = run_tool([
+        FFPROBE, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path
+    ])
+    packets = []
+    for line in output.splitlines():
+        pts, _, flags = line.partition(",")
+        if pts not in ("", "N/A"):
+            packets.append((float(pts), "K" in flags))
+    return packets
+
+class Segment:
+    """One temporal piece of the input: frames packets from start, sharing overlap seconds with the next"""
+
+    def __init__(self, index: int, start: float, end: float, overlap: float, frames: int):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.overlap = overlap
+        self.frames = frames
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index": self.index, "start": self.start, "end": self.end,
+                "overlap": self.overlap, "frames": self.frames}
+
+def plan_segments(duration: float, packets: List[Tuple[float, bool]], segment_seconds: float,
+                  overlap_seconds: float) -> List[Segment]:
+    """Cut at the first keyframe after each segment_seconds, never leaving a short tail
+
+    Segments start and end on keyframes, so each is a run of whole GOPs that
+    splits with a stream copy. All but the last run on into the next segment
+    for at least overlap_seconds (rounded up to a keyframe) for blending.
+    Without any keyframe to cut at, the whole video is one segment.
+    """
+    keys = [(i, pts) for i, (pts, is_key) in enumerate(packets) if is_key]
+    if not keys:
+        logger.warning("No keyframes found, restoring the video as a single segment")
+        return [Segment(0, 0.0, duration, 0.0, len(packets))]
+    key_times = [pts for _, pts in keys]
+    cuts = keys[:1]
+    for index, pts in keys[1:]:
+        if pts - cuts[-1][1] >= segment_seconds and duration - pts >= segment_seconds / 2:
+            cuts.append((index, pts))
+
+    segments = []
+    for i, (index, pts) in enumerate(cuts):
+        end_index, end, overlap = len(packets), duration, 0.0
+        if i + 1 < len(cuts):
+            next_cut = cuts[i + 1][1]
+            k = bisect.bisect_left(key_times, next_cut + overlap_seconds)
+            if k < len(keys):
+                end_index, end = keys[k]
+            overlap = end - next_cut
+        segments.append(Segment(i, pts, end, overlap, end_index - index))
+    return segments
+
+def split_video(input_path: str, segments: List[Segment], output_dir: str) -> List[str]:
+    """Stream-copy each segment of the video track into its own file"""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for segment in segments:
+        path = os.path.join(output_dir, f"segment_{segment.index:04d}.mp4")
+        # Seeking lands on the segment's starting keyframe; whole GOPs follow in decode order
+        frames = ["-frames:v", str(segment.frames)] if segment.frames > 0 else []
+        run_tool([
+            FFMPEG, "-v", "error", "-y",
+            "-ss", f"{segment.start:.6f}", "-i", input_path, *frames,
+            "-map", "0:v:0", "-c", "copy", "-avoid_negative_ts", "make_zero", path
+        ])
+        paths.append(path)
+    return paths
+
+def stitch_segments(paths: List[str], segments: List[Segment], output_path: str,
+                    audio_source: Optional[str] = None) -> str:
+    """Join restored segments, cross-fading overlaps; audio is copied from audio_source if given"""
+    blend = any(segment.overlap for segment in segments)
+    audio_inputs = ["-i", audio_source] if audio_source else []
+    # The audio source comes after the concat list, or after every segment when blending
+    audio_map = ["-map", f"{len(paths) if blend else 1}:a:0?", "-c:a", "copy"] if audio_source else []
+
+    if not blend:
+        # Nothing to blend: concatenate without re-encoding
+        list_path = output_path + ".txt"
+        with open(list_path, "w") as f:
+            for path in paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            run_tool([
+                FFMPEG, "-v", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path, *audio_inputs,
+                "-map", "0:v:0", "-c:v", "copy", *audio_map, output_path
+            ])
+        finally:
+            os.unlink(list_path)
+        return output_path
+
+    # Restored segments may come back a few frames short, so offsets use the real lengths
+    durations = []
+    inputs = []
+    filters = []
+    for i, (path, segment) in enumerate(zip(paths, segments)):
+        durations.append(min(probe_video(path)["duration"], segment.duration))
+        inputs += ["-i", path]
+        filters.append(f"[{i}:v]trim=end_frame={segment.frames},settb=AVTB,setpts=PTS-STARTPTS,format=yuv420p[v{i}]")
+
+    label, length = "v0", durations[0]
+    for i in range(1, len(paths)):
+        fade = min(segments[i - 1].overlap, durations[i - 1], durations[i])
+        if fade <= 0:
+            filters.append(f"[{label}][v{i}]concat=n=2:v=1:a=0[x{i}]")
+            length += durations[i]
+        else:
+            filters.append(f"[{label}][v{i}]xfade=transition=fade:duration={fade:.6f}:offset={length - fade:.6f}[x{i}]")
+            length += durations[i] - fade
+        label = f"x{i}"
+
+    run_tool([
+        FFMPEG, "-v", "error", "-y", *inputs, *audio_inputs,
+        "-filter_complex", ";".join(filters), "-map", f"[{label}]", *STITCH_ENCODER, *audio_map,
+        output_path
+    ])
+    return output_path
+
+class ChunkedRestore:
+    """Split, restore segments concurrently through process(), then stitch
+
+    process(segment, segment_path, report) restores one segment and returns
+    the local path of its output; it may call report(fraction) as it goes.
+    on_progress(summary) receives the aggregated parent progress whenever a
+    segment reports or finishes.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[Segment, str, Callable[[float], None]], Awaitable[str]],
+        segment_seconds: float = 60.0,
+        overlap_seconds: float = 1.0,
+        max_parallel: int = 8,
+        retries: int = 1,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.process = process
+        self.segment_seconds = segment_seconds
+        self.overlap_seconds = overlap_seconds
+        self.max_parallel = max_parallel
+        self.retries = retries
+        self.on_progress = on_progress
+        self.segments: List[Segment] = []
+        self._fractions: List[float] = []
+        self.stage = "planning"
+
+    def progress(self) -> Dict[str, Any]:
+        done = sum(1 for fraction in self._fractions if fraction >= 1.0)
+        # Splitting and stitching are quick next to restoration
+        restored = sum(self._fractions) / len(self._fractions) if self._fractions else 0.0
+        overall = {"planning": 0.0, "restoring": 0.05 + 0.9 * restored, "stitching": 0.95, "done": 1.0}[self.stage]
+        return {
+            "stage": self.stage,
+            "progress": round(overall, 4),
+            "segments": len(self.segments),
+            "segments_done": done
+        }
+
+    def _report(self, index: int, fraction: float):
+        fraction = min(max(fraction, 0.0), 1.0)
+        if fraction <= self._fractions[index]:
+            return
+        self._fractions[index] = fraction
+        if self.on_progress:
+            self.on_progress(self.progress())
+
+    def _set_stage(self, stage: str):
+        self.stage = stage
+        if self.on_progress:
+            self.on_progress(self.progress())
+
+    async def _restore(self, segment: Segment, path: str, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            for attempt in range(self.retries + 1):
+                start = time.monotonic()
+                try:
+                    output = await self.process(segment, path, lambda f: self._report(segment.index, f))
+                    logger.info(f"Segment {segment.index} restored in {time.monotonic() - start:.1f}s")
+                    self._report(segment.index, 1.0)
+                    return output
+                except JobCancelled:
+                    raise
+                except Exception as e:
+                    if attempt == self.retries:
+                        raise
+                    logger.warning(f"Segment {segment.index} failed, retrying: {e}")
+
+    async def run(self, input_path: str, workdir: str, output_path: str) -> str:
+        info = await asyncio.to_thread(probe_video, input_path)
+        packets = await asyncio.to_thread(scan_packets, input_path)
+        self.segments = plan_segments(info["duration"], packets, self.segment_seconds, self.overlap_seconds)
+        self._fractions = [0.0] * len(self.segments)
+        logger.info(f"Split {info['duration']:.1f}s video into {len(self.segments)} segments")
+
+        paths = await asyncio.to_thread(split_video, input_path, self.segments, os.path.join(workdir, "segments"))
+        self._set_stage("restoring")
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        tasks = [asyncio.create_task(self._restore(s, p, semaphore)) for s, p in zip(self.segments, paths)]
+        try:
+            outputs = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        self._set_stage("stitching")
+        await asyncio.to_thread(stitch_segments, outputs, self.segments, output_path, input_path)
+        self._set_stage("done")
+        return output_path
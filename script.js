@@ -215,7 +215,50 @@ async function handleUpload() {
     }
 }
 
+// Hex SHA-256 of a file, or null where Web Crypto is unavailable (non-HTTPS pages)
+async function sha256Hex(blob) {
+    if (!window.crypto || !window.crypto.subtle) {
+        return null;
+    }
+    try {
+        const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    } catch (error) {
+        console.warn('Could not hash the file, uploading it in full:', error);
+        return null;
+    }
+}
+
+async function uploadByHash(file, sha256, resH, resW, seed) {
+    // The backend asks for the hash of a random range to check we hold the file
+    const request = async (extra) => fetch(`${API_BASE_URL}/upload-by-hash`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ sha256, filename: file.name, res_h: resH, res_w: resW, seed, ...extra })
+    });
+    const challenged = await request({});
+    if (!challenged.ok) {
+        return null;
+    }
+    const challenge = await challenged.json();
+    const proof = await sha256Hex(file.slice(challenge.offset, challenge.offset + challenge.length));
+    if (!proof) {
+        return null;
+    }
+    const known = await request({ token: challenge.token, proof });
+    return known.ok ? await known.json() : null;
+}
+
 async function uploadVideo(file, resH, resW, seed) {
+    // Content the backend already stores is not sent again
+    const sha256 = await sha256Hex(file);
+    if (sha256) {
+        const known = await uploadByHash(file, sha256, resH, resW, seed);
+        if (known) {
+            return known;
+        }
+    }
+    
     const formData = new FormData();
     formData.append('video', file);
     formData.append('res_h', resH);
@@ -227,6 +270,7 @@ async function uploadVideo(file, resH, resW, seed) {
     try {
         const response = await fetch(`${API_BASE_URL}/upload`, {
             method: 'POST',
+            headers: sha256 ? { 'X-Content-SHA256': sha256 } : {},
             body: formData
         });
         
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark: backend memory and first-byte latency when proxying a result download
+
+A local upstream stands in for the bucket and serves --megabytes with
+Range and ETag support. The backend side is compared as
+  * buffered - client.get() then the whole body wrapped in BytesIO, as before
+  * streamed - backend/api/services/download_proxy.py
+Python allocations of the whole process are traced, so "peak memory" is
+what the proxy path held at once. Also checks that a Range request comes
+back as a 206 with the right bytes and the upstream ETag.
+
+Usage: python3 scripts/benchmark-download-proxy.py [--megabytes 50]
+"""
+
+import io
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import threading
+import tracemalloc
+from contextlib import asynccontextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from api.services.download_proxy import proxy_download
+
+ETAG = '"benchmark-etag"'
+
+def upstream_handler(data: bytes):
+    view = memoryview(data)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, len(data) - 1
+            status = 200
+            if self.headers.get("Range", "").startswith("bytes="):
+                first, _, last = self.headers["Range"][6:].partition("-")
+                start, end = int(first), int(last) if last else len(data) - 1
+                status = 206
+            self.send_response(status)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", ETAG)
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            self.end_headers()
+            for offset in range(start, end + 1, 1024 * 1024):
+                self.wfile.write(view[offset:min(offset + 1024 * 1024, end + 1)])
+
+    return Handler
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def build_proxy(upstream_url: str) -> FastAPI:
+    state = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        state["client"] = httpx.AsyncClient(timeout=60.0)
+        yield
+        await state["client"].aclose()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/buffered")
+    async def buffered():
+        response = await state["client"].get(upstream_url)
+        return StreamingResponse(io.BytesIO(response.content), media_type="video/mp4")
+
+    @app.get("/streamed")
+    async def streamed(request: Request):
+        return await proxy_download(state["client"], upstream_url, request.headers)
+
+    return app
+
+async def measure(url: str, headers=None):
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    first_byte = None
+    received = bytearray() if headers else None
+    total = 0
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        async with client.stream("GET", url, headers=headers) as response:
+            async for chunk in response.aiter_raw():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                total += len(chunk)
+                if received is not None:
+                    received += chunk
+    return response, first_byte, time.perf_counter() - start, total, tracemalloc.get_traced_memory()[1], received
+
+async def run(proxy_url: str, data: bytes):
+    # Streamed first: the buffered body can outlive its request and inflate the next peak
+    for mode in ("streamed", "buffered"):
+        _, first_byte, elapsed, total, peak, _ = await measure(f"{proxy_url}/{mode}")
+        print(f"{mode:<9} first byte {first_byte * 1000:8.1f} ms   total {elapsed:6.2f} s   "
+              f"{total / 1e6:7.1f} MB   peak memory {peak / 1e6:8.1f} MB")
+
+    response, _, _, _, _, body = await measure(f"{proxy_url}/streamed", {"Range": "bytes=1000-1999"})
+    ok = response.status_code == 206 and bytes(body) == data[1000:2000] and response.headers.get("etag") == ETAG
+    print(f"Range request: {response.status_code} {response.headers.get('content-range')} "
+          f"etag {response.headers.get('etag')} -> {'ok' if ok else 'MISMATCH'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Download proxy benchmark")
+    parser.add_argument("--megabytes", type=int, default=50)
+    args = parser.parse_args()
+
+    data = os.urandom(args.megabytes * 1024 * 1024)
+    upstream = ThreadingHTTPServer(("127.0.0.1", free_port()), upstream_handler(data))
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}/result.mp4"
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(build_proxy(upstream_url), host="127.0.0.1", port=port,
+                                          log_level="warning", loop="asyncio"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    tracemalloc.start()
+    print(f"Proxying a {args.megabytes} MB result")
+    asyncio.run(run(f"http://127.0.0.1:{port}", data))
+    server.should_exit = True
+    upstream.shutdown()
+
+if __name__ == "__main__":
+    main()
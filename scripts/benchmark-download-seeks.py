@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes a video player transfers while seeking through a result
+
+Serves a --gigabytes sparse file (with a marker every MB) from the real
+download_result handler of runpod/seedvr2_api_server.py and seeks to
+--seeks random positions, reading --window-mb at each:
+  * before - FileResponse without Range support: every seek restarts the
+    download and reads up to the seek position
+  * ranged - a Range request for just the window
+Every ranged body is checked against the file. Also checks a multi-range
+request, a 304 revalidation and If-Range with a stale ETag.
+
+Usage: python3 scripts/benchmark-download-seeks.py [--gigabytes 1] [--seeks 8]
+"""
+
+import os
+import sys
+import time
+import random
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+from email.parser import BytesParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod"))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import FileResponse
+
+import seedvr2_api_server as server
+from file_ranges import content_etag
+
+# The server modules log at INFO; one line per request would bury the results
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+MB = 1024 * 1024
+
+def make_file(path: str, size: int):
+    """Sparse file with its own offset written at every MB, so misplaced bytes show"""
+    with open(path, "wb") as f:
+        f.truncate(size)
+        for offset in range(0, size, MB):
+            f.seek(offset)
+            f.write(f"{offset:016d}".encode())
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def build_app(path: str) -> FastAPI:
+    app = FastAPI()
+    server.jobs["bench"] = {"status": "completed", "output_path": path, "input_filename": "bench.mp4"}
+    app.add_api_route("/api/download/{job_id}", server.download_result, methods=["GET", "HEAD"])
+
+    @app.get("/before/{job_id}")
+    async def before(job_id: str):
+        return FileResponse(path, media_type="video/mp4")
+
+    return app
+
+def fetch(client: httpx.Client, url: str, headers=None, stop_after=None):
+    """Status, headers and bytes received; stop_after closes the connection like a player does"""
+    received = bytearray()
+    with client.stream("GET", url, headers=headers) as response:
+        for chunk in response.iter_raw():
+            received += chunk
+            if stop_after is not None and len(received) >= stop_after:
+                break
+    return response, bytes(received)
+
+def main():
+    parser = argparse.ArgumentParser(description="Range download benchmark")
+    parser.add_argument("--gigabytes", type=float, default=1.0)
+    parser.add_argument("--seeks", type=int, default=8)
+    parser.add_argument("--window-mb", type=int, default=4, help="Bytes a player buffers after each seek")
+    args = parser.parse_args()
+
+    size = int(args.gigabytes * 1024 * MB)
+    window = args.window_mb * MB
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "result.mp4")
+        make_file(path, size)
+        start = time.perf_counter()
+        etag = content_etag(path)
+        print(f"{size / MB:.0f} MB result, ETag {etag} hashed in {time.perf_counter() - start:.1f} s at completion")
+
+        port = free_port()
+        uv = uvicorn.Server(uvicorn.Config(build_app(path), host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=uv.run, daemon=True).start()
+        while not uv.started:
+            time.sleep(0.05)
+        base = f"http://127.0.0.1:{port}"
+
+        rng = random.Random(0)
+        positions = [rng.randrange(0, size - window) for _ in range(args.seeks)]
+        fd = os.open(path, os.O_RDONLY)
+        with httpx.Client(timeout=300.0) as client:
+            totals = {}
+            for mode in ("before", "ranged"):
+                transferred = 0
+                start = time.perf_counter()
+                for position in positions:
+                    if mode == "before":
+                        response, body = fetch(client, f"{base}/before/bench",
+                                               {"Range": f"bytes={position}-"}, stop_after=position + window)
+                    else:
+                        response, body = fetch(client, f"{base}/api/download/bench",
+                                               {"Range": f"bytes={position}-{position + window - 1}"})
+                        assert response.status_code == 206, response.status_code
+                        assert body == os.pread(fd, window, position), f"wrong bytes at {position}"
+                    transferred += len(body)
+                totals[mode] = transferred
+                print(f"{mode:<7} {args.seeks} seeks: {transferred / MB:9.1f} MB transferred "
+                      f"in {time.perf_counter() - start:6.2f} s (last status {response.status_code})")
+            print(f"ranged seeks move {totals['before'] / totals['ranged']:.0f}x fewer bytes")
+
+            ranges = [(10, 99), (5 * MB, 5 * MB + 999), (size - 500, size - 1)]
+            response, body = fetch(client, f"{base}/api/download/bench",
+                                   {"Range": "bytes=" + ",".join(f"{a}-{b}" for a, b in ranges)})
+            message = BytesParser().parsebytes(
+                f"Content-Type: {response.headers['content-type']}\r\n\r\n".encode() + body
+            )
+            parts = [part.get_payload(decode=True) for part in message.get_payload()]
+            ok = parts == [os.pread(fd, b - a + 1, a) for a, b in ranges]
+            print(f"multi-range: {response.status_code} {len(parts)} parts -> {'ok' if ok else 'MISMATCH'}")
+
+            response, body = fetch(client, f"{base}/api/download/bench", {"If-None-Match": etag})
+            print(f"revalidate: {response.status_code}, {len(body)} bytes")
+
+            response, body = fetch(client, f"{base}/api/download/bench",
+                                   {"Range": "bytes=0-99", "If-Range": '"stale"'}, stop_after=1)
+            print(f"If-Range with a stale ETag: {response.status_code} (whole file)")
+        os.close(fd)
+        uv.should_exit = True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-job overhead of a fresh inference process vs the warm worker
+
+Uses the CPU-only fake backend from runpod/inference_worker.py, which
+sleeps --load-seconds and touches --checkpoint-mb of memory to stand in for
+importing torch and loading checkpoints, then "infers" for --infer-seconds.
+  * cold - one process per job (what torchrun per job does today)
+  * warm - one long-lived worker, jobs sent over its Unix socket
+Overhead is each job's wall time minus the inference time itself.
+
+Usage: python3 scripts/benchmark-inference-worker.py [--jobs 5] [--load-seconds 3] [--infer-seconds 0.5]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod"))
+
+from inference_worker import InferenceWorkerClient, worker_command
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod", "inference_worker.py")
+
+def fake_args(args):
+    return [
+        "--load-seconds", str(args.load_seconds),
+        "--infer-seconds", str(args.infer_seconds),
+        "--checkpoint-mb", str(args.checkpoint_mb)
+    ]
+
+def report(name: str, overheads, total: float):
+    print(f"{name:<5} per-job overhead mean {statistics.mean(overheads):7.3f} s   "
+          f"min {min(overheads):7.3f} s   max {max(overheads):7.3f} s   total {total:7.2f} s")
+
+def run_cold(args, video: str, tmp: str):
+    overheads = []
+    start = time.perf_counter()
+    for i in range(args.jobs):
+        job_start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, WORKER_SCRIPT, "--backend", "fake", "--once",
+             "--video", video, "--output-dir", os.path.join(tmp, f"cold-{i}")] + fake_args(args),
+            check=True, capture_output=True
+        )
+        overheads.append(time.perf_counter() - job_start - args.infer_seconds)
+    report("cold", overheads, time.perf_counter() - start)
+
+def run_warm(args, video: str, tmp: str):
+    socket_path = os.path.join(tmp, "worker.sock")
+    client = InferenceWorkerClient(
+        socket_path,
+        worker_command(socket_path, backend="fake", extra_args=fake_args(args))
+    )
+    start = time.perf_counter()
+    try:
+        client.start()
+        startup = time.perf_counter() - start
+        overheads = []
+        for i in range(args.jobs):
+            job_start = time.perf_counter()
+            client.infer(video, os.path.join(tmp, f"warm-{i}"), {})
+            overheads.append(time.perf_counter() - job_start - args.infer_seconds)
+        print(f"warm  worker startup (model load, paid once) {startup:7.3f} s")
+        report("warm", overheads, time.perf_counter() - start)
+    finally:
+        client.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm inference worker benchmark")
+    parser.add_argument("--jobs", type=int, default=5)
+    parser.add_argument("--load-seconds", type=float, default=3.0)
+    parser.add_argument("--infer-seconds", type=float, default=0.5)
+    parser.add_argument("--checkpoint-mb", type=int, default=512)
+    parser.add_argument("--video-mb", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = os.path.join(tmp, "input.mp4")
+        with open(video, "wb") as f:
+            f.write(os.urandom(args.video_mb * 1024 * 1024))
+
+        print(f"{args.jobs} jobs, fake model: load {args.load_seconds}s / {args.checkpoint_mb} MB, "
+              f"inference {args.infer_seconds}s")
+        run_cold(args, video, tmp)
+        run_warm(args, video, tmp)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/status/history page latency as job history grows
+
+Fills each job repository with N synthetic jobs and times one page of
+history for
+  * legacy   - materialise every job, filter, sort, slice (the old route)
+  * first    - page_jobs newest-first page
+  * deep     - page_jobs from a cursor half way through the history
+  * filtered - page_jobs with status + resolution + time range filters
+  * compact  - first page with the compact projection
+
+Usage: python3 scripts/benchmark-job-history.py [--sizes 1000,10000,100000] [--limit 20] [--repeat 50]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+# Keep the module-level job_store singleton from creating data/jobs.db here
+os.environ.setdefault("JOB_STORE_URL", "memory://")
+
+from api.models.schemas import ProcessingJob
+from api.services.job_store import InMemoryJobRepository, SQLiteJobRepository
+
+STATUSES = ["completed", "completed", "completed", "failed", "cancelled", "processing", "queued"]
+RESOLUTIONS = ["720p", "1080p", "2k"]
+
+def make_jobs(count: int):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        created = (start + timedelta(seconds=i * 30 + rng.randint(0, 29))).isoformat()
+        yield ProcessingJob(
+            id=f"job-{i:07d}",
+            status=rng.choice(STATUSES),
+            progress=1.0,
+            resultUrl=f"https://storage.googleapis.com/bucket/results/job-{i:07d}.mp4",
+            createdAt=created,
+            updatedAt=created,
+            runpod_job_id=f"rp-{i:07d}",
+            input_video_url=f"https://storage.googleapis.com/bucket/uploads/job-{i:07d}.mp4",
+            parameters={"resolution": rng.choice(RESOLUTIONS), "seed": rng.randint(0, 1000)}
+        )
+
+def fill(repository, count: int):
+    jobs = list(make_jobs(count))
+    if isinstance(repository, SQLiteJobRepository):
+        with repository._lock:
+            repository._conn.execute("BEGIN")
+            for job in jobs:
+                repository.save(job)
+            repository._conn.execute("COMMIT")
+    else:
+        for job in jobs:
+            repository.save(job)
+    return jobs
+
+def legacy_history(jobs, limit: int, status: str = None):
+    # The pre-pagination route: copy, filter and sort every job per request
+    result = list(jobs)
+    if status:
+        result = [j for j in result if j.status == status]
+    result.sort(key=lambda j: j.createdAt, reverse=True)
+    return [j.model_dump() for j in result[:limit]]
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def bench(name: str, repository, count: int, limit: int, repeat: int):
+    jobs = fill(repository, count)
+    middle = sorted((j.createdAt, j.id) for j in jobs)[count // 2]
+    window_start = jobs[count // 4].createdAt
+    window_end = jobs[3 * count // 4].createdAt
+
+    cases = [
+        ("legacy", lambda: legacy_history(jobs, limit, "completed")),
+        ("first", lambda: repository.page_jobs(limit=limit)),
+        ("deep", lambda: repository.page_jobs(before=middle, limit=limit)),
+        ("filtered", lambda: repository.page_jobs(
+            status="completed", resolution="1080p",
+            created_after=window_start, created_before=window_end, limit=limit)),
+        ("compact", lambda: repository.page_jobs(limit=limit, compact=True)),
+    ]
+    row = "   ".join(f"{case} {timed(fn, repeat):8.3f} ms" for case, fn in cases)
+    print(f"{name:<7} {count:>7} jobs   {row}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Job history pagination benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    print(f"Median latency of one {args.limit}-job page ({args.repeat} runs each)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            sqlite_repo = SQLiteJobRepository(os.path.join(tmp, f"jobs-{count}.db"))
+            bench("sqlite", sqlite_repo, count, args.limit, args.repeat)
+            sqlite_repo.close()
+            bench("memory", InMemoryJobRepository(), count, args.limit, args.repeat)
+
+if __name__ == "__main__":
+    main()
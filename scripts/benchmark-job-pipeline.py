@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark: end-to-end throughput of the RunPod worker on a batch of jobs
+
+A local file server stands in for GCS: it serves the input video and accepts
+the result upload, both throttled to --mbps. Inference is faked with a sleep
+of --infer-seconds plus a file copy. Compares
+  * sequential - download, infer, upload one job at a time (the old handler)
+  * pipelined  - runpod/job_pipeline.py with the same three stage functions
+
+Usage: python3 scripts/benchmark-job-pipeline.py [--jobs 20] [--video-mb 32] [--mbps 200] [--infer-seconds 1.0]
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod"))
+
+from job_pipeline import JobPipeline
+
+CHUNK = 256 * 1024
+
+def throttled_copy(src, dst, length: int, mbps: float):
+    """Copy length bytes at no more than mbps megabits per second"""
+    per_chunk = CHUNK * 8 / (mbps * 1_000_000)
+    remaining = length
+    while remaining > 0:
+        start = time.perf_counter()
+        data = src.read(min(CHUNK, remaining))
+        if not data:
+            break
+        dst.write(data)
+        remaining -= len(data)
+        time.sleep(max(0.0, per_chunk - (time.perf_counter() - start)))
+
+def make_handler(root: str, mbps: float):
+    class FileServer(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            path = os.path.join(root, os.path.basename(self.path))
+            size = os.path.getsize(path)
+            self.send_response(200)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            with open(path, "rb") as f:
+                throttled_copy(f, self.wfile, size, mbps)
+
+        def do_PUT(self):
+            length = int(self.headers["Content-Length"])
+            with open(os.path.join(root, "upload_" + os.path.basename(self.path)), "wb") as f:
+                throttled_copy(self.rfile, f, length, mbps)
+            self.send_response(201)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    return FileServer
+
+def make_stages(base_url: str, infer_seconds: float):
+    def download(payload, workdir):
+        input_path = os.path.join(workdir, "input.mp4")
+        with urllib.request.urlopen(payload["video_url"]) as response, open(input_path, "wb") as f:
+            shutil.copyfileobj(response, f, CHUNK)
+        return input_path
+
+    def infer(payload, input_path, workdir):
+        time.sleep(infer_seconds)
+        output_path = os.path.join(workdir, "output.mp4")
+        shutil.copyfile(input_path, output_path)
+        return output_path
+
+    def upload(payload, output_path, workdir):
+        with open(output_path, "rb") as f:
+            request = urllib.request.Request(
+                f"{base_url}/{payload['job']}.mp4", data=f, method="PUT",
+                headers={"Content-Length": str(os.path.getsize(output_path))}
+            )
+            urllib.request.urlopen(request).close()
+        return {"status": "success", "result_url": f"{base_url}/upload_{payload['job']}.mp4"}
+
+    return download, infer, upload
+
+def run_sequential(stages, payloads):
+    download, infer, upload = stages
+    infer_busy = 0.0
+    for payload in payloads:
+        with tempfile.TemporaryDirectory() as workdir:
+            input_path = download(payload, workdir)
+            start = time.perf_counter()
+            output_path = infer(payload, input_path, workdir)
+            infer_busy += time.perf_counter() - start
+            upload(payload, output_path, workdir)
+    return infer_busy
+
+async def run_pipelined(stages, payloads, prefetch: int, upload_backlog: int):
+    pipeline = JobPipeline(*stages, prefetch=prefetch, upload_backlog=upload_backlog)
+    try:
+        await asyncio.gather(*(pipeline.submit(p["job"], p) for p in payloads))
+        return pipeline.stats()["busy_seconds"]["infer"]
+    finally:
+        await pipeline.stop()
+
+def report(name: str, jobs: int, elapsed: float, infer_busy: float):
+    print(f"{name:<10} {elapsed:7.2f} s   {jobs / elapsed * 60:6.1f} jobs/min   GPU busy {infer_busy / elapsed:5.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker pipeline throughput benchmark")
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--video-mb", type=int, default=32)
+    parser.add_argument("--mbps", type=float, default=200.0, help="Download and upload bandwidth each")
+    parser.add_argument("--infer-seconds", type=float, default=1.0)
+    parser.add_argument("--prefetch", type=int, default=1)
+    parser.add_argument("--upload-backlog", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, "input.mp4"), "wb") as f:
+            f.write(os.urandom(args.video_mb * 1024 * 1024))
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(root, args.mbps))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        stages = make_stages(base_url, args.infer_seconds)
+        payloads = [{"job": f"job-{i}", "video_url": f"{base_url}/input.mp4"} for i in range(args.jobs)]
+        transfer = args.video_mb * 8 * 1024 * 1024 / (args.mbps * 1_000_000)
+        print(f"{args.jobs} jobs: {args.video_mb} MB in/out at {args.mbps} Mbit/s "
+              f"(~{transfer:.2f} s each way), inference {args.infer_seconds} s")
+
+        start = time.perf_counter()
+        infer_busy = run_sequential(stages, payloads)
+        report("sequential", args.jobs, time.perf_counter() - start, infer_busy)
+
+        start = time.perf_counter()
+        infer_busy = asyncio.run(run_pipelined(stages, payloads, args.prefetch, args.upload_backlog))
+        report("pipelined", args.jobs, time.perf_counter() - start, infer_busy)
+
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: queue waits under each scheduling policy, by discrete-event simulation
+
+Replays a job trace against the backend's JobQueue
+(backend/api/services/job_queue.py) on a virtual clock with --gpus GPUs,
+once per policy, and reports p50/p95/max queue wait overall, per priority
+class and per tenant. A trace is JSONL with one job per line:
+  {"arrival": 12.5, "tenant": "acme", "resolution": "1080p", "priority": "batch", "duration": 640}
+duration is the actual run time (the scheduler only sees the per-resolution
+estimate) and defaults to that estimate. Without --trace a seeded synthetic
+trace is generated: a "bulk" tenant dropping bursts of long batch jobs,
+and a few small tenants sending interactive and standard 720p/1080p jobs,
+at about --load of the GPUs' capacity.
+
+Usage: python3 scripts/benchmark-job-queue.py [--trace jobs.jsonl] [--gpus 8] [--jobs 800] [--load 0.9] [--weights bulk=1,alice=2]
+"""
+
+import os
+import sys
+import json
+import heapq
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from api.services.job_queue import (
+    GPU_CONFIG, POLICIES, PRIORITY_CLASSES, JobQueue, QueuedJob, expected_seconds, parse_weights
+)
+
+SMALL_TENANTS = ["alice", "bob", "carol"]
+
+def synthetic_trace(jobs: int, gpus: int, load: float, seed: int):
+    """Jobs at about load x capacity; 1 in 15 arrivals is a burst of 10 bulk jobs"""
+    rng = random.Random(seed)
+    small = [("720p", 0.7), ("1080p", 0.3)]
+    bulk = [("1080p", 0.5), ("2k", 0.5)]
+
+    def gpu_seconds(mix):
+        return sum(weight * GPU_CONFIG[res]["gpus"] * expected_seconds(res) for res, weight in mix)
+
+    # GPU-seconds brought by an average arrival
+    mean_work = (10 * gpu_seconds(bulk) + 14 * gpu_seconds(small)) / 15
+    interval = mean_work / (gpus * load)
+
+    trace = []
+    now = 0.0
+    while len(trace) < jobs:
+        now += rng.expovariate(1 / interval)
+        if rng.random() < 1 / 15:
+            resolutions = rng.choices([r for r, _ in bulk], [w for _, w in bulk], k=10)
+            trace.extend({"arrival": now, "tenant": "bulk", "resolution": res, "priority": "batch"}
+                         for res in resolutions)
+        else:
+            res = rng.choices([r for r, _ in small], [w for _, w in small])[0]
+            priority = rng.choices(["interactive", "standard"], [0.4, 0.6])[0]
+            trace.append({"arrival": now, "tenant": rng.choice(SMALL_TENANTS),
+                          "resolution": res, "priority": priority})
+    for job in trace:
+        # Real runs scatter around the per-resolution estimate
+        job["duration"] = round(expected_seconds(job["resolution"]) * rng.lognormvariate(0, 0.35), 1)
+    return trace[:jobs]
+
+def load_trace(path: str):
+    with open(path) as f:
+        trace = [json.loads(line) for line in f if line.strip()]
+    return sorted(trace, key=lambda job: job["arrival"])
+
+def simulate(trace, policy: str, gpus: int, weights, aging_seconds: float):
+    """Queue wait of every job, replaying the trace in virtual time"""
+    now = [0.0]
+    queue = JobQueue(policy=policy, capacity_gpus=gpus, weights=weights,
+                     aging_seconds=aging_seconds, clock=lambda: now[0])
+    # (time, order, kind, index): arrivals of jobs and ends of runs
+    events = [(job["arrival"], i, "arrive", i) for i, job in enumerate(trace)]
+    heapq.heapify(events)
+    order = len(trace)
+    waits = {}
+    busy = 0.0
+
+    while events:
+        now[0], _, kind, index = heapq.heappop(events)
+        job = trace[index]
+        if kind == "arrive":
+            queue.push(QueuedJob(str(index), tenant=job["tenant"], priority=job["priority"],
+                                 resolution=job["resolution"]))
+        else:
+            queue.finished(str(index))
+        for started in queue.pop_ready():
+            index = int(started.job_id)
+            duration = trace[index].get("duration") or started.expected
+            waits[index] = now[0] - started.enqueued_at
+            busy += started.gpus * duration
+            order += 1
+            heapq.heappush(events, (now[0] + duration, order, "finish", index))
+    return waits, busy / (gpus * now[0]) if now[0] else 0.0
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return "      -       -"
+    return f"{values[len(values) // 2]:7.0f} {values[int(len(values) * 0.95)]:7.0f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Job queue scheduling simulation")
+    parser.add_argument("--trace", help="JSONL job trace; a synthetic one is generated without it")
+    parser.add_argument("--write-trace", help="Save the synthetic trace here")
+    parser.add_argument("--gpus", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=800)
+    parser.add_argument("--load", type=float, default=0.9, help="Offered GPU load of the synthetic trace")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--weights", default="", help="Tenant weights, e.g. bulk=1,alice=2")
+    parser.add_argument("--aging", type=float, default=600.0, help="Seconds per priority class of aging")
+    parser.add_argument("--policies", default=",".join(POLICIES))
+    args = parser.parse_args()
+
+    if args.trace:
+        trace = load_trace(args.trace)
+    else:
+        trace = synthetic_trace(args.jobs, args.gpus, args.load, args.seed)
+        if args.write_trace:
+            with open(args.write_trace, "w") as f:
+                f.writelines(json.dumps(job) + "\n" for job in trace)
+    for job in trace:
+        job.setdefault("tenant", "default")
+        job.setdefault("priority", "standard")
+        job.setdefault("resolution", "720p")
+    tenants = sorted({job["tenant"] for job in trace})
+    classes = [name for name in PRIORITY_CLASSES if any(job["priority"] == name for job in trace)]
+    print(f"{len(trace)} jobs from {len(tenants)} tenants on {args.gpus} GPUs, "
+          f"{trace[-1]['arrival'] / 3600:.1f} h of arrivals; queue wait in seconds, p50 p95")
+
+    header = f"{'policy':<13} {'util':>5} {'all':>15}" + "".join(f" {name:>15}" for name in classes + tenants)
+    print(header)
+    print("-" * len(header))
+    for policy in args.policies.split(","):
+        waits, utilization = simulate(trace, policy, args.gpus, parse_weights(args.weights), args.aging)
+        columns = [percentiles(waits.values())]
+        columns += [percentiles([w for i, w in waits.items() if trace[i]["priority"] == name]) for name in classes]
+        columns += [percentiles([w for i, w in waits.items() if trace[i]["tenant"] == name]) for name in tenants]
+        print(f"{policy:<13} {utilization:5.0%} " + " ".join(columns)
+              + f"   max {max(waits.values()):.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: parent memory while running a very chatty inference process
+
+A child prints --megabytes of tqdm-style output. Each mode runs in a fresh
+interpreter so its peak RSS is measured on its own:
+  * capture - subprocess.run(capture_output=True, text=True), as before
+  * runner  - runpod/process_runner.py: rotating log on disk, 64 KB tail
+Also reports the child's peak RSS/CPU as sampled by the runner.
+
+Usage: python3 scripts/benchmark-process-runner.py [--megabytes 300]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod"))
+
+CHILD = """
+import sys
+line = "{:>3}%|##########| {}/{} [00:01<00:00, 9.9it/s] " + "x" * 60 + "\\n"
+total = {lines}
+for i in range(total):
+    sys.stderr.write(line.format(i * 100 // total, i, total))
+"""
+
+def run_mode(mode: str, megabytes: int) -> dict:
+    lines = megabytes * 1024 * 1024 // 100
+    cmd = [sys.executable, "-c", CHILD.replace("{lines}", str(lines))]
+    start = time.perf_counter()
+    extra = {}
+    if mode == "capture":
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        kept = len(result.stdout) + len(result.stderr)
+    else:
+        from process_runner import run_process_sync
+        with tempfile.TemporaryDirectory() as root:
+            result = run_process_sync(cmd, log_path=os.path.join(root, "inference.log"))
+            kept = len(result.tail)
+            extra = {"child_peak_rss_mb": result.peak_rss_mb, "child_cpu_seconds": result.cpu_seconds}
+    return {
+        "seconds": time.perf_counter() - start,
+        "kept_chars": kept,
+        # ru_maxrss is in KB on Linux
+        "parent_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        **extra
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Subprocess output handling benchmark")
+    parser.add_argument("--megabytes", type=int, default=300, help="Output the child prints")
+    parser.add_argument("--mode", choices=["capture", "runner"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.megabytes)))
+        return
+
+    print(f"Child prints {args.megabytes} MB of progress output")
+    for mode in ("capture", "runner"):
+        output = subprocess.run([sys.executable, __file__, "--mode", mode, "--megabytes", str(args.megabytes)],
+                                capture_output=True, text=True, check=True).stdout
+        stats = json.loads(output)
+        child = ""
+        if "child_peak_rss_mb" in stats:
+            child = f"   child peak RSS {stats['child_peak_rss_mb']:.0f} MB, CPU {stats['child_cpu_seconds']:.1f} s"
+        print(f"{mode:<8} {stats['seconds']:6.2f} s   parent peak RSS {stats['parent_peak_rss_mb']:7.1f} MB   "
+              f"kept in memory {stats['kept_chars'] / 1024:9.0f} KB{child}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark: worker input download, legacy loop vs parallel ranged GETs
+
+Serves a --size-mb file (1 GB by default) from a local HTTP server with Range
+support. Object stores cap each connection's throughput, so every response
+is throttled to --mbps-per-connection (0 = unthrottled). Compares
+  * legacy   - requests iter_content(8192) with the per-chunk progress loop
+  * single   - RangeDownloader forced onto one connection
+  * parallel - RangeDownloader with --connections ranged GETs
+and finally interrupts a parallel download half way to show it resuming.
+
+Usage: python3 scripts/benchmark-range-download.py [--size-mb 1024] [--connections 8] [--mbps-per-connection 800]
+"""
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod"))
+
+import requests
+from range_downloader import RangeDownloader
+
+CHUNK = 1024 * 1024
+
+def make_handler(path: str, mbps: float, fail_after: dict):
+    size = os.path.getsize(path)
+
+    class RangeFileServer(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            start, end = 0, size - 1
+            status = 200
+            range_header = self.headers.get("Range")
+            if range_header and range_header.startswith("bytes="):
+                first, _, last = range_header[6:].partition("-")
+                start, end = int(first), int(last) if last else size - 1
+                status = 206
+            length = end - start + 1
+
+            self.send_response(status)
+            self.send_header("Content-Type", "video/mp4")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", '"bench-v1"')
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+
+            per_chunk = CHUNK * 8 / (mbps * 1_000_000) if mbps else 0.0
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = length
+                while remaining > 0:
+                    if fail_after.get("bytes") is not None:
+                        fail_after["bytes"] -= CHUNK
+                        if fail_after["bytes"] < 0:
+                            # Simulated network drop
+                            self.close_connection = True
+                            return
+                    chunk_start = time.perf_counter()
+                    data = f.read(min(CHUNK, remaining))
+                    self.wfile.write(data)
+                    remaining -= len(data)
+                    if per_chunk:
+                        time.sleep(max(0.0, per_chunk - (time.perf_counter() - chunk_start)))
+
+        def log_message(self, *args):
+            pass
+
+    return RangeFileServer
+
+def legacy_download(url: str, output_path: str):
+    # The previous download_video loop
+    response = requests.get(url, stream=True, timeout=300)
+    response.raise_for_status()
+    total_size = int(response.headers.get('content-length', 0))
+    downloaded = 0
+    with open(output_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                f.write(chunk)
+                downloaded += len(chunk)
+                if total_size > 0:
+                    progress = (downloaded / total_size) * 100
+                    if int(progress) % 10 == 0:
+                        pass
+
+def timed(name: str, size: int, fn):
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    print(f"{name:<9} {elapsed:7.2f} s   {size / elapsed / 1024 / 1024:8.1f} MB/s   CPU (client + server) {cpu:6.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Ranged download benchmark")
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--mbps-per-connection", type=float, default=800.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.mp4")
+        block = os.urandom(16 * 1024 * 1024)
+        with open(source, "wb") as f:
+            for _ in range(args.size_mb // 16):
+                f.write(block)
+        size = os.path.getsize(source)
+        expected_sha256 = hashlib.sha256(open(source, "rb").read()).hexdigest()
+
+        fail_after = {"bytes": None}
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(source, args.mbps_per_connection, fail_after))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/source.mp4"
+        print(f"{size // (1024 * 1024)} MB file, {args.mbps_per_connection or 'unlimited'} Mbit/s per connection")
+
+        dest = os.path.join(tmp, "dest.mp4")
+        timed("legacy", size, lambda: legacy_download(url, dest))
+        os.unlink(dest)
+        timed("single", size, lambda: RangeDownloader(connections=1).download(url, dest))
+        os.unlink(dest)
+        timed("parallel", size, lambda: RangeDownloader(connections=args.connections).download(
+            url, dest, sha256=expected_sha256))
+        os.unlink(dest)
+
+        # Drop the connections half way, then resume from the recorded pieces
+        fail_after["bytes"] = size // 2
+        downloader = RangeDownloader(connections=args.connections, retries=0)
+        try:
+            downloader.download(url, dest)
+        except Exception:
+            pass
+        fail_after["bytes"] = None
+        partial = len(downloader._load_state(dest + ".part", url, size, '"bench-v1"'))
+        timed("resumed", size - partial * downloader.piece_size,
+              lambda: downloader.download(url, dest, sha256=expected_sha256))
+        print(f"resumed download skipped {partial} of {-(-size // downloader.piece_size)} pieces")
+
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
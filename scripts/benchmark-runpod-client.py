@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-call latency of RunPod API calls from backend/main.py
+
+Starts a local stand-in for the RunPod /status endpoint and compares
+  * fresh   - a new httpx.AsyncClient per call (the old behaviour)
+  * pooled  - one shared client from create_http_client (the new behaviour)
+
+TLS is used by default (self-signed cert via the openssl CLI) because the
+handshake is most of what a fresh client pays for; pass --no-tls to skip it.
+
+Usage: python3 scripts/benchmark-runpod-client.py [--calls 200] [--concurrency 1] [--no-tls]
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import httpx
+from api.services.http_client import create_http_client, request_with_retry
+
+ENDPOINT_ID = "bench-endpoint"
+
+class StandInRunPod(BaseHTTPRequestHandler):
+    """Answers /v2/<endpoint>/status/<job> like the RunPod API"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        job_id = self.path.rsplit("/", 1)[-1]
+        body = json.dumps({"id": job_id, "status": "IN_PROGRESS", "delayTime": 120}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def make_cert(directory: str):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+        "-keyout", key, "-out", cert, "-days", "1",
+        "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"
+    ], check=True, capture_output=True)
+    return cert, key
+
+def start_server(tls_files=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInRunPod)
+    server.daemon_threads = True
+    scheme = "http"
+    if tls_files:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*tls_files)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://localhost:{server.server_address[1]}/v2/{ENDPOINT_ID}"
+
+async def fresh_client_call(base_url: str, job_id: str):
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{base_url}/status/{job_id}", timeout=10.0)
+        response.raise_for_status()
+
+async def measure(name: str, call, calls: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await call(f"job-{i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name:<8} mean {statistics.mean(latencies):7.2f} ms   p50 {statistics.median(latencies):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   throughput {calls / elapsed:8.1f} calls/s")
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        tls_files = None if args.no_tls else make_cert(tmp)
+        if tls_files:
+            # httpx trusts SSL_CERT_FILE when building its default SSL context
+            os.environ["SSL_CERT_FILE"] = tls_files[0]
+        server, base_url = start_server(tls_files)
+        print(f"Stand-in RunPod API at {base_url} ({args.calls} calls, concurrency {args.concurrency})")
+
+        await measure("fresh", lambda job: fresh_client_call(base_url, job), args.calls, args.concurrency)
+
+        client = create_http_client(base_url=base_url)
+        try:
+            async def pooled_call(job_id):
+                response = await request_with_retry(client, "GET", f"/status/{job_id}")
+                response.raise_for_status()
+            await measure("pooled", pooled_call, args.calls, args.concurrency)
+        finally:
+            await client.aclose()
+            server.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="RunPod API client latency benchmark")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--no-tls", action="store_true", help="Plain HTTP stand-in server")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark: seam quality and cost of spatially tiled restoration
+
+A synthetic testsrc2 clip is "restored" to --resolution tile by tile with
+runpod/spatial_tiler.py, where the fake per-tile restoration is a plain
+re-encode, and compared by PSNR against scaling the whole frame at once.
+Feathered seams should leave the tiled output within encoder noise of the
+reference. Also prints the tiling chosen for common resolutions under
+--memory-gb.
+
+Needs ffmpeg/ffprobe on PATH (or FFMPEG_BIN / FFPROBE_BIN) and numpy.
+
+Usage: python3 scripts/benchmark-spatial-tiling.py [--resolution 720x1280] [--max-pixels 300000] [--devices 2]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod"))
+
+from video_chunker import FFMPEG, run_tool
+from spatial_tiler import TiledRestore, plan_tiles, tile_pixel_budget
+
+ENCODE = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "10", "-pix_fmt", "yuv420p"]
+
+def fake_restore(tile, path: str, tile_dir: str, device) -> str:
+    os.makedirs(tile_dir, exist_ok=True)
+    output = os.path.join(tile_dir, "restored.mp4")
+    run_tool([FFMPEG, "-v", "error", "-y", "-i", path, *ENCODE, output])
+    return output
+
+def psnr(path: str, reference: str) -> str:
+    result = subprocess.run([FFMPEG, "-i", path, "-i", reference, "-lavfi", "psnr", "-f", "null", "-"],
+                            capture_output=True, text=True)
+    match = re.search(r"average:([\d.]+) min:([\d.]+)", result.stderr)
+    return f"average {match.group(1)} dB, worst frame {match.group(2)} dB" if match else "n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description="Spatial tiling benchmark")
+    parser.add_argument("--resolution", default="720x1280", help="Target HEIGHTxWIDTH")
+    parser.add_argument("--max-pixels", type=int, default=300000, help="Tile budget for the quality run")
+    parser.add_argument("--devices", type=int, default=2, help="Tiles restored at once")
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--memory-gb", type=float, default=80.0)
+    args = parser.parse_args()
+    res_h, res_w = map(int, args.resolution.split("x"))
+
+    for model_size in ("3b", "7b"):
+        budget = tile_pixel_budget(model_size, args.memory_gb)
+        for height, width in ((720, 1280), (1080, 1920), (1440, 2560), (2160, 3840)):
+            tiles = plan_tiles(height, width, budget)
+            print(f"{model_size} @ {args.memory_gb:.0f} GB  {width}x{height}: {len(tiles)} tile(s) "
+                  f"of {tiles[0].width}x{tiles[0].height}")
+
+    with tempfile.TemporaryDirectory() as root:
+        input_path = os.path.join(root, "input.mp4")
+        run_tool([
+            FFMPEG, "-v", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc2=size={res_w // 2}x{res_h // 2}:rate=24:duration={args.duration}",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", input_path
+        ])
+
+        reference = os.path.join(root, "reference.mp4")
+        start = time.perf_counter()
+        run_tool([FFMPEG, "-v", "error", "-y", "-i", input_path,
+                  "-vf", f"scale={res_w}:{res_h}:flags=lanczos", *ENCODE, reference])
+        print(f"\nwhole frame  {time.perf_counter() - start:6.2f} s")
+
+        tiled = TiledRestore(fake_restore, devices=range(args.devices), max_pixels=args.max_pixels)
+        start = time.perf_counter()
+        output = tiled.run(input_path, root, os.path.join(root, "tiled.mp4"), res_h, res_w)
+        print(f"tiled        {time.perf_counter() - start:6.2f} s   {len(tiled.tiles)} tiles of "
+              f"{tiled.tiles[0].width}x{tiled.tiles[0].height}")
+        print(f"tiled vs whole: {psnr(output, reference)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark peak RSS of the streaming upload path in backend/main.py
+
+Drives ingest_multipart with N concurrent synthetic multipart uploads that
+are generated on the fly, writing into a local fake object store, and
+reports the peak resident set size of the process.
+
+Usage: python3 scripts/benchmark-upload-rss.py [--uploads 20] [--size-mb 400] [--legacy]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import resource
+import hashlib
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from api.services.ingest import ingest_multipart
+from api.services.storage import AsyncStorage
+
+BOUNDARY = "----seedvr2benchmarkboundary"
+REQUEST_CHUNK = 64 * 1024  # What uvicorn typically hands to the app per receive()
+
+def current_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+class FakeObjectStore:
+    """In-process storage backend that keeps only a digest and size per object"""
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def open_writer(self, name: str, content_type: str = None):
+        return FakeUploadSink(self, name)
+
+class FakeUploadSink:
+    def __init__(self, store: FakeObjectStore, name: str):
+        self.store = store
+        self.name = name
+        self.digest = hashlib.md5()
+        self.size = 0
+
+    def write(self, data: bytes):
+        if self.store.latency:
+            time.sleep(self.store.latency)
+        self.digest.update(data)
+        self.size += len(data)
+
+    def commit(self) -> str:
+        with self.store.lock:
+            self.store.objects[self.name] = (self.size, self.digest.hexdigest())
+        return f"fake://{self.name}"
+
+    def abort(self):
+        pass
+
+class FakeRequest:
+    """Minimal stand-in for a Starlette request streaming a multipart body"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+    async def stream(self):
+        yield (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="video"; filename="bench.mp4"\r\n'
+            f"Content-Type: video/mp4\r\n\r\n"
+        ).encode()
+        payload = os.urandom(REQUEST_CHUNK)
+        remaining = self.size
+        while remaining > 0:
+            n = min(REQUEST_CHUNK, remaining)
+            remaining -= n
+            yield payload[:n]
+            # Give other uploads a turn, like a real socket would
+            await asyncio.sleep(0)
+        yield (
+            f"\r\n--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="seed"\r\n\r\n42\r\n'
+            f"--{BOUNDARY}--\r\n"
+        ).encode()
+
+async def legacy_upload(request: FakeRequest, storage: AsyncStorage):
+    """Old behaviour: hold the whole file in memory before storing it"""
+    content = bytearray()
+    async for chunk in request.stream():
+        content += chunk
+    sink = await storage.open_writer("legacy.mp4", "video/mp4")
+    await sink.write(bytes(content))
+    return await sink.commit()
+
+async def run(args):
+    store = FakeObjectStore(latency=args.store_latency_ms / 1000)
+    storage = AsyncStorage(store)
+    size = args.size_mb * 1024 * 1024
+    stop = False
+    peak = current_rss_mb()
+
+    async def sample():
+        nonlocal peak
+        while not stop:
+            peak = max(peak, current_rss_mb())
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.create_task(sample())
+    baseline = current_rss_mb()
+    start = time.perf_counter()
+
+    if args.legacy:
+        uploads = [legacy_upload(FakeRequest(size), storage) for _ in range(args.uploads)]
+    else:
+        uploads = [
+            ingest_multipart(FakeRequest(size), storage.open_writer, max_size=size + 1)
+            for _ in range(args.uploads)
+        ]
+    results = await asyncio.gather(*uploads)
+
+    elapsed = time.perf_counter() - start
+    stop = True
+    await sampler
+
+    total_mb = args.uploads * args.size_mb
+    print(f"Mode:            {'legacy (read whole file)' if args.legacy else 'streaming'}")
+    print(f"Uploads:         {args.uploads} x {args.size_mb} MB = {total_mb} MB")
+    print(f"Completed:       {len(results)}")
+    print(f"Elapsed:         {elapsed:.1f}s ({total_mb / elapsed:.0f} MB/s)")
+    print(f"Baseline RSS:    {baseline:.0f} MB")
+    print(f"Peak RSS:        {peak:.0f} MB (sampled)")
+    print(f"Peak RSS:        {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB (ru_maxrss)")
+    print(f"Storage writes:  {storage.stats()['operations']['write']['calls']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS benchmark for streaming uploads")
+    parser.add_argument("--uploads", type=int, default=20, help="Concurrent uploads")
+    parser.add_argument("--size-mb", type=int, default=400, help="Size of each upload in MB")
+    parser.add_argument("--store-latency-ms", type=float, default=0.0, help="Simulated latency per sink write")
+    parser.add_argument("--legacy", action="store_true", help="Buffer whole files like the old handler did")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: wall time of restoring one long video whole vs in parallel segments
+
+A synthetic testsrc2 clip with audio stands in for the input. Restoration is
+faked per segment with a sleep of --seconds-per-second times the segment
+length plus an ffmpeg re-encode, so segments on --workers parallel workers
+behave like sub-jobs on separate GPUs. Compares
+  * whole   - one process() call over the entire video
+  * chunked - runpod/video_chunker.py, with and without overlap blending
+and checks the stitched frame counts; the no-overlap stitch must be
+frame-identical (framemd5) to the input.
+
+Needs ffmpeg/ffprobe on PATH, or set FFMPEG_BIN / FFPROBE_BIN.
+
+Usage: python3 scripts/benchmark-video-chunking.py [--duration 120] [--segment 20] [--overlap 1] [--workers 4]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "runpod"))
+
+from video_chunker import FFMPEG, FFPROBE, ChunkedRestore, Segment, probe_video, run_tool
+
+def make_clip(path: str, duration: float, fps: int, gop: int):
+    run_tool([
+        FFMPEG, "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size=320x180:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", str(gop), "-bf", "2", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest", path
+    ])
+
+def count_frames(path: str) -> int:
+    return len(frame_hashes(path))
+
+def frame_hashes(path: str) -> list:
+    output = run_tool([FFMPEG, "-v", "error", "-i", path, "-map", "0:v:0", "-f", "framemd5", "-"])
+    return [line.rsplit(",", 1)[-1].strip() for line in output.splitlines() if line and not line.startswith("#")]
+
+def has_audio(path: str) -> bool:
+    output = run_tool([FFPROBE, "-v", "error", "-select_streams", "a", "-show_entries", "stream=index", "-of", "csv=p=0", path])
+    return bool(output.strip())
+
+def make_process(workdir: str, seconds_per_second: float, identity: bool):
+    """Fake restoration: wait in proportion to the footage, then re-encode (or copy)"""
+    async def process(segment: Segment, path: str, report) -> str:
+        output = os.path.join(workdir, f"restored_{segment.index:04d}.mp4")
+        steps = 4
+        for step in range(steps):
+            await asyncio.sleep(segment.duration * seconds_per_second / steps)
+            report((step + 1) / steps)
+        codec = ["-c:v", "copy"] if identity else ["-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p"]
+        await asyncio.to_thread(run_tool, [FFMPEG, "-v", "error", "-y", "-i", path, "-map", "0:v:0", *codec, output])
+        return output
+    return process
+
+async def run_whole(input_path: str, workdir: str, seconds_per_second: float) -> str:
+    info = probe_video(input_path)
+    segment = Segment(0, 0.0, info["duration"], 0.0, 0)
+    return await make_process(workdir, seconds_per_second, False)(segment, input_path, lambda f: None)
+
+async def run_chunked(input_path: str, workdir: str, args, overlap: float, identity: bool):
+    events = []
+    chunked = ChunkedRestore(
+        make_process(workdir, args.seconds_per_second, identity),
+        segment_seconds=args.segment,
+        overlap_seconds=overlap,
+        max_parallel=args.workers,
+        on_progress=events.append
+    )
+    output = await chunked.run(input_path, workdir, os.path.join(workdir, "stitched.mp4"))
+    return output, chunked.segments, events
+
+def main():
+    parser = argparse.ArgumentParser(description="Temporal chunking benchmark")
+    parser.add_argument("--duration", type=float, default=120.0, help="Clip length in seconds")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--gop", type=int, default=60, help="Keyframe interval in frames")
+    parser.add_argument("--segment", type=float, default=20.0, help="Target segment length in seconds")
+    parser.add_argument("--overlap", type=float, default=1.0, help="Blend window in seconds")
+    parser.add_argument("--workers", type=int, default=4, help="Segments restored at once")
+    parser.add_argument("--seconds-per-second", type=float, default=0.05,
+                        help="Fake restoration time per second of footage")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        input_path = os.path.join(root, "input.mp4")
+        make_clip(input_path, args.duration, args.fps, args.gop)
+        input_frames = frame_hashes(input_path)
+        print(f"{args.duration:.0f} s clip, {len(input_frames)} frames, keyframe every {args.gop} frames; "
+              f"{args.segment:.0f} s segments on {args.workers} workers")
+
+        start = time.perf_counter()
+        output = asyncio.run(run_whole(input_path, tempfile.mkdtemp(dir=root), args.seconds_per_second))
+        print(f"{'whole':<18} {time.perf_counter() - start:7.2f} s   {count_frames(output)} frames")
+
+        for name, overlap, identity in (("chunked", 0.0, True), ("chunked+blend", args.overlap, False)):
+            start = time.perf_counter()
+            output, segments, events = asyncio.run(
+                run_chunked(input_path, tempfile.mkdtemp(dir=root), args, overlap, identity)
+            )
+            elapsed = time.perf_counter() - start
+            frames = frame_hashes(output)
+            lengths = "/".join(str(s.frames) for s in segments)
+            print(f"{name:<18} {elapsed:7.2f} s   {len(frames)} frames ({len(segments)} segments: {lengths}), "
+                  f"{len(events)} progress events, audio {'kept' if has_audio(output) else 'MISSING'}")
+            if len(frames) != len(input_frames):
+                print(f"  frame count mismatch: {len(frames)} != {len(input_frames)}")
+            if identity:
+                print(f"  frame-identical to input: {frames == input_frames}")
+
+if __name__ == "__main__":
+    main()